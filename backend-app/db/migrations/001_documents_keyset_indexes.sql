@@ -0,0 +1,17 @@
+-- Keyset pagination indexes for databases created before db/tables_init.sql had them.
+-- New databases get them from tables_init.sql (or create_all) while the table is empty.
+--
+-- CONCURRENTLY builds without blocking inserts and status updates on documents,
+-- but cannot run inside a transaction block, so run this file in autocommit mode:
+--
+--     psql "$DATABASE_URL" -f db/migrations/001_documents_keyset_indexes.sql
+--
+-- An interrupted build leaves an INVALID index that IF NOT EXISTS would keep;
+-- drop it first (DROP INDEX CONCURRENTLY <name>) and re-run.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_user_created_idx
+    ON documents (user_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_user_status_created_idx
+    ON documents (user_id, status, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_user_file_type_created_idx
+    ON documents (user_id, file_type, created_at DESC, id DESC);
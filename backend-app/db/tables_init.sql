@@ -6,6 +6,34 @@ CREATE TABLE IF NOT EXISTS documents (
     filename TEXT,
     file_type TEXT,
     status TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+-- Keyset pagination of a user's documents, newest first: GET /documents
+-- walks (user_id, created_at, id), optionally narrowed by status or file type.
+-- Databases created without them: migrations/001_documents_keyset_indexes.sql
+CREATE INDEX IF NOT EXISTS documents_user_created_idx
+    ON documents (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS documents_user_status_created_idx
+    ON documents (user_id, status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS documents_user_file_type_created_idx
+    ON documents (user_id, file_type, created_at DESC, id DESC);
+
+-- Every status change is published on the document_status channel; the API
+-- gateway LISTENs on it to refresh its status cache and push updates to clients
+CREATE OR REPLACE FUNCTION notify_document_status() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('document_status', json_build_object(
+        'document_id', NEW.id,
+        'user_id', NEW.user_id,
+        'status', NEW.status,
+        'updated_at', NEW.updated_at
+    )::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER documents_status_notify
+    AFTER INSERT OR UPDATE OF status ON documents
+    FOR EACH ROW EXECUTE FUNCTION notify_document_status();
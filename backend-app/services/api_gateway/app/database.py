@@ -1,11 +1,23 @@
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# Logging every statement is costly under load; only do it when debugging
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=DEBUG,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
 
 Base = declarative_base()
 AsyncSessionLocal = sessionmaker(
@@ -13,9 +25,41 @@ AsyncSessionLocal = sessionmaker(
     class_=AsyncSession
 )
 
+# Every replica runs the startup DDL; this transaction-level advisory lock makes them take turns
+INIT_LOCK_ID = 7_413_620_251
+# Same trigger as db/tables_init.sql, for databases created before it was added
+STATUS_NOTIFY_DDL = [
+    """
+    CREATE OR REPLACE FUNCTION notify_document_status() RETURNS trigger AS $$
+    BEGIN
+        PERFORM pg_notify('document_status', json_build_object(
+            'document_id', NEW.id,
+            'user_id', NEW.user_id,
+            'status', NEW.status,
+            'updated_at', NEW.updated_at
+        )::text);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    # PostgreSQL 14+: replaced in place, never briefly missing like with DROP then CREATE
+    """
+    CREATE OR REPLACE TRIGGER documents_status_notify
+        AFTER INSERT OR UPDATE OF status ON documents
+        FOR EACH ROW EXECUTE FUNCTION notify_document_status()
+    """,
+]
+
 async def init_models():
     async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": INIT_LOCK_ID})
+        # Indexes come with new tables only; existing ones get them from db/migrations,
+        # built CONCURRENTLY rather than locking writes at startup
         await conn.run_sync(Base.metadata.create_all)
+        if conn.dialect.name == "postgresql":
+            for statement in STATUS_NOTIFY_DDL:
+                await conn.execute(text(statement))
 
 # AsyncSessionLocal = sessionmaker(
 #     bind=engine,
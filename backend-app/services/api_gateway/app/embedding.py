@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import asyncio
+import os
+
+from common.embedding_backend import load_backend
+from common.telemetry import stage
+
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32"))
+EMBEDDING_MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+
+
+def get_model():
+    # EMBEDDING_BACKEND / EMBEDDING_MODEL select it; the model loads on first use, so
+    # importing the app doesn't pay torch's startup cost
+    return load_backend()
+
+
+def encode_batch(texts: List[str]) -> List[List[float]]:
+    return get_model().encode(texts, batch_size=len(texts), convert_to_numpy=True).tolist()
+
+
+class EmbeddingService:
+    """
+    Dynamic micro-batching for query embeddings.
+
+    Concurrent embed() calls are queued and collected into one model call of
+    up to max_batch_size texts, waiting at most max_wait_ms after the first
+    text arrives. The model runs on a dedicated thread, so the event loop
+    keeps serving requests while a batch is encoded and the next one fills up.
+    """
+
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], List[List[float]]] = encode_batch,
+        max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+        max_wait_ms: float = EMBEDDING_MAX_WAIT_MS,
+    ):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedder")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.texts = 0
+
+    async def start(self, warmup: bool = True):
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        if warmup:
+            # Load the model now rather than on the first user request
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.encode_fn, ["warmup"])
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        self._executor.shutdown(wait=False)
+
+    async def embed(self, text: str) -> List[float]:
+        if self._worker is None:
+            await self.start(warmup=False)
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Requests that queued up while the previous batch was encoding ride along too
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # Callers that gave up (e.g. client disconnected) don't need encoding
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                with stage("embed", batch=len(batch)):
+                    vectors = await loop.run_in_executor(self._executor, self.encode_fn, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+
+embedding_service = EmbeddingService()
+
+
+async def embed_query(text: str) -> List[float]:
+    return await embedding_service.embed(text)
@@ -1,45 +1,100 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import insert, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from minio import Minio
+from opensearchpy import NotFoundError
+from prometheus_client import Histogram, make_asgi_app
+from common.telemetry import (
+    DOCUMENT_ID_KEY, DOCUMENT_METADATA_KEYS, TRACE_METADATA_KEY, USER_ID_KEY,
+    get_trace_id, logger, set_trace_id, stage,
+)
 from .database import init_models, get_db
 from .models import Document
+from .embedding import embed_query, embedding_service
+from .search import hybrid_search, opensearch_client
+from .storage import ensure_bucket, upload_stream
+from .status import status_broadcaster, status_cache, status_payload
+
+from typing import List, Optional
 
+import asyncio
+import base64
+import datetime
+import hmac
+import json
+import time
 import uuid
 import os
-import io
 
 app = FastAPI()
+app.mount("/metrics", make_asgi_app())
+
+TRACE_HEADER = "X-Trace-Id"
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "API gateway request latency",
+    ["method", "route", "status"],
+)
+
+@app.middleware("http")
+async def observe_request(request: Request, call_next):
+    # Every request runs under a trace id (the caller's, if it sent one), echoed back in a header
+    trace_id = set_trace_id(request.headers.get(TRACE_HEADER))
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    # The route template, not the raw path, so ids don't explode the label set
+    HTTP_REQUEST_SECONDS.labels(
+        request.method, getattr(route, "path", "unmatched"), response.status_code
+    ).observe(time.perf_counter() - start)
+    response.headers[TRACE_HEADER] = trace_id
+    return response
 
 @app.on_event("startup")
 async def startup():
     await init_models()
+    await asyncio.get_running_loop().run_in_executor(None, ensure_bucket)
+    await embedding_service.start()
+    await status_broadcaster.start()
 
-host_name = "localhost"
-
-minio_client = Minio(
-    endpoint=os.getenv("MINIO_ENDPOINT"),
-    access_key=os.getenv("MINIO_ACCESS_KEY"),
-    secret_key=os.getenv("MINIO_SECRET_KEY"),
-    
-    # endpoint=f"{host_name}:9000",
-    # access_key="minioadmin",
-    # secret_key="minioadmin",
-    secure=False
-)
+@app.on_event("shutdown")
+async def shutdown():
+    await status_broadcaster.stop()
+    await embedding_service.stop()
+    await opensearch_client.close()
+
+# Page size limits for GET /documents
+DOCUMENTS_PAGE_SIZE = 50
+DOCUMENTS_MAX_PAGE_SIZE = 200
 
-# BUCKET_NAME = "raw-files"
+# Idle status streams get a comment line this often, so proxies don't drop them
+STATUS_HEARTBEAT_SECONDS = float(os.getenv("STATUS_HEARTBEAT_SECONDS", "15"))
 
-if not minio_client.bucket_exists(bucket_name=os.getenv("MINIO_BUCKET")):
-    minio_client.make_bucket(bucket_name=os.getenv("MINIO_BUCKET"))
+# Most files accepted by one /upload/batch request
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "100"))
 
-# In-memory document status storage (replace with DB later)
-DOCUMENT_STATUS = {}
+# Pipeline workers send this as a bearer token with PUT /status/{id} (their STATUS_API_TOKEN);
+# unset, status updates are refused
+STATUS_UPDATE_TOKEN = os.getenv("STATUS_UPDATE_TOKEN", "")
+# What PUT /status/{id} accepts: the upload, then the stages of common/document_status.py
+DOCUMENT_STATUSES = {
+    "uploaded", "converting", "converted", "chunking", "chunked", "indexing", "indexed", "failed",
+}
 
 UPLOAD_DIR = "storage"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
+def object_metadata(trace_id: str, document_id: uuid.UUID, user_id: str) -> dict:
+    # Read by the router and copied by every worker down to the indexed chunks,
+    # so search can filter on this document's id and owner
+    return {
+        TRACE_METADATA_KEY: trace_id,
+        DOCUMENT_METADATA_KEYS[DOCUMENT_ID_KEY]: str(document_id),
+        DOCUMENT_METADATA_KEYS[USER_ID_KEY]: user_id,
+    }
+
+
 @app.post("/upload")
 async def upload_file(
     user_id: str,
@@ -47,17 +102,16 @@ async def upload_file(
     db: AsyncSession = Depends(get_db)
 ):
     document_id = uuid.uuid4()
-    file_bytes = await file.read()
 
     object_name = f"{document_id}_{file.filename}"
 
-    # Upload to MinIO
-    minio_client.put_object(
-        bucket_name=os.getenv("MINIO_BUCKET"),
-        object_name=object_name,
-        data=io.BytesIO(file_bytes),
-        length=len(file_bytes)
-    )
+    # Upload to MinIO, streamed from the spooled request body. The trace id and
+    # document ids are stored as object metadata, which is where the pipeline picks them up.
+    with stage("upload", bytes=file.size):
+        await upload_stream(
+            object_name, file.file, file.size, file.content_type,
+            metadata=object_metadata(get_trace_id(), document_id, user_id),
+        )
 
     # --- INSERT INTO DATABASE ---
     new_document = Document(
@@ -72,43 +126,253 @@ async def upload_file(
     await db.commit()
     await db.refresh(new_document)
 
+    logger.info("uploaded document", extra={"document_id": str(new_document.id), "object_name": object_name})
     return {
         "document_id": str(new_document.id),
         "status": new_document.status,
         "filename": new_document.filename,
-        "stored_as": object_name
+        "stored_as": object_name,
+        "trace_id": get_trace_id(),
     }
 
 
-@app.post("/query")
-async def handle_query(document_id: str, query: str):
+@app.post("/upload/batch")
+async def upload_files(
+    user_id: str,
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Add your logic here to process queries on documents.
-    Example: Searching text, calling ML models, etc.
+    Upload many files at once. Files are streamed to MinIO concurrently (within
+    the upload slot limit) and all their rows are inserted in one statement.
     """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FILES} files per batch")
 
-    if document_id not in DOCUMENT_STATUS:
-        raise HTTPException(status_code=404, detail="Document not found")
+    document_ids = [uuid.uuid4() for _ in files]
+    object_names = [f"{document_id}_{file.filename}" for document_id, file in zip(document_ids, files)]
+    # Each file gets its own trace, so every document can be followed on its own
+    trace_ids = [uuid.uuid4().hex for _ in files]
+    with stage("upload", files=len(files)):
+        results = await asyncio.gather(
+            *[
+                upload_stream(
+                    object_name, file.file, file.size, file.content_type,
+                    metadata=object_metadata(trace_id, document_id, user_id),
+                )
+                for document_id, object_name, file, trace_id in zip(document_ids, object_names, files, trace_ids)
+            ],
+            return_exceptions=True,
+        )
 
-    # Update status
-    DOCUMENT_STATUS[document_id]["status"] = "processing_query"
+    rows, failed = [], []
+    trace_by_id = dict(zip(document_ids, trace_ids))
+    for document_id, object_name, file, result in zip(document_ids, object_names, files, results):
+        if isinstance(result, Exception):
+            logger.error("batch upload failed", extra={"file_name": file.filename, "error": str(result)})
+            failed.append({"filename": file.filename, "error": str(result)})
+            continue
+        rows.append({
+            "id": document_id,
+            "user_id": user_id,
+            "filename": file.filename,
+            "file_type": file.content_type,
+            "status": "uploaded",
+            "stored_as": object_name,
+        })
 
-    # Dummy response (replace with actual logic)
-    result = {
-        "document_id": document_id,
+    documents = []
+    if rows:
+        # One multi-row INSERT ... RETURNING instead of an add/commit/refresh per file
+        stored_as = {row["id"]: row.pop("stored_as") for row in rows}
+        result = await db.execute(
+            insert(Document).values(rows).returning(Document.id, Document.status, Document.filename)
+        )
+        documents = [
+            {
+                "document_id": str(row.id),
+                "status": row.status,
+                "filename": row.filename,
+                "stored_as": stored_as[row.id],
+                "trace_id": trace_by_id[row.id],
+            }
+            for row in result
+        ]
+        await db.commit()
+
+    return {"documents": documents, "failed": failed}
+
+
+def encode_cursor(created_at: datetime.datetime, document_id: uuid.UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(document_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        # Anything but the two strings encode_cursor writes is a cursor this API didn't issue
+        if not (isinstance(values, list) and len(values) == 2 and all(isinstance(v, str) for v in values)):
+            raise ValueError("malformed cursor")
+        created_at, document_id = values
+        return datetime.datetime.fromisoformat(created_at), uuid.UUID(document_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/documents")
+async def list_documents(
+    user_id: str,
+    status: Optional[str] = None,
+    file_type: Optional[str] = None,
+    limit: int = Query(DOCUMENTS_PAGE_SIZE, ge=1, le=DOCUMENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    A user's documents, newest first. Pages are keyset-paginated on
+    (created_at, id): pass next_cursor back as cursor to get the next page.
+    Every page is an index range scan, however deep it is.
+    """
+    query = select(Document).where(Document.user_id == user_id)
+    if status:
+        query = query.where(Document.status == status)
+    if file_type:
+        query = query.where(Document.file_type == file_type)
+    if cursor:
+        query = query.where(tuple_(Document.created_at, Document.id) < tuple_(*decode_cursor(cursor)))
+    # One extra row tells whether there is a next page
+    query = query.order_by(Document.created_at.desc(), Document.id.desc()).limit(limit + 1)
+
+    documents = (await db.execute(query)).scalars().all()
+    page = documents[:limit]
+    next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if len(documents) > limit else None
+
+    return {
+        "documents": [
+            {
+                "document_id": str(document.id),
+                "filename": document.filename,
+                "file_type": document.file_type,
+                "status": document.status,
+                "created_at": document.created_at.isoformat(),
+                "updated_at": document.updated_at.isoformat() if document.updated_at else None,
+            }
+            for document in page
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+@app.post("/query")
+async def handle_query(
+    query: str,
+    document_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+    top_k: int = Query(10, ge=1, le=100),
+):
+    """
+    Hybrid search over the indexed chunks: kNN on the query embedding and BM25
+    on content/title/tags, fused with reciprocal rank fusion. Optionally
+    restricted to one document and/or one user's documents.
+    """
+    try:
+        with stage("search"):
+            results = await hybrid_search(
+                query,
+                embed_query(query),
+                top_k=top_k,
+                document_id=document_id,
+                user_id=user_id,
+            )
+    except NotFoundError:
+        raise HTTPException(status_code=503, detail="Search index is not available yet")
+
+    return {
         "query": query,
-        "response": f"Dummy response for query: '{query}'",
+        "document_id": document_id,
+        "user_id": user_id,
+        "results": results,
     }
 
-    # Mark as ready
-    DOCUMENT_STATUS[document_id]["status"] = "query_completed"
 
-    return result
+@app.get("/status/stream")
+async def stream_status(
+    user_id: Optional[str] = None,
+    document_id: List[str] = Query(None),
+):
+    """
+    Server-Sent Events stream of status changes for one user's documents
+    and/or the given documents. The current status of each requested document
+    is sent first, then every change as it happens (pushed from Postgres
+    LISTEN/NOTIFY), so clients don't need to poll /status.
+    """
+    if not user_id and not document_id:
+        raise HTTPException(status_code=400, detail="Pass user_id and/or document_id")
+
+    async def events():
+        # Subscribe before reading current status, so no change in between is missed
+        subscription = status_broadcaster.subscribe(user_id, document_id or ())
+        queue = subscription[0]
+        try:
+            for doc_id in document_id or []:
+                current = await status_cache.get(doc_id)
+                if current:
+                    yield f"data: {json.dumps(current)}\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), STATUS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(payload)}\n\n"
+        finally:
+            status_broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/status/{document_id}")
 async def get_status(document_id: str):
-    if document_id not in DOCUMENT_STATUS:
+    payload = await status_cache.get(document_id)
+    if payload is None:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    return DOCUMENT_STATUS[document_id]
\ No newline at end of file
+    return payload
+
+
+def require_status_token(authorization: Optional[str] = Header(None)):
+    expected = f"Bearer {STATUS_UPDATE_TOKEN}".encode()
+    if not STATUS_UPDATE_TOKEN or not hmac.compare_digest((authorization or "").encode(), expected):
+        raise HTTPException(status_code=401, detail="Invalid status update token")
+
+
+@app.put("/status/{document_id}", dependencies=[Depends(require_status_token)])
+async def set_status(
+    document_id: uuid.UUID,
+    status: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Record a pipeline status change (called by the pipeline workers, with
+    STATUS_UPDATE_TOKEN). The table trigger notifies every gateway replica,
+    which refreshes its cache and pushes it to streams.
+    """
+    if status not in DOCUMENT_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status {status!r}")
+    result = await db.execute(
+        update(Document).where(Document.id == document_id).values(status=status).returning(Document)
+    )
+    document = result.scalar_one_or_none()
+    if document is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    payload = status_payload(document)
+    await db.commit()
+
+    status_cache.put(payload)
+    return payload
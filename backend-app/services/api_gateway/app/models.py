@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, TIMESTAMP
+from sqlalchemy import Column, Index, String, TIMESTAMP
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.sql import func
 import uuid
@@ -14,5 +14,12 @@ class Document(Base):
     filename = Column(String)
     file_type = Column(String)
     status = Column(String)
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
+
+    # Match db/tables_init.sql and db/migrations; they serve keyset pagination in GET /documents
+    __table_args__ = (
+        Index("documents_user_created_idx", user_id, created_at.desc(), id.desc()),
+        Index("documents_user_status_created_idx", user_id, status, created_at.desc(), id.desc()),
+        Index("documents_user_file_type_created_idx", user_id, file_type, created_at.desc(), id.desc()),
+    )
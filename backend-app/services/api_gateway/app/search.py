@@ -0,0 +1,108 @@
+from opensearchpy import AsyncOpenSearch
+from typing import Dict, List, Optional, Awaitable
+
+import asyncio
+import os
+
+from common.index_profiles import load_profile
+
+OPENSEARCH_HOST = os.getenv("OPENSEARCH_HOST", "localhost")
+OPENSEARCH_PORT = int(os.getenv("OPENSEARCH_PORT", "9200"))
+OPENSEARCH_INDEX = os.getenv("OPENSEARCH_INDEX", "semantic-chunks")
+OPENSEARCH_USE_SSL = os.getenv("OPENSEARCH_USE_SSL", "false").lower() == "true"
+
+# Each retriever returns this many candidates before fusion
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "50"))
+# Standard RRF damping constant
+RRF_K = 60
+# Must match the indexer's INDEX_PROFILE: byte indexes need byte-quantized query vectors
+INDEX = load_profile()
+
+opensearch_client = AsyncOpenSearch(
+    hosts=[{"host": OPENSEARCH_HOST.replace("https://", ""), "port": OPENSEARCH_PORT}],
+    http_auth=(os.getenv("OS_USER"), os.getenv("OS_PASS")) if os.getenv("OS_USER") else None,
+    use_ssl=OPENSEARCH_USE_SSL,
+    verify_certs=OPENSEARCH_USE_SSL,
+)
+
+
+def build_filters(document_id: Optional[str], user_id: Optional[str]) -> List[Dict]:
+    filters = []
+    if document_id:
+        filters.append({"term": {"documentId": document_id}})
+    if user_id:
+        filters.append({"term": {"userId": user_id}})
+    return filters
+
+
+def knn_body(query_vector: List[float], filters: List[Dict], size: int) -> Dict:
+    knn = INDEX.knn_query(query_vector, size)
+    if filters:
+        # Inside the knn clause (efficient filtering, lucene and faiss engines) the
+        # filter applies during the graph search, so a search scoped to one user or
+        # document still gets its top `size` hits; a bool filter around the clause
+        # would only filter the global top `size`, leaving little or nothing
+        knn["filter"] = {"bool": {"filter": filters}}
+    return {
+        "size": size,
+        "_source": {"excludes": ["embedding"]},
+        "query": {"knn": {"embedding": knn}},
+    }
+
+
+def bm25_body(query: str, filters: List[Dict], size: int) -> Dict:
+    return {
+        "size": size,
+        "_source": {"excludes": ["embedding"]},
+        "query": {
+            "bool": {
+                "must": [{"multi_match": {"query": query, "fields": ["content", "title^2", "tags^2"]}}],
+                "filter": filters,
+            }
+        },
+    }
+
+
+def reciprocal_rank_fusion(ranked_lists: Dict[str, List[Dict]], top_k: int, k: int = RRF_K) -> List[Dict]:
+    """
+    Fuse several ranked hit lists: each hit scores sum(1 / (k + rank)) over the
+    lists it appears in. Per-retriever ranks and raw scores are kept on the result.
+    """
+    fused: Dict[str, Dict] = {}
+    for name, hits in ranked_lists.items():
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.setdefault(hit["_id"], {"id": hit["_id"], "score": 0.0, **hit["_source"]})
+            entry["score"] += 1.0 / (k + rank)
+            entry[f"{name}_rank"] = rank
+            entry[f"{name}_score"] = hit["_score"]
+    return sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)[:top_k]
+
+
+async def hybrid_search(
+    query: str,
+    query_vector: Awaitable[List[float]],
+    top_k: int = 10,
+    document_id: Optional[str] = None,
+    user_id: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Run BM25 over content/title/tags and kNN over the chunk embeddings
+    concurrently, then fuse them with RRF. BM25 starts while the query is
+    still being embedded.
+    """
+    filters = build_filters(document_id, user_id)
+    size = max(SEARCH_CANDIDATES, top_k)
+    bm25 = asyncio.create_task(
+        opensearch_client.search(index=OPENSEARCH_INDEX, body=bm25_body(query, filters, size))
+    )
+    try:
+        vector = await query_vector
+        knn = await opensearch_client.search(index=OPENSEARCH_INDEX, body=knn_body(vector, filters, size))
+    except BaseException:
+        bm25.cancel()
+        raise
+    lexical = await bm25
+    return reciprocal_rank_fusion(
+        {"vector": knn["hits"]["hits"], "bm25": lexical["hits"]["hits"]},
+        top_k,
+    )
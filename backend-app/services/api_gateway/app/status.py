@@ -0,0 +1,172 @@
+from collections import OrderedDict
+from sqlalchemy import select
+from typing import Dict, Iterable, Optional, Set
+
+import asyncio
+import asyncpg
+import json
+import os
+import time
+import uuid
+
+from common.telemetry import logger
+
+from .database import DATABASE_URL, AsyncSessionLocal
+from .models import Document
+
+# Channel the documents table trigger publishes status changes on (see db/tables_init.sql)
+STATUS_CHANNEL = "document_status"
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "30"))
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "10000"))
+# Events buffered per stream subscriber; a client that falls further behind loses the oldest
+STATUS_SUBSCRIBER_BUFFER = int(os.getenv("STATUS_SUBSCRIBER_BUFFER", "256"))
+# Reconnect backoff of the LISTEN connection: doubles from the first to the second
+STATUS_LISTEN_RETRY_SECONDS = 1
+STATUS_LISTEN_MAX_RETRY_SECONDS = 30
+
+
+def status_payload(document: Document) -> Dict:
+    return {
+        "document_id": str(document.id),
+        "user_id": document.user_id,
+        "status": document.status,
+        "updated_at": document.updated_at.isoformat() if document.updated_at else None,
+    }
+
+
+class StatusCache:
+    """
+    TTL read-through cache of document status. Misses and expired entries
+    are read from the documents table; NOTIFY events keep entries fresh
+    between reads, so the TTL only bounds staleness if a notification is lost.
+    """
+
+    def __init__(self, ttl: float = STATUS_CACHE_TTL, max_entries: int = STATUS_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, payload: Dict):
+        document_id = payload["document_id"]
+        self._entries[document_id] = (time.monotonic() + self.ttl, payload)
+        self._entries.move_to_end(document_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _cached(self, document_id: str) -> Optional[Dict]:
+        entry = self._entries.get(document_id)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        self._entries.move_to_end(document_id)
+        return entry[1]
+
+    async def get(self, document_id: str) -> Optional[Dict]:
+        payload = self._cached(document_id)
+        if payload is not None:
+            self.hits += 1
+            return payload
+        self.misses += 1
+        try:
+            key = uuid.UUID(document_id)
+        except ValueError:
+            return None
+        async with AsyncSessionLocal() as session:
+            document = (await session.execute(select(Document).where(Document.id == key))).scalar_one_or_none()
+        if document is None:
+            return None
+        payload = status_payload(document)
+        self.put(payload)
+        return payload
+
+
+class StatusBroadcaster:
+    """
+    Holds one LISTEN connection to Postgres and fans status notifications out
+    to stream subscribers (and into the cache). Every replica runs its own, so
+    updates made anywhere reach clients connected to any replica.
+    """
+
+    def __init__(self, cache: StatusCache):
+        self.cache = cache
+        self._subscribers: Set[tuple] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _listen(self):
+        # asyncpg wants a plain postgresql:// URL, not SQLAlchemy's dialect+driver form
+        dsn = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+        delay = STATUS_LISTEN_RETRY_SECONDS
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(STATUS_CHANNEL, self._on_notify)
+                if connected_before:
+                    # Changes made while disconnected were never notified: read them from the table again
+                    self.cache.clear()
+                connected_before = True
+                delay = STATUS_LISTEN_RETRY_SECONDS
+                logger.info("listening for status changes", extra={"channel": STATUS_CHANNEL})
+                await lost.wait()
+                logger.warning("status LISTEN connection lost, reconnecting")
+            except Exception as e:
+                # Whatever failed (connect, LISTEN, a dropped socket), keep retrying: streams
+                # depend on this task, and it must not die with the exception
+                logger.warning("status LISTEN failed, retrying", extra={"error": repr(e), "retry_seconds": delay})
+                self._close(conn)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, STATUS_LISTEN_MAX_RETRY_SECONDS)
+            finally:
+                self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        if conn is not None and not conn.is_closed():
+            conn.terminate()
+
+    def _on_notify(self, connection, pid, channel, data: str):
+        self.publish(json.loads(data))
+
+    def publish(self, payload: Dict):
+        self.cache.put(payload)
+        for queue, user_id, document_ids in self._subscribers:
+            if user_id and payload.get("user_id") != user_id:
+                continue
+            if document_ids and payload["document_id"] not in document_ids:
+                continue
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+    def subscribe(self, user_id: Optional[str] = None, document_ids: Iterable[str] = ()) -> tuple:
+        subscription = (asyncio.Queue(STATUS_SUBSCRIBER_BUFFER), user_id, frozenset(document_ids))
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: tuple):
+        self._subscribers.discard(subscription)
+
+
+status_cache = StatusCache()
+status_broadcaster = StatusBroadcaster(status_cache)
@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+from minio import Minio
+from typing import BinaryIO, Dict, Optional
+
+import asyncio
+import os
+
+MINIO_BUCKET = os.getenv("MINIO_BUCKET")
+# Files are sent to MinIO in parts of this size (S3 minimum is 5 MiB), so an
+# upload holds at most (UPLOAD_PARALLEL_PARTS + 1) parts in memory
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(10 * 1024 * 1024)))
+UPLOAD_PARALLEL_PARTS = int(os.getenv("UPLOAD_PARALLEL_PARTS", "2"))
+# Uploads beyond this wait for a free slot instead of piling up memory and threads
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", "4"))
+
+minio_client = Minio(
+    endpoint=os.getenv("MINIO_ENDPOINT"),
+    access_key=os.getenv("MINIO_ACCESS_KEY"),
+    secret_key=os.getenv("MINIO_SECRET_KEY"),
+    secure=False
+)
+
+# The MinIO client is blocking; it runs here so the event loop keeps serving requests
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_UPLOADS, thread_name_prefix="minio")
+_upload_slots: Optional[asyncio.Semaphore] = None
+
+
+def ensure_bucket():
+    if not minio_client.bucket_exists(bucket_name=MINIO_BUCKET):
+        minio_client.make_bucket(bucket_name=MINIO_BUCKET)
+
+
+def _put_stream(object_name: str, stream: BinaryIO, length: int, content_type: str, metadata: Optional[Dict]):
+    return minio_client.put_object(
+        bucket_name=MINIO_BUCKET,
+        object_name=object_name,
+        data=stream,
+        length=length,
+        content_type=content_type or "application/octet-stream",
+        metadata=metadata,
+        part_size=UPLOAD_PART_SIZE,
+        num_parallel_uploads=UPLOAD_PARALLEL_PARTS,
+    )
+
+
+async def upload_stream(
+    object_name: str,
+    stream: BinaryIO,
+    length: Optional[int] = None,
+    content_type: str = None,
+    metadata: Optional[Dict] = None,
+):
+    """
+    Stream a file object to MinIO part by part (multipart upload for
+    anything over one part). Waits for a free slot when MAX_CONCURRENT_UPLOADS
+    uploads are already running. length=None means unknown.
+    """
+    global _upload_slots
+    if _upload_slots is None:
+        _upload_slots = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+    async with _upload_slots:
+        return await asyncio.get_running_loop().run_in_executor(
+            _executor, _put_stream, object_name, stream, -1 if length is None else length, content_type, metadata
+        )
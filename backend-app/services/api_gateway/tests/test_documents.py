@@ -0,0 +1,98 @@
+import asyncio
+import base64
+import datetime
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import main
+from app.database import Base, get_db
+from app.models import Document
+
+START = datetime.datetime(2025, 1, 1)
+
+
+@pytest.fixture
+def client(tmp_path):
+    # SQLite stands in for PostgreSQL: the keyset query only needs row-value comparison
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'documents.db'}")
+    Session = sessionmaker(bind=engine, class_=AsyncSession)
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with Session() as session:
+            for i in range(7):
+                session.add(Document(
+                    user_id="u1", filename=f"f{i}", file_type="pdf" if i % 2 else "docx",
+                    status="indexed" if i < 4 else "chunking",
+                    # Two documents per timestamp: id breaks the tie
+                    created_at=START + datetime.timedelta(minutes=i // 2),
+                ))
+            session.add(Document(user_id="u2", filename="other", file_type="pdf", status="indexed", created_at=START))
+            await session.commit()
+
+    async def override_get_db():
+        async with Session() as session:
+            yield session
+
+    asyncio.run(setup())
+    main.app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(main.app)
+    main.app.dependency_overrides.clear()
+    asyncio.run(engine.dispose())
+
+
+def all_pages(client, **params):
+    pages, cursor = [], None
+    while True:
+        response = client.get("/documents", params={"user_id": "u1", **params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.json()
+        pages.append([document["filename"] for document in body["documents"]])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return pages
+
+
+def test_first_page_is_newest_first(client):
+    body = client.get("/documents", params={"user_id": "u1", "limit": 3}).json()
+    created = [document["created_at"] for document in body["documents"]]
+    assert len(created) == 3 and created == sorted(created, reverse=True)
+    assert created[0] == (START + datetime.timedelta(minutes=3)).isoformat()
+    assert body["next_cursor"]
+
+
+def test_cursor_walks_every_document_once(client):
+    pages = all_pages(client, limit=2)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    filenames = [name for page in pages for name in page]
+    assert sorted(filenames) == [f"f{i}" for i in range(7)]
+
+
+def test_filters(client):
+    assert sorted(sum(all_pages(client, limit=2, status="indexed"), [])) == ["f0", "f1", "f2", "f3"]
+    assert sorted(sum(all_pages(client, limit=2, file_type="pdf"), [])) == ["f1", "f3", "f5"]
+    assert sum(all_pages(client, status="chunking", file_type="docx"), []) == ["f6", "f4"]
+
+
+def cursor_of(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    cursor_of({"a": 1}),
+    cursor_of(["2025-01-01T00:00:00"]),
+    cursor_of(["2025-01-01T00:00:00", 123]),
+    cursor_of(["yesterday", str(uuid.uuid4())]),
+    cursor_of(["2025-01-01T00:00:00", "not-a-uuid"]),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_invalid_cursor_is_a_bad_request(client, cursor):
+    response = client.get("/documents", params={"user_id": "u1", "cursor": cursor})
+    assert response.status_code == 400
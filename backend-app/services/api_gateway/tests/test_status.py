@@ -0,0 +1,100 @@
+import asyncio
+
+import asyncpg
+
+from app import status
+from app.status import StatusBroadcaster, StatusCache
+
+
+class FakeConnection:
+    def __init__(self, fail_listen=False):
+        self.fail_listen = fail_listen
+        self.closed = False
+        self.on_terminate = None
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    async def add_listener(self, channel, callback):
+        if self.fail_listen:
+            raise asyncpg.InterfaceError("connection was closed in the middle of operation")
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        self.closed = True
+
+    def drop(self):
+        self.closed = True
+        self.on_terminate(self)
+
+
+def test_listener_retries_until_listening(monkeypatch):
+    # A refused connection, then a LISTEN that fails, then one that works
+    outcomes = [OSError("connection refused"), FakeConnection(fail_listen=True), FakeConnection()]
+    attempts = []
+
+    async def connect(dsn):
+        attempts.append(dsn)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+    monkeypatch.setattr(status, "STATUS_LISTEN_RETRY_SECONDS", 0.01)
+
+    async def run():
+        broadcaster = StatusBroadcaster(StatusCache())
+        await broadcaster.start()
+        await asyncio.sleep(0.2)
+        running = not broadcaster._task.done()
+        await broadcaster.stop()
+        return running
+
+    assert asyncio.run(run())
+    assert len(attempts) == 3
+    assert attempts[0].startswith("postgresql://")
+
+
+def test_listener_reconnects_and_clears_cache(monkeypatch):
+    connections = [FakeConnection(), FakeConnection()]
+    remaining = iter(connections)
+
+    async def connect(dsn):
+        return next(remaining)
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+
+    async def run():
+        cache = StatusCache()
+        broadcaster = StatusBroadcaster(cache)
+        await broadcaster.start()
+        await asyncio.sleep(0.05)
+        cache.put({"document_id": "d1", "status": "chunking"})
+        connections[0].drop()
+        await asyncio.sleep(0.05)
+        await broadcaster.stop()
+        return cache._cached("d1")
+
+    # The status cached before the drop may have changed unnoticed, so it is dropped too
+    assert asyncio.run(run()) is None
+    # Listening again on the second connection
+    assert connections[1].on_terminate is not None
+
+
+def test_status_update_requires_token(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main
+
+    client = TestClient(main.app)
+    url = "/status/00000000-0000-0000-0000-000000000001?status=indexed"
+    # No token configured: nobody may update statuses
+    assert client.put(url, headers={"Authorization": "Bearer "}).status_code == 401
+
+    monkeypatch.setattr(main, "STATUS_UPDATE_TOKEN", "secret")
+    assert client.put(url).status_code == 401
+    assert client.put(url, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.put(url.replace("indexed", "bogus"), headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 400
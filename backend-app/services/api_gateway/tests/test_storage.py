@@ -0,0 +1,150 @@
+import asyncio
+import io
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from minio import Minio
+
+from app import storage
+
+PART_SIZE = 5 * 1024 * 1024  # the smallest part MinIO (and S3) accept
+
+
+class FakeMinio(ThreadingHTTPServer):
+    """
+    The S3 object and multipart upload calls the gateway's MinIO client makes.
+    Records uploads, parts, completions and aborts.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeMinioHandler)
+        self.objects = {}
+        self.uploads = {}
+        self.completed = []
+        self.aborted = []
+
+
+class FakeMinioHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status=200, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _request(self):
+        url = urlparse(self.path)
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        return url.path.lstrip("/"), parse_qs(url.query, keep_blank_values=True), data
+
+    def do_PUT(self):
+        key, query, data = self._request()
+        if "uploadId" in query:
+            self.server.uploads[query["uploadId"][0]][int(query["partNumber"][0])] = len(data)
+        else:
+            self.server.objects[key] = data
+        self._reply(headers={"ETag": f'"{uuid.uuid4().hex}"'})
+
+    def do_POST(self):
+        key, query, _ = self._request()
+        if "uploads" in query:
+            upload_id = uuid.uuid4().hex
+            self.server.uploads[upload_id] = {}
+            body = (f"<InitiateMultipartUploadResult><Bucket>{key.split('/')[0]}</Bucket>"
+                    f"<Key>{key}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+        else:
+            upload_id = query["uploadId"][0]
+            self.server.completed.append(upload_id)
+            self.server.objects[key] = sum(self.server.uploads[upload_id].values())
+            body = (f"<CompleteMultipartUploadResult><Location>/{key}</Location><Bucket>{key.split('/')[0]}</Bucket>"
+                    f"<Key>{key}</Key><ETag>\"x\"</ETag></CompleteMultipartUploadResult>")
+        self._reply(body=body.encode(), headers={"Content-Type": "application/xml"})
+
+    def do_DELETE(self):
+        _, query, _ = self._request()
+        self.server.aborted.append(query["uploadId"][0])
+        self._reply(204)
+
+
+@pytest.fixture
+def minio(monkeypatch):
+    server = FakeMinio()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = Minio(f"127.0.0.1:{server.server_port}", access_key="test", secret_key="test",
+                   secure=False, region="us-east-1")
+    monkeypatch.setattr(storage, "minio_client", client)
+    monkeypatch.setattr(storage, "MINIO_BUCKET", "documents")
+    monkeypatch.setattr(storage, "UPLOAD_PART_SIZE", PART_SIZE)
+    monkeypatch.setattr(storage, "_upload_slots", None)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class DisconnectingStream(io.RawIOBase):
+    # A request body that fails part-way, like a client going away mid-upload
+    def __init__(self, fail_after):
+        self.remaining = fail_after
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.remaining <= 0:
+            raise ConnectionResetError("client disconnected")
+        n = min(len(buffer), self.remaining)
+        buffer[:n] = b"x" * n
+        self.remaining -= n
+        return n
+
+
+def upload(stream, length):
+    return asyncio.run(storage.upload_stream("doc.pdf", stream, length, "application/pdf"))
+
+
+def test_large_upload_is_sent_in_parts(minio):
+    size = 2 * PART_SIZE + 123
+    upload(io.BytesIO(b"x" * size), size)
+    (upload_id,) = minio.completed
+    # Parts go up UPLOAD_PARALLEL_PARTS at a time, so they may arrive in any order
+    assert minio.uploads[upload_id] == {1: PART_SIZE, 2: PART_SIZE, 3: 123}
+    assert minio.objects["documents/doc.pdf"] == size
+    assert minio.aborted == []
+
+
+def test_unknown_length_is_streamed(minio):
+    size = PART_SIZE + 1
+    upload(io.BytesIO(b"x" * size), None)
+    assert minio.objects["documents/doc.pdf"] == size
+
+
+def test_disconnect_aborts_multipart_upload(minio):
+    with pytest.raises(ConnectionResetError):
+        upload(io.BufferedReader(DisconnectingStream(PART_SIZE + 10)), 3 * PART_SIZE)
+    # The parts already sent are discarded instead of lingering as an incomplete upload
+    assert len(minio.aborted) == 1
+    assert minio.completed == []
+    assert "documents/doc.pdf" not in minio.objects
+
+
+def test_short_body_aborts_multipart_upload(minio):
+    # Fewer bytes than the declared size: the object must not be completed truncated
+    with pytest.raises(IOError):
+        upload(io.BytesIO(b"x" * (PART_SIZE + 10)), 3 * PART_SIZE)
+    assert len(minio.aborted) == 1
+    assert minio.completed == []
+
+
+def test_small_upload_is_a_single_put(minio):
+    upload(io.BytesIO(b"hello"), 5)
+    assert minio.objects["documents/doc.pdf"] == b"hello"
+    assert minio.uploads == {}
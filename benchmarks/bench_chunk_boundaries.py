@@ -0,0 +1,90 @@
+"""
+Micro-benchmark: chunk boundary detection in the semantic chunker.
+
+Compares the original per-paragraph loop (np.mean over the current chunk +
+util.cos_sim) against the NumPy engine in chunk_boundaries.py on synthetic
+documents. No models are loaded; embeddings are random, clustered vectors.
+
+    python benchmarks/bench_chunk_boundaries.py --paragraphs 10000 20000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'docker', 'semantic-chunking-image', 'app'))
+from chunk_boundaries import find_chunk_boundaries  # noqa: E402
+
+try:
+    from sentence_transformers import util
+except ImportError:
+    util = None
+
+
+def cos_sim(a, b):
+    if util is not None:
+        return util.cos_sim(a, b).item()
+    return float(a @ b / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+
+def legacy_boundaries(embeddings, lengths, max_chunk_size, similarity_threshold):
+    # The loop chunk_text_semantic used before the NumPy engine, reduced to spans
+    spans = []
+    start = 0
+    current_len = lengths[0]
+    current_embeds = [embeddings[0]]
+    for i in range(1, len(embeddings)):
+        sim = cos_sim(np.mean(current_embeds, axis=0), embeddings[i])
+        if current_len < max_chunk_size and sim > similarity_threshold:
+            current_len += 1 + lengths[i]
+            current_embeds.append(embeddings[i])
+        else:
+            spans.append((start, i))
+            start = i
+            current_len = lengths[i]
+            current_embeds = [embeddings[i]]
+    spans.append((start, len(embeddings)))
+    return spans
+
+
+def synthetic_document(n, dim=384, topic_len=12, seed=0):
+    # Runs of paragraphs share a topic vector so the threshold actually merges them
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n // topic_len + 1, dim))
+    embeddings = np.repeat(topics, topic_len, axis=0)[:n] + 0.6 * rng.normal(size=(n, dim))
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    lengths = rng.integers(20, 120, size=n).tolist()
+    return embeddings.astype(np.float32), lengths
+
+
+def timed(fn, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paragraphs', type=int, nargs='+', default=[10000, 20000])
+    parser.add_argument('--max-chunk-size', type=int, default=500)
+    parser.add_argument('--threshold', type=float, default=0.6)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"baseline cos_sim: {'sentence_transformers.util' if util else 'numpy fallback'}")
+    print(f"{'paragraphs':>10} {'max_chunk':>9} {'chunks':>7} {'legacy (s)':>11} {'numpy (s)':>10} {'speedup':>8}")
+    for n in args.paragraphs:
+        embeddings, lengths = synthetic_document(n)
+        legacy_t, legacy_spans = timed(legacy_boundaries, embeddings, lengths, args.max_chunk_size, args.threshold, repeat=args.repeat)
+        fast_t, fast_spans = timed(find_chunk_boundaries, embeddings, lengths, args.max_chunk_size, args.threshold, repeat=args.repeat)
+        if legacy_spans != fast_spans:
+            print(f"!! boundary mismatch for n={n}: {len(legacy_spans)} vs {len(fast_spans)} chunks")
+        print(f"{n:>10} {args.max_chunk_size:>9} {len(fast_spans):>7} {legacy_t:>11.3f} {fast_t:>10.3f} {legacy_t / fast_t:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Embedding backends: startup time, encode throughput and drift from the fp32 baseline.
+
+Startup is measured in a fresh interpreter per backend (import + model load +
+first encode), which is what a newly scaled-out worker pays. Throughput is
+texts/second encoding the corpus in --batch-size batches. Drift compares every
+backend's vectors with the torch fp32 vectors of the same texts: cosine
+similarity (mean / p1 / min) and how often each text's nearest neighbour in
+the corpus stays the same.
+
+    python -m common.embedding_backend export /models/minilm        # from docker/, once
+    python benchmarks/bench_embedding_backends.py --model-dir /models/minilm
+    python benchmarks/bench_embedding_backends.py --model-dir /models/minilm --corpus paragraphs.txt --texts 5000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+DOCKER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docker")
+sys.path.insert(0, DOCKER_DIR)
+from common.embedding_backend import OnnxBackend, TorchBackend  # noqa: E402
+
+WORDS = (
+    "loan interest rate customer account branch repayment term notice clause early penalty late fee "
+    "collateral valuation contract agreement bank credit card limit statement transfer deposit "
+    "identification requirement policy approval risk assessment maturity principal schedule"
+).split()
+
+STARTUP_SCRIPT = """
+import sys, time, json
+t0 = time.perf_counter()
+sys.path.insert(0, {docker_dir!r})
+from common.embedding_backend import OnnxBackend, TorchBackend
+backend = {cls}(**json.loads({kwargs!r}))
+t1 = time.perf_counter()
+backend.encode(["warm up"])
+t2 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "first_encode_s": t2 - t1}}))
+"""
+
+
+def synthetic_corpus(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    # Paragraph-ish lengths, short headings to long clauses
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.choice((4, 12, 30, 60, 120)))) for _ in range(n)]
+
+
+def startup(cls: type, kwargs: dict) -> dict:
+    t0 = time.perf_counter()
+    script = STARTUP_SCRIPT.format(docker_dir=DOCKER_DIR, cls=cls.__name__, kwargs=json.dumps(kwargs))
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True, text=True, check=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["total_s"] = time.perf_counter() - t0
+    return result
+
+
+def throughput(backend, texts, batch_size: int) -> tuple:
+    backend.encode(texts[:batch_size], batch_size=batch_size)  # warm-up
+    t0 = time.perf_counter()
+    vectors = np.asarray(backend.encode(texts, batch_size=batch_size), dtype=np.float32)
+    return len(texts) / (time.perf_counter() - t0), vectors
+
+
+def normalized(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def drift(baseline: np.ndarray, vectors: np.ndarray) -> dict:
+    baseline, vectors = normalized(baseline), normalized(vectors)
+    cosine = (baseline * vectors).sum(axis=1)
+
+    def nearest(v):
+        similarities = v @ v.T
+        np.fill_diagonal(similarities, -np.inf)
+        return similarities.argmax(axis=1)
+
+    return {
+        "cosine_mean": float(cosine.mean()),
+        "cosine_p1": float(np.percentile(cosine, 1)),
+        "cosine_min": float(cosine.min()),
+        "nn_agreement": float((nearest(baseline) == nearest(vectors)).mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-dir", required=True, help="directory written by `common.embedding_backend export`")
+    parser.add_argument("--model", help="sentence-transformers model for the torch baseline (default: the exported one)")
+    parser.add_argument("--corpus", help="text file, one paragraph per line (default: synthetic)")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX Runtime intra-op threads (0: all cores)")
+    parser.add_argument("--skip-startup", action="store_true")
+    parser.add_argument("--output", help="also write the report as JSON here")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()][:args.texts]
+    else:
+        texts = synthetic_corpus(args.texts)
+    with open(os.path.join(args.model_dir, "embedding_config.json")) as f:
+        model_name = args.model or json.load(f)["model"]
+
+    backends = {"torch-fp32": (TorchBackend, {"model_name": model_name})}
+    for name, model_file in (("onnx-fp32", "model.onnx"), ("onnx-int8", "model_int8.onnx")):
+        if os.path.exists(os.path.join(args.model_dir, model_file)):
+            backends[name] = (OnnxBackend, {"model_dir": args.model_dir, "model_file": model_file, "threads": args.threads})
+
+    report = {"texts": len(texts), "batch_size": args.batch_size, "backends": {}}
+    baseline = None
+    for name, (cls, kwargs) in backends.items():
+        entry = report["backends"][name] = {}
+        if not args.skip_startup:
+            entry["startup"] = startup(cls, kwargs)
+        backend = cls(**kwargs)
+        entry["texts_per_s"], vectors = throughput(backend, texts, args.batch_size)
+        if baseline is None:
+            baseline = vectors
+        else:
+            entry["drift"] = drift(baseline, vectors)
+
+    print(f"{len(texts)} texts, batch size {args.batch_size}")
+    print(f"{'backend':<12} {'startup s':>10} {'texts/s':>10} {'cos mean':>9} {'cos p1':>9} {'cos min':>9} {'nn agree':>9}")
+    for name, entry in report["backends"].items():
+        start = f"{entry['startup']['total_s']:.2f}" if "startup" in entry else "-"
+        d = entry.get("drift")
+        cols = [f"{d[k]:.4f}" for k in ("cosine_mean", "cosine_p1", "cosine_min", "nn_agreement")] if d else ["-"] * 4
+        print(f"{name:<12} {start:>10} {entry['texts_per_s']:>10.1f} " + " ".join(f"{c:>9}" for c in cols))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+HTML-to-text extraction for the semantic chunker: streaming lxml blocks vs BeautifulSoup.
+
+Parses large HTML documents (pandoc-style synthetic ones by default) with
+- bs4:    BeautifulSoup(html, 'html.parser').get_text('\\n'), the previous extract_text
+- blocks: html_blocks.iter_html_blocks, streamed from a file object
+and reports time, MB/s, peak RSS growth (each run in a fresh child process),
+paragraphs/blocks produced, and how many paragraph boundaries still need a
+similarity computed once headings are hard chunk boundaries.
+
+    python benchmarks/bench_html_extraction.py --sections 2000
+    python benchmarks/bench_html_extraction.py --html converted/*.html --repeat 5
+"""
+import argparse
+import glob
+import io
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+APP_DIR = os.path.join(os.path.dirname(__file__), "..", "docker", "semantic-chunking-image", "app")
+sys.path.insert(0, APP_DIR)
+from html_blocks import iter_html_blocks  # noqa: E402
+
+WORDS = (
+    "loan interest rate customer account branch repayment term notice clause early penalty late fee "
+    "collateral valuation contract agreement bank credit card limit statement transfer deposit"
+).split()
+
+
+def synthetic_html(sections: int, seed: int = 0) -> bytes:
+    # Roughly what pandoc makes of a long contract: headings, paragraphs, lists and tables
+    rng = random.Random(seed)
+
+    def sentence(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+    parts = ['<!DOCTYPE html>\n<html xmlns="http://www.w3.org/1999/xhtml" lang="" xml:lang="">\n<head>\n'
+             '<meta charset="utf-8" />\n<title>doc</title>\n<style>body { margin: 0 }</style>\n</head>\n<body>\n']
+    for s in range(sections):
+        parts.append(f'<h{1 if s % 5 == 0 else 2} id="section-{s}">Section {s} {sentence(3)}</h{1 if s % 5 == 0 else 2}>\n')
+        for _ in range(rng.randint(2, 6)):
+            parts.append(f"<p>{sentence(rng.randint(15, 60))} <strong>{sentence(3)}</strong> {sentence(20)}</p>\n")
+        if s % 3 == 0:
+            parts.append("<ul>\n" + "".join(f"<li>{sentence(12)}</li>\n" for _ in range(rng.randint(3, 8))) + "</ul>\n")
+        if s % 4 == 0:
+            rows = "".join(f"<tr><td>{sentence(2)}</td><td>{rng.randint(1, 999)}</td><td>{sentence(4)}</td></tr>\n"
+                           for _ in range(rng.randint(3, 12)))
+            parts.append(f"<table>\n<thead><tr><th>Item</th><th>Amount</th><th>Notes</th></tr></thead>\n<tbody>\n{rows}</tbody>\n</table>\n")
+    parts.append("</body>\n</html>\n")
+    return "".join(parts).encode("utf-8")
+
+
+def run_bs4(data: bytes) -> dict:
+    from bs4 import BeautifulSoup
+    text = BeautifulSoup(data.decode("utf-8"), "html.parser").get_text(separator="\n")
+    paragraphs = [line.strip() for line in text.split("\n") if line.strip()]
+    return {"paragraphs": len(paragraphs), "similarities": max(0, len(paragraphs) - 1)}
+
+
+def run_blocks(data: bytes) -> dict:
+    blocks = list(iter_html_blocks(io.BytesIO(data)))
+    breaks = sum(1 for i, b in enumerate(blocks) if b.kind == "heading" and i and blocks[i - 1].kind != "heading")
+    kinds = {}
+    for block in blocks:
+        kinds[block.kind] = kinds.get(block.kind, 0) + 1
+    return {"paragraphs": len(blocks), "similarities": max(0, len(blocks) - 1 - breaks), "kinds": kinds}
+
+
+METHODS = {"bs4": run_bs4, "blocks": run_blocks}
+
+
+def _child(method: str, data: bytes, conn):
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    result = METHODS[method](data)
+    result["seconds"] = time.perf_counter() - t0
+    # ru_maxrss is in KiB on Linux
+    result["peak_rss_mb"] = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024
+    conn.send(result)
+    conn.close()
+
+
+def measure(method: str, data: bytes) -> dict:
+    # A fresh process per run, so peak RSS isn't hidden by an earlier, larger run
+    ctx = multiprocessing.get_context("fork")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child, args=(method, data, child))
+    process.start()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--html", nargs="*", help="HTML files to parse (default: one synthetic document)")
+    parser.add_argument("--sections", type=int, default=2000, help="size of the synthetic document")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--methods", default=",".join(METHODS))
+    args = parser.parse_args()
+
+    if args.html:
+        documents = []
+        for pattern in args.html:
+            for path in sorted(glob.glob(pattern)):
+                with open(path, "rb") as f:
+                    documents.append((os.path.basename(path), f.read()))
+    else:
+        documents = [(f"synthetic-{args.sections}-sections", synthetic_html(args.sections))]
+
+    methods = args.methods.split(",")
+    print(f"{'document':<28} {'method':<7} {'MB':>6} {'best s':>8} {'MB/s':>7} {'peak RSS MB':>11} "
+          f"{'paragraphs':>10} {'similarities':>12}")
+    for name, data in documents:
+        mb = len(data) / 1024 ** 2
+        for method in methods:
+            runs = [measure(method, data) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r["seconds"])
+            print(f"{name[:28]:<28} {method:<7} {mb:>6.1f} {best['seconds']:>8.3f} {mb / best['seconds']:>7.1f} "
+                  f"{max(r['peak_rss_mb'] for r in runs):>11.1f} {best['paragraphs']:>10} {best['similarities']:>12}")
+            if best.get("kinds"):
+                print(f"{'':<28} {'':<7} blocks: " + ", ".join(f"{k} {v}" for k, v in sorted(best["kinds"].items())))
+
+
+if __name__ == "__main__":
+    main()
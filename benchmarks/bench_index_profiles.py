@@ -0,0 +1,179 @@
+"""
+Recall vs latency of the OpenSearch kNN index profiles (common/index_profiles.py).
+
+For each profile, creates a scratch index on a running OpenSearch, bulk-indexes
+the fixture corpus and sweeps ef_search. At each ef_search it runs the queries
+and reports:
+- recall@k against exact cosine search (numpy)
+- p50/p95/p99 query latency
+- the bulk payload per vector
+- OpenSearch's graph memory estimate and the kNN graph memory actually used
+
+    python benchmarks/bench_index_profiles.py --host localhost --port 9200
+    python benchmarks/bench_index_profiles.py --profiles float32,fp16,byte --vectors 100000 --ef-search 32,64,128,256
+    python benchmarks/bench_index_profiles.py --corpus embeddings.npy --queries 500   # real chunk embeddings
+    python benchmarks/bench_index_profiles.py --print-bodies   # just the index definitions, no cluster needed
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from dataclasses import replace
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "docker"))
+from common.index_profiles import PROFILES  # noqa: E402
+
+
+def synthetic_vectors(n, dim, seed):
+    # Clustered, like real chunk embeddings, so ANN structures have something to exploit
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 50), dim))
+    vectors = centers[rng.integers(0, len(centers), size=n)] + 0.5 * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def index_body(profile, dim):
+    return {
+        "settings": profile.index_settings(dim),
+        "mappings": {"properties": {"embedding": profile.embedding_mapping(dim)}},
+    }
+
+
+def bulk_index(client, helpers, index, profile, vectors, batch):
+    payload = 0
+
+    def actions():
+        nonlocal payload
+        for i, vector in enumerate(vectors):
+            source = {"embedding": profile.encode(vector)}
+            payload += len(json.dumps(source, separators=(",", ":")))
+            yield {"_index": index, "_id": str(i), "_source": source}
+
+    t0 = time.perf_counter()
+    helpers.bulk(client, actions(), chunk_size=batch, request_timeout=300)
+    client.indices.refresh(index=index)
+    return time.perf_counter() - t0, payload / len(vectors)
+
+
+def graph_memory_kb(client):
+    stats = client.transport.perform_request("GET", "/_plugins/_knn/stats")
+    return sum(node.get("graph_memory_usage", 0) for node in stats.get("nodes", {}).values())
+
+
+def run_queries(client, index, profile, queries, k, ef_search):
+    if profile.engine != "lucene":
+        client.indices.put_settings(index=index, body={"index": {"knn.algo_param.ef_search": ef_search}})
+    latencies, results = [], []
+    for query in queries:
+        body = {"size": k, "_source": False, "query": {"knn": {"embedding": profile.knn_query(query, k, ef_search)}}}
+        t0 = time.perf_counter()
+        response = client.search(index=index, body=body)
+        latencies.append((time.perf_counter() - t0) * 1000)
+        results.append([int(hit["_id"]) for hit in response["hits"]["hits"]])
+    return latencies, results
+
+
+def recall_at_k(results, truth, k):
+    return float(np.mean([len(set(found[:k]) & set(expected[:k])) / k for found, expected in zip(results, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--use-ssl", action="store_true")
+    parser.add_argument("--user", default=os.environ.get("OS_USER"))
+    parser.add_argument("--password", default=os.environ.get("OS_PASS"))
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--corpus", help=".npy file of chunk embeddings (default: synthetic)")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", default="32,64,128,256")
+    parser.add_argument("--replicas", type=int, default=0, help="scratch indexes are single-node by default")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--index-prefix", default="bench-profile")
+    parser.add_argument("--keep", action="store_true", help="don't delete the scratch indexes")
+    parser.add_argument("--print-bodies", action="store_true")
+    parser.add_argument("--output", help="also write the report as JSON here")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    profiles = [replace(PROFILES[name], replicas=args.replicas, shards=1) for name in args.profiles.split(",")]
+    if args.print_bodies:
+        for profile in profiles:
+            print(f"# {profile.name}")
+            print(json.dumps(index_body(profile, args.dim), indent=2))
+        return
+
+    from opensearchpy import OpenSearch, helpers
+
+    client = OpenSearch(
+        hosts=[{"host": args.host, "port": args.port}],
+        http_auth=(args.user, args.password) if args.user else None,
+        use_ssl=args.use_ssl, verify_certs=False, timeout=120,
+    )
+
+    if args.corpus:
+        corpus = np.load(args.corpus).astype(np.float32)
+        corpus /= np.linalg.norm(corpus, axis=1, keepdims=True)
+        rng = np.random.default_rng(args.seed)
+        # Queries are perturbed corpus vectors: near neighbours exist, but aren't the vector itself
+        queries = corpus[rng.integers(0, len(corpus), size=args.queries)] + 0.05 * rng.normal(size=(args.queries, corpus.shape[1]))
+        queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+    else:
+        corpus = synthetic_vectors(args.vectors, args.dim, args.seed)
+        queries = synthetic_vectors(args.queries, args.dim, args.seed + 1)
+    dim = corpus.shape[1]
+    truth = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k].tolist()
+    ef_values = [int(v) for v in args.ef_search.split(",")]
+
+    report = {"vectors": len(corpus), "dim": dim, "queries": len(queries), "k": args.k, "profiles": []}
+    print(f"{len(corpus)} vectors x {dim}, {len(queries)} queries, recall@{args.k}\n")
+    print(f"{'profile':<12} {'engine':<7} {'dtype':<6} {'m':>3} {'efC':>4} {'efS':>4} {'B/vec sent':>10} "
+          f"{'est mem/vec':>11} {'graph KB':>9} {'recall':>7} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7}")
+    for profile in profiles:
+        index = f"{args.index_prefix}-{profile.name}"
+        if client.indices.exists(index=index):
+            client.indices.delete(index=index)
+        memory_before = graph_memory_kb(client)
+        client.indices.create(index=index, body=index_body(profile, dim))
+        try:
+            index_seconds, payload = bulk_index(client, helpers, index, profile, corpus, args.batch)
+            # Load the graphs before timing, so the first queries don't pay for it
+            client.transport.perform_request("GET", f"/_plugins/_knn/warmup/{index}")
+            graph_kb = graph_memory_kb(client) - memory_before
+            entry = {
+                "profile": profile.name, "engine": profile.engine, "data_type": profile.data_type,
+                "m": profile.m, "ef_construction": profile.ef_construction,
+                "index_seconds": round(index_seconds, 2), "payload_bytes_per_vector": round(payload, 1),
+                "estimated_memory_bytes_per_vector": round(profile.vector_memory_bytes(dim), 1),
+                "graph_memory_kb": graph_kb, "runs": [],
+            }
+            for ef_search in ef_values:
+                run_queries(client, index, profile, queries[:10], args.k, ef_search)  # warm-up
+                latencies, results = run_queries(client, index, profile, queries, args.k, ef_search)
+                p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+                recall = recall_at_k(results, truth, args.k)
+                entry["runs"].append({"ef_search": ef_search, "recall": recall,
+                                      "p50_ms": p50, "p95_ms": p95, "p99_ms": p99})
+                print(f"{profile.name:<12} {profile.engine:<7} {profile.data_type:<6} {profile.m:>3} "
+                      f"{profile.ef_construction:>4} {ef_search:>4} {payload:>10.0f} "
+                      f"{profile.vector_memory_bytes(dim):>11.0f} {graph_kb:>9} {recall:>7.3f} "
+                      f"{p50:>7.2f} {p95:>7.2f} {p99:>7.2f}")
+            report["profiles"].append(entry)
+        finally:
+            if not args.keep:
+                client.indices.delete(index=index)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+OCR throughput: the original single-call pytesseract path vs OcrEngine.
+
+Runs over a directory of fixture images (--images), or over synthetic
+"scans" generated with Pillow when no directory is given, and reports
+images/sec and seconds per image for each path. Requires the tesseract
+binary.
+
+    python benchmarks/bench_ocr.py --images ./fixtures/scans
+    python benchmarks/bench_ocr.py --synthetic 8 --processes 4
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+import pytesseract
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "docker"))
+from common.ocr_engine import OcrEngine  # noqa: E402
+
+LINE = "The borrower shall repay the principal amount together with accrued interest on each due date."
+
+
+def synthetic_scan(pages, seed):
+    # A4 at 300 DPI with a light gray background, so binarization has work to do
+    frames = []
+    for page in range(pages):
+        img = Image.new("RGB", (2480, 3508), (235, 235, 230))
+        draw = ImageDraw.Draw(img)
+        for i, y in enumerate(range(150, 3400, 48)):
+            draw.text((150, y), f"{seed}.{page}.{i} {LINE}", fill=(30, 30, 30))
+        frames.append(img)
+    buffer = io.BytesIO()
+    frames[0].save(buffer, "TIFF", save_all=True, append_images=frames[1:], dpi=(300, 300))
+    return buffer.getvalue()
+
+
+def load_fixtures(directory):
+    return [open(os.path.join(directory, name), "rb").read() for name in sorted(os.listdir(directory))
+            if name.lower().endswith((".png", ".jpg", ".jpeg", ".tif", ".tiff"))]
+
+
+def baseline(data):
+    # What process_image used to do: one tesseract call on the raw first frame
+    return pytesseract.image_to_string(Image.open(io.BytesIO(data)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="directory of fixture images")
+    parser.add_argument("--synthetic", type=int, default=6, help="number of synthetic scans if --images is not set")
+    parser.add_argument("--pages", type=int, default=1, help="pages per synthetic scan")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    images = load_fixtures(args.images) if args.images else [synthetic_scan(args.pages, i) for i in range(args.synthetic)]
+    print(f"{len(images)} images, {args.processes} OCR processes")
+
+    t0 = time.perf_counter()
+    for data in images:
+        baseline(data)
+    baseline_time = time.perf_counter() - t0
+
+    engine = OcrEngine(processes=args.processes)
+    engine.image_to_text(images[0])  # start the pool outside the timing
+    t0 = time.perf_counter()
+    for data in images:
+        engine.image_to_text(data)
+    engine_time = time.perf_counter() - t0
+    engine.shutdown()
+
+    print(f"{'path':>12} {'images/s':>9} {'s/image':>8}")
+    print(f"{'baseline':>12} {len(images) / baseline_time:>9.2f} {baseline_time / len(images):>8.2f}")
+    print(f"{'OcrEngine':>12} {len(images) / engine_time:>9.2f} {engine_time / len(images):>8.2f}")
+    print(f"speedup: {baseline_time / engine_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
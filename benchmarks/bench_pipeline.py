@@ -0,0 +1,602 @@
+"""
+End-to-end offline pipeline benchmark.
+
+Runs every document of a synthetic (or fixture) corpus through the real
+pipeline code, stage by stage:
+
+    route    RouteFileTypeFunction.lambda_handler
+    convert  docx (pandoc) / image (OCR) / pdf / xlsx worker
+    chunk    semantic chunker: HTML blocks / text paragraphs + semantic chunking,
+             including the chunk embeddings (paragraph and chunk-text encodes are
+             also reported separately, under "inference")
+    embed    vector worker: batch_embeddings (reuses the chunker's embeddings)
+    index    vector worker: index_chunks (bulk requests are built and serialized)
+
+S3, SQS and OpenSearch are replaced by in-memory stand-ins, so nothing leaves
+the machine. Reports documents/s, chunks/s, per-stage latency percentiles and
+peak RSS, and writes them as JSON so runs can be diffed between commits.
+
+Needs the union of the workers' requirements (spaCy with en_core_web_sm,
+sentence-transformers, pypdfium2, openpyxl, pytesseract, ...). Document types
+whose converter binary is missing (pandoc, tesseract) are left out of the
+synthetic corpus.
+
+    python benchmarks/bench_pipeline.py --docs 40 --output bench_pipeline.json
+    python benchmarks/bench_pipeline.py --corpus fixtures/ --stop-after chunk
+"""
+import argparse
+import datetime
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+import zipfile
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DOCKER = os.path.join(ROOT, "docker")
+STAGES = ["route", "convert", "chunk", "embed", "index"]
+BUCKET = "bench"
+
+KINDS_BY_MIME = {
+    "application/pdf": "pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": "docx",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": "xlsx",
+    "image/jpeg": "image",
+    "image/png": "image",
+}
+
+EXTENSIONS = {
+    "docx": "docx",
+    "png": "image",
+    "jpg": "image",
+    "jpeg": "image",
+    "pdf": "pdf",
+    "xlsx": "xlsx",
+}
+
+VOCABULARY = {
+    "lending": "loan borrower collateral repayment interest principal maturity mortgage disbursement".split(),
+    "compliance": "regulation audit disclosure sanctions screening reporting obligation policy control".split(),
+    "accounts": "deposit withdrawal balance statement transfer overdraft savings fee branch".split(),
+    "risk": "exposure default provision rating stress liquidity capital buffer scenario".split(),
+}
+
+
+# --- Stand-ins ---
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._stream.read(size)
+
+    def iter_chunks(self, chunk_size=1024 * 1024):
+        return iter(lambda: self._stream.read(chunk_size), b"")
+
+    def close(self):
+        pass
+
+
+class FakeS3:
+    """The subset of the boto3 S3 client the workers use, kept in memory."""
+
+    def __init__(self):
+        self.objects: Dict[str, bytes] = {}
+        self.metadata: Dict[str, dict] = {}
+        self.uploads: Dict[str, List[bytes]] = {}
+        self.written: List[str] = []
+
+    def _store(self, key, data):
+        self.objects[key] = data
+        self.written.append(key)
+
+    def _load(self, key) -> bytes:
+        if key not in self.objects:
+            from botocore.exceptions import ClientError
+            raise ClientError({"Error": {"Code": "NoSuchKey", "Message": key}}, "GetObject")
+        return self.objects[key]
+
+    def _etag(self, key) -> str:
+        return f'"{hash(self._load(key)) & 0xffffffff:x}"'
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        data = self._load(Key)
+        if Range:
+            start, end = Range.split("=")[1].split("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": FakeBody(data), "ETag": self._etag(Key), "Metadata": self.metadata.get(Key, {})}
+
+    def put_object(self, Bucket, Key, Body=b"", Metadata=None, **kwargs):
+        self._store(Key, Body if isinstance(Body, bytes) else Body.encode())
+        self.metadata[Key] = Metadata or {}
+        return {}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        return {"ETag": self._etag(Key), "Metadata": self.metadata.get(Key, {})}
+
+    def copy_object(self, Bucket, Key, CopySource, Metadata=None, **kwargs):
+        self._store(Key, self._load(CopySource["Key"]))
+        self.metadata[Key] = Metadata or {}
+
+    def download_file(self, Bucket, Key, Filename):
+        with open(Filename, "wb") as f:
+            f.write(self._load(Key))
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        with open(Filename, "rb") as f:
+            self._store(Key, f.read())
+        self.metadata[Key] = (ExtraArgs or {}).get("Metadata", {})
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.uploads[Key] = []
+        return {"UploadId": Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.uploads[UploadId].append(Body)
+        return {"ETag": str(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._store(Key, b"".join(self.uploads.pop(UploadId)))
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId, None)
+
+
+class FakeSQS:
+    def __init__(self):
+        self.sent: List[Tuple[str, dict]] = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.sent.extend((QueueUrl, json.loads(entry["MessageBody"])) for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+
+class FakeOpenSearch:
+    """Accepts bulk requests; every item succeeds."""
+
+    def __init__(self):
+        from opensearchpy.serializer import JSONSerializer
+        self.transport = SimpleNamespace(serializer=JSONSerializer())
+        self.bytes = 0
+
+    def bulk(self, body, **kwargs):
+        self.bytes += len(body)
+        lines = body.strip("\n").split("\n")
+        items = [{"index": {"_id": json.loads(action)["index"]["_id"], "status": 201}} for action in lines[::2]]
+        return {"errors": False, "items": items}
+
+
+# --- Synthetic corpus ---
+
+def synthetic_paragraphs(rng: random.Random, paragraphs: int) -> List[str]:
+    topics = list(VOCABULARY)
+    out = []
+    topic = rng.choice(topics)
+    for _ in range(paragraphs):
+        if rng.random() < 0.25:
+            topic = rng.choice(topics)
+        words = [rng.choice(VOCABULARY[topic]) for _ in range(rng.randint(12, 40))]
+        out.append(" ".join(words).capitalize() + ".")
+    return out
+
+
+def make_docx(paragraphs: List[str]) -> bytes:
+    body = "".join(f"<w:p><w:r><w:t>{p}</w:t></w:r></w:p>" for p in paragraphs)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'
+        ))
+        z.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="word/document.xml"/></Relationships>'
+        ))
+        z.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'
+        ))
+    return buffer.getvalue()
+
+
+def make_pdf(paragraphs: List[str], lines_per_page: int = 40) -> bytes:
+    # A plain PDF with a Helvetica text layer, one text line per paragraph
+    pages = [paragraphs[i:i + lines_per_page] for i in range(0, len(paragraphs), lines_per_page)] or [[]]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        text = " T* ".join(f"({line[:95]}) Tj" for line in lines)
+        stream = f"BT /F1 9 Tf 11 TL 40 760 Td {text} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return out
+
+
+def make_png(paragraphs: List[str]) -> bytes:
+    from PIL import Image, ImageDraw, ImageFont
+    font = ImageFont.load_default(size=28)
+    image = Image.new("L", (2480, 3508), 255)  # A4 at 300 DPI
+    draw = ImageDraw.Draw(image)
+    y = 150
+    for paragraph in paragraphs:
+        words, line = paragraph.split(), ""
+        for word in words:
+            if draw.textlength(f"{line} {word}", font=font) > 2180:
+                draw.text((150, y), line, fill=0, font=font)
+                y, line = y + 40, word
+            else:
+                line = f"{line} {word}".strip()
+        draw.text((150, y), line, fill=0, font=font)
+        y += 60
+        if y > 3300:
+            break
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG", dpi=(300, 300))
+    return buffer.getvalue()
+
+
+def make_xlsx(rng: random.Random, rows: int) -> bytes:
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Transactions")
+    sheet.append(["Date", "Account", "Category", "Description", "Amount"])
+    start = datetime.date(2025, 1, 1)
+    for i in range(rows):
+        topic = rng.choice(list(VOCABULARY))
+        sheet.append([
+            start + datetime.timedelta(days=i % 365),
+            f"ACC-{rng.randint(1000, 9999)}",
+            topic,
+            " ".join(rng.choice(VOCABULARY[topic]) for _ in range(6)),
+            round(rng.uniform(-5000, 5000), 2),
+        ])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def available_kinds() -> Tuple[List[str], List[str]]:
+    kinds, skipped = [], []
+    for kind, binary in (("docx", "pandoc"), ("pdf", None), ("xlsx", None), ("image", "tesseract")):
+        if binary and shutil.which(binary) is None:
+            skipped.append(f"{kind}: '{binary}' not found")
+        else:
+            kinds.append(kind)
+    return kinds, skipped
+
+
+def synthetic_corpus(docs: int, paragraphs: int, kinds: List[str], seed: int) -> List[Tuple[str, bytes]]:
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(docs):
+        kind = kinds[i % len(kinds)]
+        if kind == "docx":
+            corpus.append((f"uploads/bench/doc-{i}.docx", make_docx(synthetic_paragraphs(rng, paragraphs))))
+        elif kind == "pdf":
+            corpus.append((f"uploads/bench/doc-{i}.pdf", make_pdf(synthetic_paragraphs(rng, paragraphs))))
+        elif kind == "xlsx":
+            corpus.append((f"uploads/bench/doc-{i}.xlsx", make_xlsx(rng, paragraphs * 5)))
+        else:
+            corpus.append((f"images/bench/doc-{i}.png", make_png(synthetic_paragraphs(rng, min(paragraphs, 40)))))
+    return corpus
+
+
+def fixture_corpus(directory: str) -> List[Tuple[str, bytes]]:
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        ext = name.rsplit(".", 1)[-1].lower()
+        if ext in EXTENSIONS:
+            prefix = "images" if EXTENSIONS[ext] == "image" else "uploads"
+            with open(os.path.join(directory, name), "rb") as f:
+                corpus.append((f"{prefix}/bench/{name}", f.read()))
+    return corpus
+
+
+# --- Pipeline ---
+
+def load_module(name: str, path: str, app_dir: str):
+    # Appended, so the first app dir loaded is the one "main" resolves to
+    if app_dir not in sys.path:
+        sys.path.append(app_dir)
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_workers(stop_after: str):
+    """Import the stage modules with their clients swapped for the stand-ins."""
+    for name in ("PDF_QUEUE_URL", "DOCX_QUEUE_URL", "EXCEL_QUEUE_URL", "IMAGE_QUEUE_URL"):
+        os.environ.setdefault(name, name.split("_")[0].lower())
+    os.environ.setdefault("SQS_QUEUE_URL", "bench")
+    os.environ.setdefault("OUTPUT_BUCKET", BUCKET)
+    os.environ.setdefault("OPENSEARCH_HOST", "localhost")
+    os.environ.setdefault("OS_USER", "bench")
+    os.environ.setdefault("OS_PASS", "bench")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ["VECTOR_STORE"] = "opensearch"
+    sys.path.insert(0, DOCKER)
+
+    s3, sqs, opensearch = FakeS3(), FakeSQS(), FakeOpenSearch()
+    workers = SimpleNamespace(s3=s3, sqs=sqs, opensearch=opensearch)
+
+    router_dir = os.path.join(ROOT, "lambdas", "RouteFileTypeFunction")
+    workers.router = load_module("bench_router", os.path.join(router_dir, "lambda_function.py"), router_dir)
+    workers.router.s3, workers.router.sqs = s3, sqs
+
+    converters = {}
+    for kind, image, name in (
+        # Loaded first and as "main": its sheets are extracted in pool
+        # processes, which re-import the module by that name from sys.path
+        ("xlsx", "xlsx-to-text-image", "main"),
+        ("docx", "docx-to-html-image", "bench_docx_worker"),
+        ("image", "ocr-img-to-text-image", "bench_ocr_worker"),
+        ("pdf", "pdf-to-text-image", "bench_pdf_worker"),
+    ):
+        app_dir = os.path.join(DOCKER, image, "app")
+        converters[kind] = load_module(name, os.path.join(app_dir, "main.py"), app_dir)
+        converters[kind].s3 = s3
+    workers.converters = converters
+
+    if STAGES.index(stop_after) >= STAGES.index("chunk"):
+        app_dir = os.path.join(DOCKER, "semantic-chunking-image", "app")
+        workers.chunker = load_module("bench_chunker", os.path.join(app_dir, "main.py"), app_dir)
+        workers.chunker.s3 = s3
+        workers.chunker.load_models()
+        workers.inference = track_inference(workers.chunker)
+    if STAGES.index(stop_after) >= STAGES.index("embed"):
+        app_dir = os.path.join(DOCKER, "vector-embedding-image", "app")
+        workers.indexer = load_module("bench_indexer", os.path.join(app_dir, "main.py"), app_dir)
+        workers.indexer.s3 = s3
+        workers.indexer.opensearch = opensearch
+        workers.indexer.backend.load()
+    return workers
+
+
+def track_inference(chunker) -> Dict[str, float]:
+    """
+    Time the chunker's model calls: all of them, and the chunk-text encodes
+    among them. The rest encode paragraphs (for the chunk boundaries).
+    """
+    totals = {"encode_seconds": 0.0, "chunk_text_seconds": 0.0, "chunk_texts": 0}
+    encode, embed_chunk_texts = chunker.embedder.encode, chunker.embed_chunk_texts
+
+    def timed_encode(texts, **kwargs):
+        start = time.perf_counter()
+        try:
+            return encode(texts, **kwargs)
+        finally:
+            totals["encode_seconds"] += time.perf_counter() - start
+
+    def timed_embed_chunk_texts(chunk_texts):
+        start = time.perf_counter()
+        try:
+            return embed_chunk_texts(chunk_texts)
+        finally:
+            totals["chunk_text_seconds"] += time.perf_counter() - start
+            totals["chunk_texts"] += len(chunk_texts)
+
+    chunker.embedder.encode = timed_encode
+    chunker.embed_chunk_texts = timed_embed_chunk_texts
+    return totals
+
+
+def convert(workers, kind: str, key: str) -> Optional[str]:
+    """Run the converter for kind on key; returns the key of its text/HTML output."""
+    module = workers.converters[kind]
+    before = len(workers.s3.written)
+    if kind == "docx":
+        module.process_message({"Body": json.dumps({"bucket": BUCKET, "key": key})})
+    elif kind == "image":
+        module.process_image(BUCKET, key)
+    elif kind == "pdf":
+        module.process_pdf(BUCKET, key)
+    else:
+        module.process_workbook(BUCKET, key)
+    outputs = [k for k in workers.s3.written[before:] if not k.startswith("conversions/")]
+    return outputs[-1] if outputs else None
+
+
+def run_document(workers, key: str, stop_after: str, timings: Dict[str, List[float]], rss: Dict[str, float]) -> int:
+    def timed(stage, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings[stage].append((time.perf_counter() - start) * 1000)
+        rss[stage] = peak_rss_mb()
+        return result
+
+    event = {"Records": [{"s3": {"bucket": {"name": BUCKET}, "object": {"key": key, "size": len(workers.s3.objects[key])}}}]}
+    sent_before = len(workers.sqs.sent)
+    timed("route", workers.router.lambda_handler, event, None)
+    routed = workers.sqs.sent[sent_before:]
+    if not routed or stop_after == "route":
+        return 0
+    kind = KINDS_BY_MIME[routed[0][1]["detected_type"]]
+
+    output_key = timed("convert", convert, workers, kind, key)
+    if output_key is None or stop_after == "convert":
+        return 0
+
+    def chunk():
+        content = workers.s3.objects[output_key]
+        if output_key.endswith(".html"):
+            return workers.chunker.chunk_blocks_semantic_with_embeddings(list(workers.chunker.iter_html_blocks(content)))
+        return workers.chunker.chunk_text_semantic_with_embeddings(content.decode("utf-8"))
+
+    chunks, chunk_embeddings = timed("chunk", chunk)
+    for chunk_ in chunks:
+        chunk_["documentId"] = workers.chunker.extract_doc_id_from_key(output_key)
+    if stop_after == "chunk" or not chunks:
+        return len(chunks)
+
+    embeddings = timed("embed", workers.indexer.batch_embeddings, list(zip(chunks, chunk_embeddings)))
+    if stop_after == "embed":
+        return len(chunks)
+
+    timed("index", workers.indexer.index_chunks, chunks, embeddings)
+    return len(chunks)
+
+
+def inference_report(totals: Optional[Dict[str, float]], chunk_ms: List[float]) -> Optional[Dict]:
+    if totals is None:
+        return None
+    chunk_text = totals["chunk_text_seconds"]
+    paragraphs = totals["encode_seconds"] - chunk_text
+    chunk_stage = sum(chunk_ms) / 1000
+    return {
+        "paragraph_encode_seconds": round(paragraphs, 3),
+        "chunk_text_encode_seconds": round(chunk_text, 3),
+        "chunk_texts": totals["chunk_texts"],
+        # What storing paragraph centroids instead would save in the chunk stage
+        "chunk_text_share_of_chunk_stage": round(chunk_text / chunk_stage, 3) if chunk_stage else None,
+    }
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    array = np.asarray(values)
+    return {
+        "count": len(values),
+        "mean_ms": round(float(array.mean()), 3),
+        "p50_ms": round(float(np.percentile(array, 50)), 3),
+        "p95_ms": round(float(np.percentile(array, 95)), 3),
+        "p99_ms": round(float(np.percentile(array, 99)), 3),
+        "max_ms": round(float(array.max()), 3),
+    }
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "-C", ROOT, "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=40, help="synthetic documents to generate")
+    parser.add_argument("--paragraphs", type=int, default=60, help="paragraphs per synthetic document")
+    parser.add_argument("--corpus", help="directory of fixture files to use instead of a synthetic corpus")
+    parser.add_argument("--stop-after", choices=STAGES, default="index")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_pipeline.json")
+    args = parser.parse_args()
+
+    skipped: List[str] = []
+    if args.corpus:
+        corpus = fixture_corpus(args.corpus)
+    else:
+        kinds, skipped = available_kinds()
+        corpus = synthetic_corpus(args.docs, args.paragraphs, kinds, args.seed)
+    for reason in skipped:
+        print(f"[!] Skipping {reason}")
+
+    start = time.perf_counter()
+    workers = load_workers(args.stop_after)
+    startup = time.perf_counter() - start
+    for key, data in corpus:
+        workers.s3.objects[key] = data
+
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    rss_after_stage: Dict[str, float] = {}
+    total_chunks = 0
+    start = time.perf_counter()
+    for i, (key, _) in enumerate(corpus, start=1):
+        total_chunks += run_document(workers, key, args.stop_after, timings, rss_after_stage)
+        print(f"[{i}/{len(corpus)}] {key}: {total_chunks} chunks so far")
+    wall = time.perf_counter() - start
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "skipped": skipped,
+        },
+        "corpus": {
+            "documents": len(corpus),
+            "bytes": sum(len(data) for _, data in corpus),
+        },
+        "throughput": {
+            "wall_seconds": round(wall, 3),
+            "startup_seconds": round(startup, 3),
+            "documents_per_sec": round(len(corpus) / wall, 3) if wall else None,
+            "chunks": total_chunks,
+            "chunks_per_sec": round(total_chunks / wall, 3) if wall else None,
+        },
+        "stages": {stage: percentiles(values) for stage, values in timings.items()},
+        "inference": inference_report(getattr(workers, "inference", None), timings["chunk"]),
+        "memory": {
+            "peak_rss_mb": peak_rss_mb(),
+            # Process peak as of the last time each stage finished
+            "peak_rss_mb_by_stage": rss_after_stage,
+            # Pool processes (OCR, xlsx) report here once they have exited
+            "children_peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        },
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{len(corpus)} documents, {total_chunks} chunks in {wall:.2f} s "
+          f"({report['throughput']['documents_per_sec']} docs/s, {report['throughput']['chunks_per_sec']} chunks/s)")
+    print(f"{'stage':<9}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+    for stage, stats in report["stages"].items():
+        if stats["count"]:
+            print(f"{stage:<9}{stats['count']:>7}{stats['p50_ms']:>11.1f}{stats['p95_ms']:>11.1f}{stats['p99_ms']:>11.1f}")
+    inference = report["inference"]
+    if inference:
+        print(f"encode: paragraphs {inference['paragraph_encode_seconds']} s, "
+              f"chunk texts {inference['chunk_text_encode_seconds']} s "
+              f"({inference['chunk_text_share_of_chunk_stage']} of the chunk stage)")
+    print(f"peak RSS {report['memory']['peak_rss_mb']} MB -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Latency benchmark for the API gateway's hybrid /query endpoint.
+
+Sends queries to a running gateway (e.g. `docker compose up` in backend-app)
+from a number of concurrent clients and reports p50/p95/p99 latency and
+throughput. Only the standard library is used on the client side.
+
+    python benchmarks/bench_query_latency.py --url http://localhost:8000 --requests 500 --concurrency 16
+"""
+import argparse
+import json
+import random
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_QUERIES = [
+    "termination clause notice period",
+    "interest rate for early repayment",
+    "customer identification requirements",
+    "collateral valuation",
+    "late payment penalty",
+    "data privacy and consent",
+    "governing law and jurisdiction",
+    "loan disbursement conditions",
+]
+
+
+def run_query(base_url, query, params):
+    qs = urllib.parse.urlencode({"query": query, **params})
+    t0 = time.perf_counter()
+    with urllib.request.urlopen(urllib.request.Request(f"{base_url}/query?{qs}", method="POST")) as resp:
+        body = json.loads(resp.read())
+    return (time.perf_counter() - t0) * 1000, len(body.get("results", []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--document-id")
+    parser.add_argument("--user-id")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed requests (model load, connection setup)")
+    args = parser.parse_args()
+
+    params = {"top_k": args.top_k}
+    if args.document_id:
+        params["document_id"] = args.document_id
+    if args.user_id:
+        params["user_id"] = args.user_id
+
+    rng = random.Random(0)
+    for _ in range(args.warmup):
+        run_query(args.url, rng.choice(DEFAULT_QUERIES), params)
+
+    queries = [rng.choice(DEFAULT_QUERIES) for _ in range(args.requests)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda q: run_query(args.url, q, params), queries))
+    elapsed = time.perf_counter() - t0
+
+    latencies = np.array([latency for latency, _ in results])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"{args.requests} requests, concurrency {args.concurrency}: {args.requests / elapsed:.1f} req/s")
+    print(f"latency ms  p50={p50:.1f}  p95={p95:.1f}  p99={p99:.1f}  max={latencies.max():.1f}")
+    print(f"avg results per query: {np.mean([n for _, n in results]):.1f}")
+
+
+if __name__ == "__main__":
+    main()
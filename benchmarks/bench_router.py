@@ -0,0 +1,119 @@
+"""
+Benchmark: RouteFileTypeFunction on a bulk-upload S3 event.
+
+Runs lambda_handler against stubbed S3/SQS clients that sleep to simulate
+network latency, and compares it with the previous one-record-at-a-time
+loop (ranged GET + send_message per record). Reports wall time and the
+number of S3/SQS calls made.
+
+    python benchmarks/bench_router.py --records 500 --s3-latency-ms 25 --sqs-latency-ms 15
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+for name in ("PDF_QUEUE_URL", "DOCX_QUEUE_URL", "EXCEL_QUEUE_URL", "IMAGE_QUEUE_URL"):
+    os.environ.setdefault(name, f"https://sqs.local/{name.lower()}")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "lambdas", "RouteFileTypeFunction"))
+import filetype  # noqa: E402
+import lambda_function  # noqa: E402
+
+# Leading bytes that filetype recognises for each routed type
+SAMPLES = {
+    ".pdf": b"%PDF-1.7\n" + b"\0" * 2048,
+    ".png": b"\x89PNG\r\n\x1a\n" + b"\0" * 2048,
+    ".jpg": b"\xff\xd8\xff\xe0" + b"\0" * 2048,
+}
+
+
+class StubS3:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_object(self, Bucket, Key, Range=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return {"Body": io.BytesIO(SAMPLES[os.path.splitext(Key)[1]])}
+
+
+class StubSQS:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def _record(self, count):
+        with self._lock:
+            self.calls += 1
+            self.messages += count
+        time.sleep(self.latency)
+
+    def send_message(self, QueueUrl, MessageBody):
+        self._record(1)
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self._record(len(Entries))
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+
+def make_event(records: int):
+    extensions = list(SAMPLES)
+    event_records = []
+    for i in range(records):
+        ext = extensions[i % len(extensions)]
+        obj = {"key": f"uploads/bench/file-{i}{ext}", "size": 4096}
+        event_records.append({"s3": {"bucket": {"name": "bench"}, "object": obj}})
+    return {"Records": event_records}
+
+
+def sequential_handler(event, s3, sqs):
+    # The handler before batching: one ranged GET and one send_message per record
+    for record in event["Records"]:
+        bucket = record["s3"]["bucket"]["name"]
+        key = record["s3"]["object"]["key"]
+        content = s3.get_object(Bucket=bucket, Key=key, Range="bytes=0-2048")["Body"].read()
+        kind = filetype.guess(content)
+        if kind and kind.mime in lambda_function.QUEUE_MAP:
+            message = {"bucket": bucket, "key": key, "detected_type": kind.mime}
+            sqs.send_message(QueueUrl=lambda_function.QUEUE_MAP[kind.mime], MessageBody=json.dumps(message))
+
+
+def run(label, fn, s3, sqs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # the handler logs every record
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed * 1000:9.1f} ms   S3 GETs: {s3.calls:5d}   SQS calls: {sqs.calls:5d}   messages: {sqs.messages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=500)
+    parser.add_argument("--s3-latency-ms", type=float, default=25)
+    parser.add_argument("--sqs-latency-ms", type=float, default=15)
+    args = parser.parse_args()
+
+    event = make_event(args.records)
+    print(f"{args.records} records, {lambda_function.ROUTER_MAX_WORKERS} router threads\n")
+
+    s3, sqs = StubS3(args.s3_latency_ms / 1000), StubSQS(args.sqs_latency_ms / 1000)
+    run("sequential", lambda: sequential_handler(event, s3, sqs), s3, sqs)
+
+    s3, sqs = StubS3(args.s3_latency_ms / 1000), StubSQS(args.sqs_latency_ms / 1000)
+    lambda_function.s3, lambda_function.sqs = s3, sqs
+    run("batched", lambda: lambda_function.lambda_handler(event, None), s3, sqs)
+
+
+if __name__ == "__main__":
+    main()
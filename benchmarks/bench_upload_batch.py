@@ -0,0 +1,73 @@
+"""
+Benchmark: /upload/batch vs N single-file /upload calls.
+
+Uploads --files synthetic files of --size-kb each to a running gateway
+(e.g. `docker compose up` in backend-app), first as N /upload requests from
+--concurrency clients, then as /upload/batch requests of --batch-size files,
+and reports wall time and files/s for both. Only the standard library is
+used on the client side.
+
+    python benchmarks/bench_upload_batch.py --url http://localhost:8000 --files 200 --size-kb 256
+"""
+import argparse
+import json
+import os
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+
+def encode_multipart(field: str, files: List[Tuple[str, bytes]]) -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    parts = []
+    for filename, data in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: application/pdf\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+def post(url: str, field: str, files: List[Tuple[str, bytes]]) -> dict:
+    body, content_type = encode_multipart(field, files)
+    request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": content_type})
+    with urllib.request.urlopen(request) as resp:
+        return json.loads(resp.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--user-id", default="bench-user")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    qs = urllib.parse.urlencode({"user_id": args.user_id})
+    files = [(f"bench-{i}.pdf", os.urandom(args.size_kb * 1024)) for i in range(args.files)]
+    print(f"{args.files} files x {args.size_kb} KB, {args.concurrency} clients\n")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(lambda f: post(f"{args.url}/upload?{qs}", "file", [f]), files))
+    single = time.perf_counter() - start
+    print(f"single    {single:8.2f} s   {args.files / single:8.1f} files/s   ({args.files} requests)")
+
+    batches = [files[i:i + args.batch_size] for i in range(0, len(files), args.batch_size)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda b: post(f"{args.url}/upload/batch?{qs}", "files", b), batches))
+    batched = time.perf_counter() - start
+    failed = sum(len(r["failed"]) for r in results)
+    print(f"batch     {batched:8.2f} s   {args.files / batched:8.1f} files/s   ({len(batches)} requests, {failed} failed)")
+    print(f"\nspeedup   {single / batched:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Recall and latency of the embedded FAISS vector store (vector_store.py).
+
+Builds a store per index profile on synthetic unit vectors, then reports
+recall@k against exact search and per-query latency percentiles. The numbers
+are the baseline to compare OpenSearch kNN recall/latency against.
+
+    python benchmarks/bench_vector_store.py --vectors 50000 --queries 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'docker', 'vector-embedding-image', 'app'))
+from vector_store import FaissVectorStore  # noqa: E402
+
+
+def synthetic_vectors(n, dim, seed):
+    # Clustered, like real chunk embeddings, so ANN structures have something to exploit
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, n // 50), dim))
+    vectors = centers[rng.integers(0, len(centers), size=n)] + 0.5 * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def build_store(path, profile, vectors, batch):
+    index_type, exact_max = profile
+    store = FaissVectorStore(path, dim=vectors.shape[1], index_type=index_type, exact_max=exact_max)
+    t0 = time.perf_counter()
+    for start in range(0, len(vectors), batch):
+        block = vectors[start:start + batch]
+        chunks = [{'id': f'c{start + i}', 'documentId': f'd{(start + i) // 100}', 'content': ''} for i in range(len(block))]
+        store.add(chunks, block)
+    store.save()
+    return store, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--vectors', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--batch', type=int, default=5000, help='vectors added per store.add call')
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.vectors, args.dim, seed=0)
+    queries = synthetic_vectors(args.queries, args.dim, seed=1)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+
+    profiles = {
+        'exact': ('hnsw', args.vectors),  # never leaves the flat index
+        'hnsw': ('hnsw', 0),
+        'ivf': ('ivf', 0),
+    }
+    print(f"{args.vectors} vectors x {args.dim}d, {args.queries} queries, k={args.k}")
+    print(f"{'profile':>8} {'build (s)':>10} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, profile in profiles.items():
+        with tempfile.TemporaryDirectory() as path:
+            store, build_time = build_store(path, profile, vectors, args.batch)
+            reader = FaissVectorStore(path, dim=args.dim, index_type=profile[0], read_only=True)
+            latencies, found = [], 0
+            for query, expected in zip(queries, truth):
+                t0 = time.perf_counter()
+                hits = reader.search(query, args.k)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                ids = {int(chunk['id'][1:]) for _, chunk in hits}
+                found += len(ids & set(expected.tolist()))
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            recall = found / (args.k * len(queries))
+            print(f"{name:>8} {build_time:>10.2f} {recall:>9.3f} {p50:>8.2f} {p95:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
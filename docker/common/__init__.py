@@ -0,0 +1,3 @@
+# Code shared by the worker images. Each Dockerfile copies this package to /app/common
+# from the "common" build context, e.g.:
+#   docker build --build-context common=../common -t semantic-chunking-worker .
@@ -0,0 +1,173 @@
+import base64
+import gzip
+import io
+import json
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Chunk files between the semantic chunker and the indexer.
+#
+# Version 1 is gzip-compressed NDJSON:
+#   {"format": "semantic-chunks", "version": 1, "documentId": ..., "embedding": {"dtype": "float16", "dim": 384}}
+#   {"id": ..., "title": ..., "content": ..., "embedding": "<base64 float16>"}   one line per chunk
+#   {"end": true, "chunks": <count>}
+# The embedding column is optional. The end line tells a complete file from
+# one cut short. Files written before this format are a JSON array of chunks
+# (with an optional .embeddings.npy sidecar); ChunkReader reads those too.
+FORMAT_NAME = "semantic-chunks"
+FORMAT_VERSION = 1
+FILE_SUFFIX = ".ndjson.gz"
+CONTENT_TYPE = "application/x-ndjson"
+EMBEDDING_DTYPE = "float16"
+
+GZIP_MAGIC = b"\x1f\x8b"
+UTF8_BOM = b"\xef\xbb\xbf"
+JSON_WHITESPACE = b" \t\r\n"
+READ_SIZE = 64 * 1024
+
+
+class ChunkWriter:
+    """
+    Writes chunks one at a time into a compressed chunk file, so a document's
+    chunks never have to be serialized as one blob.
+
+        with ChunkWriter(f, doc_id, embedding_dim=384) as writer:
+            for chunk, embedding in zip(chunks, embeddings):
+                writer.write(chunk, embedding)
+    """
+
+    def __init__(self, fileobj: BinaryIO, document_id: Optional[str] = None, embedding_dim: Optional[int] = None,
+                 compresslevel: int = 6):
+        self._gzip = gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=compresslevel)
+        self.embedding_dim = embedding_dim
+        self.count = 0
+        embedding = {"dtype": EMBEDDING_DTYPE, "dim": embedding_dim} if embedding_dim else None
+        self._line({"format": FORMAT_NAME, "version": FORMAT_VERSION, "documentId": document_id, "embedding": embedding})
+
+    def write(self, chunk: Dict, embedding: Optional[np.ndarray] = None):
+        if embedding is not None:
+            vector = np.asarray(embedding, dtype=EMBEDDING_DTYPE)
+            if vector.shape != (self.embedding_dim,):
+                raise ValueError(f"embedding of shape {vector.shape}, expected ({self.embedding_dim},)")
+            chunk = {**chunk, "embedding": base64.b64encode(vector.tobytes()).decode("ascii")}
+        self._line(chunk)
+        self.count += 1
+
+    def close(self):
+        if self._gzip is not None:
+            self._line({"end": True, "chunks": self.count})
+            self._gzip.close()
+            self._gzip = None
+
+    def __enter__(self) -> "ChunkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # No end line: a reader treats the file as truncated rather than short
+            self._gzip.close()
+            self._gzip = None
+
+    def _line(self, record: Dict):
+        self._gzip.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+
+
+class _Prefixed(io.RawIOBase):
+    # A stream with the bytes already read from it (to sniff the format) put back in front
+    def __init__(self, prefix: bytes, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _sniff(stream) -> bytes:
+    # The first bytes of the file, past any BOM and leading whitespace a legacy JSON file may have
+    head = stream.read(2)
+    if head == GZIP_MAGIC:
+        return head
+    head += stream.read(len(UTF8_BOM) - len(head))
+    if head.startswith(UTF8_BOM):
+        head = head[len(UTF8_BOM):]
+    head = head.lstrip(JSON_WHITESPACE)
+    while not head:
+        data = stream.read(READ_SIZE)
+        if not data:
+            break
+        head = data.lstrip(JSON_WHITESPACE)
+    return head
+
+
+class ChunkReader:
+    """
+    Iterates (chunk, embedding or None) from a chunk file stream (e.g. an S3
+    StreamingBody) as it arrives. Version 1 files are decompressed and parsed
+    line by line; legacy JSON arrays are read whole (legacy is True for them).
+    """
+
+    def __init__(self, stream: BinaryIO):
+        head = _sniff(stream)
+        raw = io.BufferedReader(_Prefixed(head, stream), READ_SIZE)
+        self.legacy = head[:1] == b"["
+        self.header: Dict = {}
+        if self.legacy:
+            self._lines = None
+            self._raw = raw
+            return
+        text = gzip.GzipFile(fileobj=raw, mode="rb") if head == GZIP_MAGIC else raw
+        self._lines = iter(text)
+        header = json.loads(next(self._lines, b"{}"))
+        if not isinstance(header, dict):
+            raise ValueError(f"not a chunk file: header is a JSON {type(header).__name__}")
+        self.header = header
+        if self.header.get("format") != FORMAT_NAME:
+            raise ValueError("not a chunk file")
+        if self.header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported chunk file version {self.header.get('version')}")
+
+    @property
+    def document_id(self) -> Optional[str]:
+        return self.header.get("documentId")
+
+    def __iter__(self) -> Iterator[Tuple[Dict, Optional[np.ndarray]]]:
+        if self.legacy:
+            for chunk in json.load(self._raw):
+                yield chunk, None
+            return
+        count = 0
+        for line in self._lines:
+            record = json.loads(line)
+            if record.get("end") is True:
+                if record.get("chunks") != count:
+                    raise ValueError(f"chunk file says {record.get('chunks')} chunks, read {count}")
+                return
+            embedding = record.pop("embedding", None)
+            if embedding is not None:
+                embedding = np.frombuffer(base64.b64decode(embedding), dtype=EMBEDDING_DTYPE)
+            count += 1
+            yield record, embedding
+        raise ValueError(f"chunk file ends after {count} chunks without its end line (truncated?)")
+
+    def batches(self, size: int) -> Iterator[List[Tuple[Dict, Optional[np.ndarray]]]]:
+        batch = []
+        for item in self:
+            batch.append(item)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
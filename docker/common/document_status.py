@@ -0,0 +1,48 @@
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from common.telemetry import DOCUMENT_ID_KEY, get_document, get_trace_id, logger
+
+# --- Config ---
+# Base URL of the API gateway (e.g. http://api-gateway:8000); unset, statuses aren't reported
+STATUS_API_URL = os.environ.get("STATUS_API_URL", "")
+# Bearer token for PUT /status/{id}: the gateway's STATUS_UPDATE_TOKEN
+STATUS_API_TOKEN = os.environ.get("STATUS_API_TOKEN", "")
+STATUS_API_TIMEOUT = float(os.environ.get("STATUS_API_TIMEOUT", "2"))
+
+# Pipeline statuses of a document, in order. Any stage can end in FAILED: the
+# document was dropped, or its message failed on its last delivery (see common.worker)
+CONVERTING, CONVERTED = "converting", "converted"
+CHUNKING, CHUNKED = "chunking", "chunked"
+INDEXING, INDEXED = "indexing", "indexed"
+FAILED = "failed"
+
+
+def report_status(status: str) -> bool:
+    """
+    Record the status of the document being processed (the gateway's
+    document id, see common.telemetry.get_document) through the API gateway,
+    which stores it and pushes it to status streams.
+
+    Best effort: a document without a gateway id, or a failed request, is
+    logged and skipped, never failing the message.
+    """
+    document_id = get_document().get(DOCUMENT_ID_KEY)
+    if not STATUS_API_URL or not document_id:
+        return False
+    url = "{}/status/{}?{}".format(
+        STATUS_API_URL.rstrip("/"), urllib.parse.quote(document_id), urllib.parse.urlencode({"status": status}),
+    )
+    headers = {"Authorization": f"Bearer {STATUS_API_TOKEN}"}
+    trace_id = get_trace_id()
+    if trace_id:
+        headers["X-Trace-Id"] = trace_id
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method="PUT", headers=headers), timeout=STATUS_API_TIMEOUT):
+            pass
+    except (urllib.error.URLError, OSError) as e:
+        logger.warning("failed to report status", extra={"document_id": document_id, "status": status, "error": str(e)})
+        return False
+    return True
@@ -0,0 +1,218 @@
+"""
+Sentence embedding backends.
+
+- torch: sentence-transformers on PyTorch, fp32 (the reference).
+- onnx:  the same transformer exported to ONNX with int8 dynamic quantization,
+         run by ONNX Runtime with a Rust `tokenizers` tokenizer. No torch import,
+         so a worker starts in well under a second.
+
+Both load lazily, on the first encode (or an explicit load()), once per process.
+Export a model directory for the onnx backend with:
+
+    python -m common.embedding_backend export /models/all-MiniLM-L6-v2-int8
+"""
+import argparse
+import json
+import os
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# --- Config ---
+# 'torch' or 'onnx'
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# Directory written by `export` (model.onnx / model_int8.onnx, tokenizer.json, embedding_config.json)
+EMBEDDING_MODEL_DIR = os.environ.get("EMBEDDING_MODEL_DIR", "")
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE", "model_int8.onnx")
+# ONNX Runtime intra-op threads per process; 0 lets ORT use every core
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "32"))
+
+CONFIG_FILE = "embedding_config.json"
+
+
+class TorchBackend:
+    """sentence-transformers on PyTorch; torch itself is only imported on load()."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        self.model_name = model_name
+        # Cache keys: vectors from different backends are close but not identical
+        self.cache_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.load().get_sentence_embedding_dimension()
+
+    def encode(self, texts: Sequence[str], batch_size: int = EMBEDDING_BATCH_SIZE, **kwargs) -> np.ndarray:
+        kwargs["convert_to_numpy"] = True
+        return self.load().encode(list(texts), batch_size=batch_size, **kwargs)
+
+
+class OnnxBackend:
+    """
+    An exported transformer on ONNX Runtime: tokenize, run, mean-pool over the
+    attention mask and (like the sentence-transformers pipeline) L2-normalize.
+    Texts are encoded in length-sorted batches so padding stays short.
+    """
+
+    def __init__(self, model_dir: str = EMBEDDING_MODEL_DIR, model_file: str = EMBEDDING_ONNX_FILE,
+                 threads: int = EMBEDDING_THREADS):
+        if not model_dir:
+            raise ValueError("the onnx embedding backend needs EMBEDDING_MODEL_DIR (see `export`)")
+        self.model_dir = model_dir
+        self.model_file = model_file
+        self.threads = threads
+        with open(os.path.join(model_dir, CONFIG_FILE)) as f:
+            self.config = json.load(f)
+        self.model_name = self.config["model"]
+        self.cache_name = f"{self.model_name}+onnx:{os.path.splitext(model_file)[0]}"
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            if self._session is None:
+                import onnxruntime as ort
+                from tokenizers import Tokenizer
+
+                tokenizer = Tokenizer.from_file(os.path.join(self.model_dir, "tokenizer.json"))
+                tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+                tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+                options = ort.SessionOptions()
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                options.intra_op_num_threads = self.threads
+                # Callers already run one encode per worker thread; don't oversubscribe across them
+                options.inter_op_num_threads = 1
+                session = ort.InferenceSession(
+                    os.path.join(self.model_dir, self.model_file), options, providers=["CPUExecutionProvider"]
+                )
+                self._input_names = {i.name for i in session.get_inputs()}
+                self._tokenizer, self._session = tokenizer, session
+        return self._session
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def encode(self, texts: Sequence[str], batch_size: int = EMBEDDING_BATCH_SIZE, **kwargs) -> np.ndarray:
+        # kwargs (convert_to_numpy, show_progress_bar, ...) are sentence-transformers options; output is always numpy
+        session = self.load()
+        texts = list(texts)
+        out = np.zeros((len(texts), self.config["dimension"]), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self._tokenizer.encode_batch([texts[i] for i in batch])
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+            out[batch] = mean_pool(hidden, feeds["attention_mask"], self.config.get("normalize", True))
+        return out
+
+
+def mean_pool(hidden: np.ndarray, attention_mask: np.ndarray, normalize: bool = True) -> np.ndarray:
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def load_backend(name: str = EMBEDDING_BACKEND):
+    """The process-wide backend of that kind (created on first call; the model itself loads on first encode)."""
+    with _backends_lock:
+        if name not in _backends:
+            if name == "onnx":
+                _backends[name] = OnnxBackend()
+            elif name == "torch":
+                _backends[name] = TorchBackend()
+            else:
+                raise ValueError(f"unknown EMBEDDING_BACKEND {name!r} (expected 'torch' or 'onnx')")
+        return _backends[name]
+
+
+# --- Export ---
+
+def export_onnx(model_name: str, out_dir: str, quantize: bool = True, opset: int = 17) -> List[str]:
+    """
+    Export a sentence-transformers model's transformer to out_dir/model.onnx and,
+    with quantize, int8 dynamic-quantized weights to out_dir/model_int8.onnx.
+    Needs torch and sentence-transformers; the result doesn't.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(out_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    class LastHiddenState(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    sample = tokenizer(["an example sentence", "and another"], padding=True, return_tensors="pt")
+    inputs = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            LastHiddenState(transformer), tuple(sample[name] for name in inputs), fp32_path,
+            input_names=inputs, output_names=["last_hidden_state"],
+            dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in inputs},
+                          "last_hidden_state": {0: "batch", 1: "sequence"}},
+            opset_version=opset, dynamo=False,
+        )
+    written = [fp32_path]
+    if quantize:
+        int8_path = os.path.join(out_dir, "model_int8.onnx")
+        quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+        written.append(int8_path)
+
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, "tokenizer.json"))
+    config = {
+        "model": model_name,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "max_seq_length": st_model.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        # all-MiniLM-L6-v2's pipeline ends with a Normalize module
+        "normalize": any(type(module).__name__ == "Normalize" for module in st_model),
+    }
+    with open(os.path.join(out_dir, CONFIG_FILE), "w") as f:
+        json.dump(config, f, indent=2)
+    return written + [os.path.join(out_dir, "tokenizer.json"), os.path.join(out_dir, CONFIG_FILE)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export an embedding model for the onnx backend")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export = subcommands.add_parser("export")
+    export.add_argument("out_dir")
+    export.add_argument("--model", default=EMBEDDING_MODEL)
+    export.add_argument("--no-quantize", action="store_true")
+    args = parser.parse_args()
+    for path in export_onnx(args.model, args.out_dir, quantize=not args.no_quantize):
+        print(path)
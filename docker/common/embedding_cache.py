@@ -0,0 +1,140 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# --- Config ---
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", "20000"))
+# Optional on-disk tier (SQLite file), e.g. on a mounted volume so it survives restarts
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "")
+
+
+def normalize_text(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def cache_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache: an in-process LRU in front of an
+    optional SQLite tier. Keys are sha256(model name + normalized text).
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vector BLOB)"
+            )
+            self._disk.commit()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "EmbeddingCache":
+        return cls(max_entries=EMBEDDING_CACHE_SIZE, disk_path=EMBEDDING_CACHE_PATH or None)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            missing = [key for key in keys if key not in found]
+            if self._disk is not None and missing:
+                for key, dim, blob in self._select(missing):
+                    vector = np.frombuffer(blob, dtype=np.float32, count=dim)
+                    found[key] = vector
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, keys: Sequence[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._remember(key, vector.copy())
+            if self._disk is not None:
+                self._disk.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                    [(key, int(vector.shape[0]), vector.tobytes()) for key, vector in zip(keys, vectors)],
+                )
+                self._disk.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._memory),
+        }
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _select(self, keys: List[str]):
+        rows = []
+        # Stay well under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows.extend(self._disk.execute(
+                f"SELECT key, dim, vector FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchall())
+        return rows
+
+
+class CachedEncoder:
+    """
+    Drop-in for SentenceTransformer.encode(texts, convert_to_numpy=True).
+
+    Repeated texts (within a call or across calls) are served from the cache;
+    only the distinct misses are sent to the model, as a single batch. Encode
+    options aren't part of the cache key, so keep one encoder per configuration.
+    """
+
+    def __init__(self, model, model_name: str, cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.model_name = model_name
+        self.cache = cache if cache is not None else EmbeddingCache.from_env()
+
+    def encode(self, texts: Sequence[str], **kwargs) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        keys = [cache_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        miss_texts = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in miss_texts:
+                miss_texts[key] = text
+        if miss_texts:
+            kwargs['convert_to_numpy'] = True
+            encoded = np.asarray(self.model.encode(list(miss_texts.values()), **kwargs), dtype=np.float32)
+            self.cache.put_many(list(miss_texts), encoded)
+            found.update(zip(miss_texts, encoded))
+
+        return np.stack([found[key] for key in keys])
@@ -0,0 +1,136 @@
+import math
+import os
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# --- Config ---
+# One of PROFILES below; the other INDEX_* settings override that profile's defaults
+INDEX_PROFILE = os.environ.get("INDEX_PROFILE", "float32")
+INDEX_HNSW_M = os.environ.get("INDEX_HNSW_M")
+INDEX_EF_CONSTRUCTION = os.environ.get("INDEX_EF_CONSTRUCTION")
+INDEX_EF_SEARCH = os.environ.get("INDEX_EF_SEARCH")
+# 0 sizes the shard count from INDEX_EXPECTED_VECTORS
+INDEX_SHARDS = int(os.environ.get("INDEX_SHARDS", "0"))
+INDEX_REPLICAS = os.environ.get("INDEX_REPLICAS")
+# Chunks the index is expected to hold, and the on-disk size to aim for per shard
+INDEX_EXPECTED_VECTORS = int(os.environ.get("INDEX_EXPECTED_VECTORS", "1000000"))
+INDEX_TARGET_SHARD_GB = float(os.environ.get("INDEX_TARGET_SHARD_GB", "20"))
+# Average stored size of a chunk besides its vector (content, title, tags, ...)
+INDEX_CHUNK_BYTES = int(os.environ.get("INDEX_CHUNK_BYTES", "3000"))
+
+BYTES_PER_DIMENSION = {"float": 4, "fp16": 2, "byte": 1}
+
+
+@dataclass
+class IndexProfile:
+    """
+    How chunk embeddings are stored and searched in OpenSearch: the kNN engine,
+    HNSW parameters, vector precision and shard layout.
+
+    data_type 'fp16' stores vectors as 16-bit floats (faiss scalar quantizer),
+    'byte' as signed 8-bit integers (unit vectors scaled by 127); that's 2× and 4×
+    less memory per vector than 'float'.
+    """
+
+    name: str
+    engine: str = "faiss"
+    # Embeddings are unit length, so inner product ranks like cosine similarity
+    space_type: str = "innerproduct"
+    data_type: str = "float"
+    m: int = 16
+    ef_construction: int = 128
+    ef_search: int = 100
+    shards: int = 0
+    replicas: int = 2
+    # Vectors are sent rounded to this many decimals; ints for 'byte'
+    decimals: int = 7
+
+    def __post_init__(self):
+        if self.data_type not in BYTES_PER_DIMENSION:
+            raise ValueError(f"Unsupported vector data type: {self.data_type}")
+        if self.data_type == "fp16" and self.engine != "faiss":
+            raise ValueError("fp16 vectors need the faiss engine")
+
+    # --- Sizing ---
+
+    def vector_memory_bytes(self, dim: int) -> float:
+        # OpenSearch's HNSW memory estimate: 1.1 * (bytes per vector + 8 * m)
+        return 1.1 * (BYTES_PER_DIMENSION[self.data_type] * dim + 8 * self.m)
+
+    def shard_count(self, dim: int, expected_vectors: int = INDEX_EXPECTED_VECTORS) -> int:
+        if self.shards:
+            return self.shards
+        per_chunk = BYTES_PER_DIMENSION[self.data_type] * dim + INDEX_CHUNK_BYTES
+        return max(1, math.ceil(expected_vectors * per_chunk / (INDEX_TARGET_SHARD_GB * 1024 ** 3)))
+
+    # --- Index definition ---
+
+    def knn_method(self) -> Dict:
+        parameters = {"m": self.m, "ef_construction": self.ef_construction}
+        if self.data_type == "fp16":
+            parameters["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+        return {"name": "hnsw", "engine": self.engine, "space_type": self.space_type, "parameters": parameters}
+
+    def embedding_mapping(self, dim: int) -> Dict:
+        mapping = {"type": "knn_vector", "dimension": dim, "method": self.knn_method()}
+        if self.data_type == "byte":
+            mapping["data_type"] = "byte"
+        return mapping
+
+    def index_settings(self, dim: int, expected_vectors: int = INDEX_EXPECTED_VECTORS) -> Dict:
+        settings = {
+            "number_of_shards": self.shard_count(dim, expected_vectors),
+            "number_of_replicas": self.replicas,
+            "knn": True,
+        }
+        if self.engine != "lucene":
+            # Lucene takes ef_search per query instead (see knn_query)
+            settings["knn.algo_param.ef_search"] = self.ef_search
+        return settings
+
+    # --- Vectors ---
+
+    def encode(self, vector: np.ndarray) -> List:
+        """
+        A vector as it goes into a bulk request or query: byte-quantized ints,
+        or floats rounded so the JSON carries ~9 characters per value instead
+        of float32's 18-20 digit repr.
+        """
+        # float64 first: rounding in float32 and converting would bring the long repr back
+        vector = np.asarray(vector, dtype=np.float64)
+        if self.data_type == "byte":
+            return np.clip(np.rint(vector * 127), -128, 127).astype(np.int8).tolist()
+        return np.round(vector, self.decimals).tolist()
+
+    def knn_query(self, vector: np.ndarray, k: int, ef_search: Optional[int] = None) -> Dict:
+        query = {"vector": self.encode(vector), "k": k}
+        if self.engine == "lucene":
+            query["method_parameters"] = {"ef_search": max(ef_search or self.ef_search, k)}
+        return query
+
+
+PROFILES = {
+    # Full precision, as before, on faiss HNSW
+    "float32": IndexProfile("float32"),
+    # The chunker already ships float16 sidecars, so this loses nothing on the way in
+    "fp16": IndexProfile("fp16", data_type="fp16", decimals=5),
+    # Lucene's byte vectors; cosine is scale-invariant, so unit vectors ×127 rank the same
+    "byte": IndexProfile("byte", engine="lucene", space_type="cosinesimil", data_type="byte"),
+    # Higher recall for large corpora, at more memory and slower indexing
+    "high-recall": IndexProfile("high-recall", m=32, ef_construction=256, ef_search=256),
+}
+
+
+def load_profile(name: str = INDEX_PROFILE) -> IndexProfile:
+    if name not in PROFILES:
+        raise ValueError(f"unknown INDEX_PROFILE {name!r} (expected one of {', '.join(PROFILES)})")
+    overrides = {}
+    for field, value in (("m", INDEX_HNSW_M), ("ef_construction", INDEX_EF_CONSTRUCTION),
+                         ("ef_search", INDEX_EF_SEARCH), ("replicas", INDEX_REPLICAS)):
+        if value:
+            overrides[field] = int(value)
+    if INDEX_SHARDS:
+        overrides["shards"] = INDEX_SHARDS
+    return replace(PROFILES[name], **overrides)
@@ -0,0 +1,199 @@
+import functools
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import pytesseract
+from PIL import Image, ImageOps, ImageSequence
+
+from common.telemetry import logger
+
+# --- Config ---
+OCR_PROCESSES = int(os.environ.get("OCR_PROCESSES", os.cpu_count() or 1))
+OCR_LANG = os.environ.get("OCR_LANG", "eng")
+OCR_PSM = int(os.environ.get("OCR_PSM", "3"))
+# Tesseract is tuned for ~300 DPI; scans with DPI metadata are rescaled to this
+OCR_TARGET_DPI = int(os.environ.get("OCR_TARGET_DPI", "300"))
+# Lower DPI values are ignored: most JPEGs/PNGs carry a 72 or 96 DPI placeholder that
+# says nothing about the scan, and trusting it would upscale them ~4x for nothing
+OCR_MIN_SCAN_DPI = int(os.environ.get("OCR_MIN_SCAN_DPI", "150"))
+# Oversized scans are downscaled so their longest side fits
+OCR_MAX_SIDE = int(os.environ.get("OCR_MAX_SIDE", "6000"))
+# Pages taller than this are split into strips that are OCR'd in parallel
+OCR_TILE_HEIGHT = int(os.environ.get("OCR_TILE_HEIGHT", "1600"))
+
+# Pages are separated by a form feed, like tesseract's own multi-page output
+PAGE_SEPARATOR = "\n\f\n"
+# Tesseract's page segmentation modes
+VALID_PSM = range(0, 14)
+
+
+@dataclass
+class OcrOptions:
+    lang: str = OCR_LANG
+    psm: int = OCR_PSM
+    binarize: bool = True
+
+    @property
+    def tesseract_config(self) -> str:
+        return f"--psm {self.psm}"
+
+    @classmethod
+    def from_message(cls, body: Dict) -> "OcrOptions":
+        """
+        Options set per job in a message body ('lang', 'psm'). Invalid values
+        fall back to the defaults: they would fail the job on every redelivery.
+        """
+        options = cls()
+        lang = body.get("lang")
+        if lang is not None:
+            if isinstance(lang, str) and set(lang.split("+")) <= installed_languages():
+                options.lang = lang
+            else:
+                logger.warning("ignoring unavailable OCR language", extra={"lang": lang, "default": options.lang})
+        psm = body.get("psm")
+        if psm is not None:
+            try:
+                psm = int(psm)
+            except (TypeError, ValueError):
+                psm = None
+            if psm in VALID_PSM:
+                options.psm = psm
+            else:
+                logger.warning("ignoring invalid OCR psm", extra={"psm": body.get("psm"), "default": options.psm})
+        return options
+
+
+@functools.lru_cache(maxsize=None)
+def installed_languages() -> FrozenSet[str]:
+    return frozenset(pytesseract.get_languages(config=""))
+
+
+# --- Preprocessing ---
+
+def otsu_threshold(gray: Image.Image) -> int:
+    histogram = gray.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_bg = weight_bg = 0
+    best_threshold, best_variance = 127, -1.0
+    for t, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+        sum_bg += t * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = t, variance
+    return best_threshold
+
+
+def preprocess(image: Image.Image, options: OcrOptions) -> Image.Image:
+    """
+    Grayscale, rescale to OCR_TARGET_DPI (when the scan records a plausible
+    scan DPI, at least OCR_MIN_SCAN_DPI), cap the longest side at OCR_MAX_SIDE,
+    and binarize with Otsu's threshold.
+    """
+    image = ImageOps.exif_transpose(image)
+    gray = image.convert("L")
+
+    scale = 1.0
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0] and float(dpi[0]) >= OCR_MIN_SCAN_DPI:
+        scale = OCR_TARGET_DPI / float(dpi[0])
+    longest = max(gray.size) * scale
+    if longest > OCR_MAX_SIDE:
+        scale *= OCR_MAX_SIDE / longest
+    if abs(scale - 1.0) > 0.05:
+        size = (max(1, round(gray.width * scale)), max(1, round(gray.height * scale)))
+        gray = gray.resize(size, Image.LANCZOS if scale < 1 else Image.BICUBIC)
+
+    if options.binarize:
+        threshold = otsu_threshold(gray)
+        gray = gray.point(lambda p: 255 if p > threshold else 0)
+    return gray
+
+
+def split_tiles(page: Image.Image, tile_height: int = OCR_TILE_HEIGHT) -> List[Image.Image]:
+    """
+    Split a tall page into horizontal strips, cutting at the blankest row near
+    each boundary so text lines aren't sliced in half.
+    """
+    if page.height <= tile_height * 1.5:
+        return [page]
+    # Mean brightness of each row: squash the page to one pixel wide with a box filter
+    row_brightness = list(page.resize((1, page.height), Image.BOX).tobytes())
+    window = tile_height // 4
+    cuts = [0]
+    while page.height - cuts[-1] > tile_height * 1.5:
+        target = cuts[-1] + tile_height
+        lo, hi = target - window, min(page.height - 1, target + window)
+        cuts.append(max(range(lo, hi), key=lambda row: row_brightness[row]))
+    cuts.append(page.height)
+    return [page.crop((0, top, page.width, bottom)) for top, bottom in zip(cuts, cuts[1:])]
+
+
+def load_pages(data: bytes) -> List[Image.Image]:
+    image = Image.open(io.BytesIO(data))
+    # Multi-page TIFFs (and other multi-frame formats) yield one image per page
+    return [frame.copy() for frame in ImageSequence.Iterator(image)]
+
+
+# --- OCR ---
+
+def _ocr_tile(tile: Tuple[str, Tuple[int, int], bytes], lang: str, config: str) -> str:
+    mode, size, raw = tile
+    return pytesseract.image_to_string(Image.frombytes(mode, size, raw), lang=lang, config=config)
+
+
+class OcrEngine:
+    """
+    Process-pool OCR. Every page of an image is preprocessed, split into
+    strips, and the strips of all pages are OCR'd in parallel across cores.
+    """
+
+    def __init__(self, processes: int = OCR_PROCESSES):
+        self.processes = processes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # forkserver: the callers are threaded (SQS worker pool), which doesn't mix well with fork
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context("forkserver")
+                )
+            return self._pool
+
+    def image_to_text(self, data: bytes, options: Optional[OcrOptions] = None) -> str:
+        return PAGE_SEPARATOR.join(self.pages_to_text(load_pages(data), options))
+
+    def pages_to_text(self, pages: List[Image.Image], options: Optional[OcrOptions] = None) -> List[str]:
+        options = options or OcrOptions()
+        jobs = []
+        for page_number, page in enumerate(pages):
+            for tile in split_tiles(preprocess(page, options)):
+                tile = tile.convert("L")
+                jobs.append((page_number, self.pool.submit(
+                    _ocr_tile, (tile.mode, tile.size, tile.tobytes()), options.lang, options.tesseract_config
+                )))
+        texts = [[] for _ in pages]
+        for page_number, future in jobs:
+            texts[page_number].append(future.result().strip())
+        return ["\n".join(part for part in page if part) for page in texts]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
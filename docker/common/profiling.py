@@ -0,0 +1,270 @@
+import collections
+import cProfile
+import datetime
+import itertools
+import json
+import marshal
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import boto3
+
+from common.telemetry import SERVICE_NAME, get_trace_id, logger, observe_stages
+
+# --- Config ---
+# Profile one message in every N; 0 (the default) turns profiling off
+PROFILE_EVERY_N = int(os.environ.get("PROFILE_EVERY_N", "0"))
+# 'sample': stack sampling only, low overhead; 'cprofile': deterministic pstats (slower, exact call counts)
+PROFILE_MODE = os.environ.get("PROFILE_MODE", "sample")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+# A local directory, or s3://bucket/prefix
+PROFILE_OUTPUT = os.environ.get("PROFILE_OUTPUT", "/tmp/profiles")
+
+_counter = itertools.count(1)
+# cProfile (and the sampler's view of one thread) only makes sense for one message at a
+# time per process; a message that comes up for profiling while another is running is skipped
+_busy = threading.Lock()
+_s3 = None
+
+FrameKey = Tuple[str, int, str]  # (filename, first line, function): the pstats function key
+
+
+def profiled(handler: Callable[[dict], Optional[bool]], msg: dict) -> Optional[bool]:
+    """
+    Run handler(msg), profiling it if it is the Nth message this process has
+    seen. Callers check PROFILE_EVERY_N first, so with profiling off this
+    isn't even called.
+    """
+    if next(_counter) % PROFILE_EVERY_N or not _busy.acquire(blocking=False):
+        return handler(msg)
+    try:
+        return MessageProfile(msg).run(handler)
+    finally:
+        _busy.release()
+
+
+def message_tags(msg: dict) -> Dict:
+    """Document id and object size from an S3 event (or {bucket, key} router) message body."""
+    try:
+        body = json.loads(msg["Body"])
+    except (KeyError, TypeError, ValueError):
+        return {}
+    if not isinstance(body, dict):
+        return {}
+    tags = {}
+    if body.get("Records"):
+        obj = body["Records"][0].get("s3", {}).get("object", {})
+        key = obj.get("key")
+        if obj.get("size") is not None:
+            tags["size"] = obj["size"]
+    else:
+        key = body.get("key")
+    if key:
+        tags["key"] = key
+        # Same naming as the workers: uploads/<id>.docx, semantic-chunks/<id>.json → <id>
+        tags["document_id"] = key.split("/")[-1].split(".")[0]
+    return tags
+
+
+# --- Sampling ---
+
+class StackSampler(threading.Thread):
+    """
+    Samples one thread's Python stack every interval and counts identical
+    stacks. Each stack is rooted at the pipeline stage running at the time,
+    so a flamegraph splits cleanly into download/convert/chunk/... towers.
+    """
+
+    def __init__(self, thread_id: int, interval: float, root_code, current_stage: Callable[[], Optional[str]]):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root_code = root_code
+        self.current_stage = current_stage
+        self.stacks: "collections.Counter[Tuple]" = collections.Counter()
+        self._stopped = threading.Event()
+        self.elapsed = 0.0
+
+    def run(self):
+        start = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            # Walk up to the profiler's own frame, leaving out the worker plumbing below it
+            while frame is not None and frame.f_code is not self.root_code:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[(self.current_stage() or "-", tuple(stack))] += 1
+        self.elapsed = time.perf_counter() - start
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format: 'root;caller;callee count' per line."""
+        lines = []
+        for (stage_name, stack), count in self.stacks.most_common():
+            frames = [f"stage:{stage_name}"] + [frame_label(key) for key in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def pstats(self) -> Dict:
+        """
+        The samples as a pstats table (what cProfile.Profile.dump_stats marshals),
+        so `python -m pstats` and snakeviz work on sampled profiles too. Times are
+        each sample's share of the wall time (the sampler wakes up a little less
+        often than the interval under load); call counts are sample counts.
+        """
+        stats: Dict[FrameKey, list] = {}
+        per_sample = self.elapsed / max(1, sum(self.stacks.values()))
+        for (_, stack), count in self.stacks.items():
+            seconds = count * per_sample
+            seen = set()
+            for depth, key in enumerate(stack):
+                entry = stats.setdefault(key, [0, 0, 0.0, 0.0, {}])
+                if key not in seen:
+                    # Recursive frames count once towards inclusive time
+                    seen.add(key)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if depth == len(stack) - 1:
+                    entry[2] += seconds
+                if depth:
+                    caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[2] += seconds if depth == len(stack) - 1 else 0.0
+                    caller[3] += seconds
+        return {
+            key: (cc, nc, tt, ct, {caller: tuple(v) for caller, v in callers.items()})
+            for key, (cc, nc, tt, ct, callers) in stats.items()
+        }
+
+
+def frame_label(key: FrameKey) -> str:
+    filename, line, name = key
+    # ';' separates frames in the collapsed format
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ":")
+
+
+# --- Profiles ---
+
+class MessageProfile:
+    """
+    Profiles one message: a stack sampler always (for the collapsed stacks),
+    plus cProfile in PROFILE_MODE=cprofile (for exact pstats). Records every
+    telemetry stage the handler runs, then writes <name>.pstats,
+    <name>.collapsed and <name>.json (the tags) to PROFILE_OUTPUT.
+    """
+
+    def __init__(self, msg: dict, mode: str = PROFILE_MODE, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.mode = mode
+        self.interval = interval_ms / 1000
+        self.msg = msg
+        self.tags = {"service": SERVICE_NAME, "mode": mode, **message_tags(msg)}
+        self.stages: List[Dict] = []
+        self._current: List[str] = []
+
+    # Stage observer (common.telemetry.stage)
+    def stage_started(self, name: str):
+        self._current.append(name)
+
+    def stage_finished(self, name: str, elapsed: float, fields: Dict):
+        if self._current:
+            self._current.pop()
+        self.stages.append({"stage": name, "duration_ms": round(elapsed * 1000, 2), **fields})
+
+    def current_stage(self) -> Optional[str]:
+        # Called from the sampler thread while the handler pushes and pops
+        try:
+            return self._current[-1]
+        except IndexError:
+            return None
+
+    def run(self, handler: Callable[[dict], Optional[bool]]) -> Optional[bool]:
+        # Note: work a handler hands to a process pool (OCR, xlsx sheets) shows up as the
+        # time spent waiting on its futures; profile those pools' functions separately
+        sampler = StackSampler(threading.get_ident(), self.interval, MessageProfile.run.__code__, self.current_stage)
+        profiler = cProfile.Profile() if self.mode == "cprofile" else None
+        observe_stages(self)
+        start = time.perf_counter()
+        ok = False
+        sampler.start()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            result = handler(self.msg)
+            ok = result is not False
+            return result
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            sampler.stop()
+            self.tags.update(
+                ok=ok,
+                duration_ms=round((time.perf_counter() - start) * 1000, 2),
+                trace_id=get_trace_id(),
+                samples=sum(sampler.stacks.values()),
+            )
+            observe_stages(None)
+            try:
+                self.save(_profile_stats(profiler) if profiler else sampler.pstats(), sampler.collapsed())
+            except Exception as e:
+                logger.error("failed to save profile", extra={"error": str(e)})
+
+    def save(self, stats: Dict, collapsed: str):
+        tags = {**self.tags, "stages": self.stages}
+        # The stage that took longest is the one the profile is most likely to explain
+        if self.stages:
+            tags["stage"] = max(self.stages, key=lambda s: s["duration_ms"])["stage"]
+            tags.setdefault("size", next((s[f] for s in self.stages for f in ("bytes", "chars") if f in s), None))
+        stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        name = f"{SERVICE_NAME}/{tags.get('document_id', 'unknown')}-{tags.get('stage', 'none')}-{stamp}"
+        artifacts = {
+            ".pstats": marshal.dumps(stats),
+            ".collapsed": collapsed.encode("utf-8"),
+            ".json": json.dumps(tags, default=str, indent=2).encode("utf-8"),
+        }
+        location = write_artifacts(name, artifacts, tags)
+        logger.info("saved profile", extra={"location": location, "profile_stage": tags.get("stage"),
+                                           "document_id": tags.get("document_id"), "duration_ms": tags["duration_ms"]})
+
+
+def _profile_stats(profiler: cProfile.Profile) -> Dict:
+    profiler.create_stats()
+    return profiler.stats
+
+
+def write_artifacts(name: str, artifacts: Dict[str, bytes], tags: Dict, output: str = PROFILE_OUTPUT) -> str:
+    if output.startswith("s3://"):
+        bucket, _, prefix = output[len("s3://"):].partition("/")
+        base = f"{prefix.rstrip('/')}/{name}" if prefix else name
+        # S3 metadata must be strings; stages and the like stay in the .json sidecar
+        metadata = {k.replace("_", "-"): str(tags[k]) for k in ("document_id", "size", "stage", "service") if tags.get(k) is not None}
+        for suffix, body in artifacts.items():
+            _s3_client().put_object(Bucket=bucket, Key=base + suffix, Body=body, Metadata=metadata)
+        return f"s3://{bucket}/{base}"
+    base = os.path.join(output, name)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    for suffix, body in artifacts.items():
+        # Written then renamed, so anything collecting the directory never sees half a file
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(base), delete=False) as f:
+            f.write(body)
+        os.replace(f.name, base + suffix)
+    return base
+
+
+def _s3_client():
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client("s3")
+    return _s3
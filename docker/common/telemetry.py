@@ -0,0 +1,196 @@
+import contextlib
+import contextvars
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from typing import Dict, Optional
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, multiprocess, start_http_server
+
+# --- Config ---
+SERVICE_NAME = os.environ.get("SERVICE_NAME", "worker")
+# Prometheus /metrics is served on this port; 0 disables it
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+# An empty directory, needed with WORKER_POOL=process: every process then records its
+# metrics in files there and /metrics adds them up. Otherwise what the pool processes
+# record (stage timings, failures) is lost. prometheus_client reads this on import,
+# so it has to be set in the environment the worker starts with.
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR", "")
+
+# Key of the trace id in SQS message bodies and in S3 object metadata (x-amz-meta-trace-id)
+TRACE_ID_KEY = "trace_id"
+TRACE_METADATA_KEY = "trace-id"
+# The API gateway's document id and its owner, under these keys in message bodies
+# and these (x-amz-meta-*) in S3 metadata; chunks are tagged with them for search filters
+DOCUMENT_ID_KEY = "document_id"
+USER_ID_KEY = "user_id"
+DOCUMENT_METADATA_KEYS = {DOCUMENT_ID_KEY: "document-id", USER_ID_KEY: "user-id"}
+
+# Seconds; covers a cached lookup up to a long OCR job
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+LAG_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds", "Time spent in a pipeline stage",
+    ["service", "stage"], buckets=STAGE_BUCKETS,
+)
+STAGE_FAILURES = Counter(
+    "pipeline_stage_failures_total", "Pipeline stages that raised",
+    ["service", "stage"],
+)
+MESSAGES = Counter(
+    "pipeline_messages_total", "Queue messages handled, by outcome (processed/failed)",
+    ["service", "outcome"],
+)
+QUEUE_LAG = Histogram(
+    "pipeline_queue_lag_seconds", "Time from a message being sent to SQS to a worker picking it up",
+    ["service"], buckets=LAG_BUCKETS,
+)
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+_document: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar("document", default={})
+# Set by common.profiling for a message being profiled; told when each stage starts and ends
+_stage_observer: contextvars.ContextVar = contextvars.ContextVar("stage_observer", default=None)
+_metrics_started = False
+
+
+# --- Tracing ---
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def set_trace_id(trace_id: Optional[str]) -> str:
+    trace_id = trace_id or new_trace_id()
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def trace_id_from_metadata(response: Dict) -> Optional[str]:
+    # boto3 returns user metadata (x-amz-meta-*) with the prefix stripped
+    return response.get("Metadata", {}).get(TRACE_METADATA_KEY)
+
+
+def get_document() -> Dict[str, str]:
+    # {document_id, user_id} of the document being processed; either may be missing
+    return _document.get()
+
+
+def set_document(ids: Dict):
+    _document.set({key: str(ids[key]) for key in DOCUMENT_METADATA_KEYS if ids.get(key)})
+
+
+def document_from_metadata(response: Dict) -> Dict[str, str]:
+    metadata = response.get("Metadata", {})
+    return {key: metadata[name] for key, name in DOCUMENT_METADATA_KEYS.items() if metadata.get(name)}
+
+
+def trace_metadata() -> Dict[str, str]:
+    """
+    Metadata for an S3 put, so whatever the object triggers continues this
+    trace and knows which document (and user) it belongs to.
+    """
+    trace_id = get_trace_id()
+    metadata = {TRACE_METADATA_KEY: trace_id} if trace_id else {}
+    for key, value in get_document().items():
+        metadata[DOCUMENT_METADATA_KEYS[key]] = value
+    return metadata
+
+
+# --- Metrics ---
+
+@contextlib.contextmanager
+def stage(name: str, **fields):
+    """
+    Time a block as one pipeline stage (download, convert, chunk, embed,
+    index, upload): observed in pipeline_stage_seconds and logged.
+    """
+    observer = _stage_observer.get()
+    if observer is not None:
+        observer.stage_started(name)
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_FAILURES.labels(SERVICE_NAME, name).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(SERVICE_NAME, name).observe(elapsed)
+        logger.debug("stage finished", extra={"stage": name, "duration_ms": round(elapsed * 1000, 2), **fields})
+        if observer is not None:
+            observer.stage_finished(name, elapsed, fields)
+
+
+def observe_stages(observer) -> contextvars.Token:
+    """Report the stages run in the current context to observer (see common.profiling)."""
+    return _stage_observer.set(observer)
+
+
+def record_message(ok: bool):
+    MESSAGES.labels(SERVICE_NAME, "processed" if ok else "failed").inc()
+
+
+def record_queue_lag(message: Dict):
+    # SentTimestamp is in epoch milliseconds; it's there when messages are received with AttributeNames
+    sent = message.get("Attributes", {}).get("SentTimestamp")
+    if sent:
+        QUEUE_LAG.labels(SERVICE_NAME).observe(max(0.0, time.time() - int(sent) / 1000))
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    global _metrics_started
+    if port and not _metrics_started:
+        registry = REGISTRY
+        if PROMETHEUS_MULTIPROC_DIR:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        start_http_server(port, registry=registry)
+        _metrics_started = True
+        logger.info("metrics server started", extra={"port": port, "multiprocess": bool(PROMETHEUS_MULTIPROC_DIR)})
+
+
+# --- Logging ---
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the current trace id and any `extra` fields."""
+
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname.lower(),
+            "service": SERVICE_NAME,
+            "message": record.getMessage(),
+        }
+        trace_id = get_trace_id()
+        if trace_id:
+            entry[TRACE_ID_KEY] = trace_id
+        entry.update({k: v for k, v in vars(record).items() if k not in self.RESERVED})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def get_logger(name: str = SERVICE_NAME) -> logging.Logger:
+    log = logging.getLogger(name)
+    if not log.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        log.addHandler(handler)
+        log.setLevel(LOG_LEVEL)
+        log.propagate = False
+    return log
+
+
+logger = get_logger()
@@ -0,0 +1,245 @@
+import contextvars
+import json
+import os
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional
+
+import boto3
+
+from common.document_status import FAILED, report_status
+from common.profiling import PROFILE_EVERY_N, profiled
+from common.telemetry import (
+    PROMETHEUS_MULTIPROC_DIR, TRACE_ID_KEY, logger, record_message, record_queue_lag, set_document, set_trace_id,
+    start_metrics_server,
+)
+
+# --- Config ---
+WORKER_CONCURRENCY = int(os.environ.get("WORKER_CONCURRENCY", os.cpu_count() or 1))
+# 'thread' suits handlers that wait on S3/subprocesses/native code; 'process' for pure-Python CPU work
+WORKER_POOL = os.environ.get("WORKER_POOL", "thread")
+SQS_WAIT_TIME_SECONDS = int(os.environ.get("SQS_WAIT_TIME_SECONDS", "10"))
+# In-flight messages are kept invisible for this long, renewed every half period
+SQS_VISIBILITY_TIMEOUT = int(os.environ.get("SQS_VISIBILITY_TIMEOUT", "120"))
+# Deliveries before SQS moves a message to the dead-letter queue; read from the queue's
+# RedrivePolicy when unset. Only the last one's failure is reported as the document's status.
+SQS_MAX_RECEIVE_COUNT = int(os.environ.get("SQS_MAX_RECEIVE_COUNT", "0")) or None
+
+SQS_MAX_BATCH = 10  # receive/delete/change-visibility batch limit
+
+
+def _batches(items: List, size: int = SQS_MAX_BATCH):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _last_delivery(msg: dict, max_receive_count: Optional[int]) -> bool:
+    # Without a dead-letter queue a message is retried until it expires: no delivery is known to be the last
+    if not max_receive_count:
+        return False
+    return int(msg.get("Attributes", {}).get("ApproximateReceiveCount", 1)) >= max_receive_count
+
+
+def _handle(handler: Callable[[dict], Optional[bool]], msg: dict, max_receive_count: Optional[int] = None) -> Optional[bool]:
+    # Each message runs in a fresh context carrying the trace id and document ids
+    # from its body (a new trace if it has none, e.g. S3 notifications; handlers
+    # can override both)
+    def run():
+        try:
+            body = json.loads(msg["Body"])
+        except ValueError:
+            body = None
+        body = body if isinstance(body, dict) else {}
+        set_trace_id(body.get(TRACE_ID_KEY))
+        set_document(body)
+        # Handlers report their own progress (common.document_status); failures are reported
+        # here, once the message won't be redelivered. Until then a retry may still succeed,
+        # so the status is left as it is rather than flipping to FAILED and back.
+        try:
+            result = profiled(handler, msg) if PROFILE_EVERY_N else handler(msg)
+        except Exception:
+            if _last_delivery(msg, max_receive_count):
+                report_status(FAILED)
+            raise
+        if result is False and _last_delivery(msg, max_receive_count):
+            report_status(FAILED)
+        return result
+    return contextvars.Context().run(run)
+
+
+class SQSWorker:
+    """
+    Long-polls an SQS queue and runs handler(message) on a bounded pool.
+
+    - Receives up to 10 messages at a time, never more than there are free pool slots.
+    - Keeps in-flight messages invisible with change_message_visibility_batch
+      while the handler runs, so long jobs aren't redelivered mid-way.
+    - Acknowledges finished messages with delete_message_batch. A handler that
+      returns False or raises leaves its message on the queue for a retry; on
+      its last delivery (the queue's maxReceiveCount), the document is marked failed.
+    - On SIGTERM/SIGINT stops receiving, lets in-flight messages finish and
+      flushes their acknowledgements before returning.
+    - Serves Prometheus metrics (messages, failures, queue lag) and runs every
+      message under the trace id from its body. With pool='process', the stage
+      metrics recorded in pool processes need PROMETHEUS_MULTIPROC_DIR (see
+      common.telemetry).
+    - With PROFILE_EVERY_N set, profiles every Nth message (see common.profiling).
+    - With exit_when_idle (one-off runs such as backfills), returns once a
+      receive comes back empty with nothing in flight.
+    """
+
+    def __init__(
+        self,
+        queue_url: str,
+        handler: Callable[[dict], Optional[bool]],
+        concurrency: int = WORKER_CONCURRENCY,
+        pool: str = WORKER_POOL,
+        wait_time_seconds: int = SQS_WAIT_TIME_SECONDS,
+        visibility_timeout: int = SQS_VISIBILITY_TIMEOUT,
+        sqs_client=None,
+        exit_when_idle: bool = False,
+        max_receive_count: Optional[int] = SQS_MAX_RECEIVE_COUNT,
+    ):
+        self.queue_url = queue_url
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.pool = pool
+        self.wait_time_seconds = wait_time_seconds
+        self.visibility_timeout = visibility_timeout
+        self.sqs = sqs_client or boto3.client("sqs")
+        self.exit_when_idle = exit_when_idle
+        self.max_receive_count = max_receive_count
+        self._in_flight: Dict[Future, dict] = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._done = threading.Event()
+        self.processed = 0
+        self.failed = 0
+
+    def stop(self, *_):
+        if not self._stopping.is_set():
+            logger.info("stop requested, draining in-flight messages")
+        self._stopping.set()
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        executor_cls = ProcessPoolExecutor if self.pool == "process" else ThreadPoolExecutor
+        executor = executor_cls(max_workers=self.concurrency)
+        heartbeat = threading.Thread(target=self._heartbeat, name="sqs-heartbeat", daemon=True)
+        heartbeat.start()
+        start_metrics_server()
+        if self.pool == "process" and not PROMETHEUS_MULTIPROC_DIR:
+            logger.warning("PROMETHEUS_MULTIPROC_DIR is unset: stage metrics from pool processes won't be exported")
+        if self.max_receive_count is None:
+            self.max_receive_count = self._redrive_max_receive_count()
+        logger.info("polling queue", extra={
+            "queue_url": self.queue_url, "concurrency": self.concurrency, "pool": self.pool,
+            "max_receive_count": self.max_receive_count,
+        })
+        try:
+            while not self._stopping.is_set():
+                self._ack_finished()
+                free = self.concurrency - len(self._in_flight)
+                if free <= 0:
+                    wait(list(self._in_flight), timeout=1, return_when=FIRST_COMPLETED)
+                    continue
+                messages = self._receive(min(SQS_MAX_BATCH, free))
+                if messages == [] and self.exit_when_idle and not self._in_flight:
+                    logger.info("queue drained, exiting")
+                    break
+                for msg in messages or []:
+                    with self._lock:
+                        self._in_flight[executor.submit(_handle, self.handler, msg, self.max_receive_count)] = msg
+        finally:
+            wait(list(self._in_flight))
+            self._ack_finished()
+            executor.shutdown()
+            self._done.set()
+            logger.info("stopped", extra={"processed": self.processed, "failed": self.failed})
+
+    def _redrive_max_receive_count(self) -> Optional[int]:
+        try:
+            attributes = self.sqs.get_queue_attributes(
+                QueueUrl=self.queue_url, AttributeNames=["RedrivePolicy"],
+            ).get("Attributes", {})
+        except Exception:
+            logger.exception("could not read the queue's redrive policy; failures won't be reported")
+            return None
+        if "RedrivePolicy" not in attributes:
+            return None
+        return int(json.loads(attributes["RedrivePolicy"])["maxReceiveCount"])
+
+    def _receive(self, max_messages: int) -> Optional[List[dict]]:
+        # None when polling failed, as opposed to an empty queue
+        try:
+            messages = self.sqs.receive_message(
+                QueueUrl=self.queue_url,
+                MaxNumberOfMessages=max_messages,
+                WaitTimeSeconds=self.wait_time_seconds,
+                VisibilityTimeout=self.visibility_timeout,
+                AttributeNames=["All"],
+            ).get("Messages", [])
+        except Exception:
+            logger.exception("error polling queue")
+            time.sleep(1)
+            return None
+        for msg in messages:
+            record_queue_lag(msg)
+        return messages
+
+    def _ack_finished(self):
+        with self._lock:
+            done = [(future, msg) for future, msg in self._in_flight.items() if future.done()]
+            for future, _ in done:
+                del self._in_flight[future]
+
+        acks = []
+        for future, msg in done:
+            try:
+                ok = future.result() is not False
+            except Exception as e:
+                logger.error("handler failed", extra={"message_id": msg["MessageId"]}, exc_info=e)
+                ok = False
+            record_message(ok)
+            if ok:
+                acks.append(msg)
+                self.processed += 1
+            else:
+                self.failed += 1
+        self._delete(acks)
+
+    def _delete(self, messages: List[dict]):
+        for batch in _batches(messages):
+            try:
+                response = self.sqs.delete_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[{"Id": str(i), "ReceiptHandle": msg["ReceiptHandle"]} for i, msg in enumerate(batch)],
+                )
+            except Exception as e:
+                # The messages reappear after their visibility timeout and get processed again
+                logger.error("failed to delete messages", extra={"error": str(e)})
+                continue
+            for failure in response.get("Failed", []):
+                logger.error("failed to delete message", extra={"failure": failure})
+
+    def _heartbeat(self):
+        interval = max(1, self.visibility_timeout // 2)
+        while not self._done.wait(interval):
+            with self._lock:
+                handles = [msg["ReceiptHandle"] for future, msg in self._in_flight.items() if not future.done()]
+            for batch in _batches(handles):
+                try:
+                    self.sqs.change_message_visibility_batch(
+                        QueueUrl=self.queue_url,
+                        Entries=[
+                            {"Id": str(i), "ReceiptHandle": handle, "VisibilityTimeout": self.visibility_timeout}
+                            for i, handle in enumerate(batch)
+                        ],
+                    )
+                except Exception as e:
+                    logger.error("failed to extend visibility", extra={"error": str(e)})
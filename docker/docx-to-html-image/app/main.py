@@ -1,15 +1,229 @@
+import base64
 import boto3
 import json
 import os
 import subprocess
-import time
+import threading
+from botocore.exceptions import ClientError
+from common.document_status import CONVERTED, CONVERTING, FAILED, report_status
+from common.telemetry import logger, stage, trace_metadata
+from common.worker import SQSWorker
 
-sqs = boto3.client('sqs')
 s3 = boto3.client('s3')
 
 # Set these from env
 QUEUE_URL = os.environ["SQS_QUEUE_URL"]
 OUTPUT_BUCKET = os.environ.get("OUTPUT_BUCKET", "")  # Optional
+# At most this many pandoc processes run at once per worker process, whatever the
+# worker concurrency (with WORKER_POOL=process, each pool process has this limit)
+PANDOC_MAX_PROCESSES = int(os.environ.get("PANDOC_MAX_PROCESSES", os.cpu_count() or 1))
+PANDOC_TIMEOUT_SECONDS = int(os.environ.get("PANDOC_TIMEOUT_SECONDS", "300"))
+# Markers recording which source content (see content_id) was converted to which output key
+CONVERSIONS_PREFIX = os.environ.get("CONVERSIONS_PREFIX", "conversions/")
+
+READ_CHUNK_SIZE = 1024 * 1024
+UPLOAD_PART_SIZE = 8 * 1024 * 1024  # S3 minimum is 5 MiB for all but the last part
+
+pandoc_slots = threading.BoundedSemaphore(PANDOC_MAX_PROCESSES)
+
+
+class PandocError(Exception):
+    """pandoc rejected the document: converting it again won't help."""
+
+    def __init__(self, returncode, stderr):
+        super().__init__(f"pandoc exited with {returncode}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class MultipartWriter:
+    """
+    Uploads a stream of parts to S3. Output that fits in one part is sent
+    with a single put_object; larger output becomes a multipart upload that
+    is only completed once the whole conversion succeeded.
+    """
+
+    def __init__(self, bucket, key, content_type="text/html", metadata=None):
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.metadata = metadata or {}
+        self.upload_id = None
+        self.parts = []
+        self.pending = b""
+
+    def write(self, data):
+        self.pending += data
+        while len(self.pending) >= UPLOAD_PART_SIZE:
+            self._upload_part(self.pending[:UPLOAD_PART_SIZE])
+            self.pending = self.pending[UPLOAD_PART_SIZE:]
+
+    def complete(self):
+        if self.upload_id is None:
+            s3.put_object(
+                Bucket=self.bucket, Key=self.key, Body=self.pending,
+                ContentType=self.content_type, Metadata=self.metadata,
+            )
+            return
+        if self.pending:
+            self._upload_part(self.pending)
+        s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={"Parts": self.parts},
+        )
+
+    def abort(self):
+        if self.upload_id is not None:
+            s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+
+    def _upload_part(self, data):
+        if self.upload_id is None:
+            self.upload_id = s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key, ContentType=self.content_type, Metadata=self.metadata,
+            )["UploadId"]
+        part_number = len(self.parts) + 1
+        response = s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=data,
+        )
+        self.parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+
+class DiscardWriter:
+    # Used when OUTPUT_BUCKET is unset: convert, but don't store anything
+    def write(self, data):
+        pass
+
+    def complete(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+def _feed_stdin(body, stdin):
+    try:
+        for chunk in body.iter_chunks(READ_CHUNK_SIZE):
+            stdin.write(chunk)
+    except (BrokenPipeError, ValueError):
+        pass  # pandoc exited early; its exit code reports why
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def convert_stream(body, writer):
+    """
+    Pipe a DOCX stream through pandoc into writer. Returns True on success,
+    False if pandoc timed out; raises PandocError if pandoc failed on the
+    document. On failure or timeout the writer is aborted and nothing is stored.
+    """
+    with pandoc_slots:
+        proc = subprocess.Popen(
+            ["pandoc", "-f", "docx", "-t", "html"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        timer = threading.Timer(PANDOC_TIMEOUT_SECONDS, proc.kill)
+        feeder = threading.Thread(target=_feed_stdin, args=(body, proc.stdin), daemon=True)
+        stderr = []
+        drain_stderr = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+        timer.start()
+        feeder.start()
+        drain_stderr.start()
+        try:
+            for part in iter(lambda: proc.stdout.read(UPLOAD_PART_SIZE), b""):
+                writer.write(part)
+            returncode = proc.wait()
+        except BaseException:
+            proc.kill()
+            writer.abort()
+            raise
+        finally:
+            timer.cancel()
+            feeder.join()
+            drain_stderr.join()
+
+    if returncode != 0:
+        writer.abort()
+        stderr = b"".join(stderr).decode("utf-8", "replace").strip()
+        if returncode < 0:
+            # Killed by the timer, e.g. on a busy host: worth another try
+            logger.error("pandoc timed out", extra={"stderr": stderr, "timeout_seconds": PANDOC_TIMEOUT_SECONDS})
+            return False
+        raise PandocError(returncode, stderr)
+    try:
+        writer.complete()
+    except BaseException:
+        writer.abort()
+        raise
+    return True
+
+
+def output_exists(key):
+    try:
+        s3.head_object(Bucket=OUTPUT_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return False
+        raise
+    return True
+
+
+def content_id(head):
+    """
+    Identity of an object's content, from its HEAD response (requested with
+    ChecksumMode=ENABLED): its SHA-256 checksum when the uploader sent one.
+
+    Otherwise the ETag, which is only an MD5 of the content for single-part,
+    non-KMS uploads: the same file uploaded in parts, or with another part size,
+    gets a different ETag. Such copies are converted again rather than reused;
+    different content never shares an ETag (short of an MD5 collision).
+    """
+    checksum = head.get("ChecksumSHA256")
+    if checksum:
+        # Base64 isn't key-safe; a multipart upload's checksum of part checksums ends in "-<parts>"
+        digest, _, parts = checksum.partition("-")
+        return f"sha256-{base64.b64decode(digest).hex()}" + (f"-{parts}" if parts else "")
+    return head["ETag"].strip('"')
+
+
+def reuse_previous_conversion(content, output_key):
+    """
+    If identical content (same content_id) was converted before, make sure its
+    HTML exists at output_key and return True; otherwise return False.
+    """
+    try:
+        marker = s3.head_object(Bucket=OUTPUT_BUCKET, Key=f"{CONVERSIONS_PREFIX}{content}")
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return False
+        raise
+    previous_key = marker["Metadata"].get("output-key")
+    if previous_key == output_key:
+        # The marker outlives its output, which may have been deleted since
+        return output_exists(output_key)
+    try:
+        # New metadata: the copy belongs to this upload's document and user, not the earlier one's
+        s3.copy_object(
+            Bucket=OUTPUT_BUCKET, Key=output_key,
+            CopySource={"Bucket": OUTPUT_BUCKET, "Key": previous_key},
+            MetadataDirective="REPLACE", ContentType="text/html", Metadata=trace_metadata(),
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return False  # previous output was deleted; convert again
+        raise
+    return True
+
+
+def record_conversion(content, output_key):
+    s3.put_object(
+        Bucket=OUTPUT_BUCKET, Key=f"{CONVERSIONS_PREFIX}{content}",
+        Body=b"", Metadata={"output-key": output_key},
+    )
+
 
 def process_message(msg):
     body = json.loads(msg["Body"])
@@ -18,55 +232,45 @@ def process_message(msg):
     key = body["key"]
 
     filename = key.split("/")[-1]
-    local_docx = f"/tmp/{filename}"
-    local_html = local_docx.replace(".docx", ".html")
+    output_key = key.replace(".docx", ".html")
+
+    report_status(CONVERTING)
+    # The reuse check only needs the HEAD; the body is opened once there is something to convert
+    head = s3.head_object(Bucket=bucket, Key=key, ChecksumMode="ENABLED")
+    content = content_id(head)
+
+    if OUTPUT_BUCKET and reuse_previous_conversion(content, output_key):
+        logger.info("already converted, skipped pandoc", extra={"file_name": filename})
+        report_status(CONVERTED)
+        return True
 
-    # Download DOCX from S3
-    s3.download_file(bucket, key, local_docx)
+    # IfMatch: convert the content that was identified, even if the key was overwritten since
+    obj = s3.get_object(Bucket=bucket, Key=key, IfMatch=head["ETag"])
 
-    # Run pandoc
+    # Nothing touches /tmp: the S3 body is piped into pandoc and its output straight to S3
+    writer = MultipartWriter(OUTPUT_BUCKET, output_key, metadata=trace_metadata()) if OUTPUT_BUCKET else DiscardWriter()
+    # Download, conversion and upload overlap in one stream, so they are timed as one stage.
+    # S3 errors raise and a timeout returns False: the message is redelivered for both.
     try:
-        subprocess.run([
-            "pandoc", local_docx,
-            "-f", "docx", "-t", "html",
-            "-o", local_html
-        ], check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] Pandoc failed: {e}")
-        return
-
-    print(f"[INFO] Converted {filename} to HTML.")
-
-    # Optional: Upload HTML result back to S3
+        with stage("convert"):
+            converted = convert_stream(obj["Body"], writer)
+    except PandocError as e:
+        # The document itself can't be converted: acknowledge the message rather than retry it forever
+        logger.error("pandoc failed, dropping document", extra={
+            "file_name": filename, "returncode": e.returncode, "stderr": e.stderr,
+        })
+        report_status(FAILED)
+        return True
+    if not converted:
+        return False
+
+    logger.info("converted to HTML", extra={"file_name": filename})
+
     if OUTPUT_BUCKET:
-        output_key = key.replace(".docx", ".html")
-        s3.upload_file(local_html, OUTPUT_BUCKET, output_key)
-        print(f"[INFO] Uploaded {output_key} to {OUTPUT_BUCKET}")
-
-    # Cleanup
-    os.remove(local_docx)
-    os.remove(local_html)
-
-def poll_sqs():
-    while True:
-        messages = sqs.receive_message(
-            QueueUrl=QUEUE_URL,
-            MaxNumberOfMessages=1,
-            WaitTimeSeconds=10
-        ).get("Messages", [])
-
-        for msg in messages:
-            try:
-                process_message(msg)
-                # Delete the message after successful processing
-                sqs.delete_message(
-                    QueueUrl=QUEUE_URL,
-                    ReceiptHandle=msg["ReceiptHandle"]
-                )
-            except Exception as e:
-                print(f"[ERROR] Failed to process message: {e}")
-
-        time.sleep(1)
+        record_conversion(content, output_key)
+        logger.info("uploaded HTML", extra={"bucket": OUTPUT_BUCKET, "key": output_key})
+    report_status(CONVERTED)
+    return True
 
 if __name__ == "__main__":
-    poll_sqs()
+    SQSWorker(QUEUE_URL, process_message).run()
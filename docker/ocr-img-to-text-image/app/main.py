@@ -45,14 +45,13 @@
 
 import boto3
 import json
-import time
-import pytesseract
-from PIL import Image, UnidentifiedImageError
-import io
-import traceback
+from PIL import UnidentifiedImageError
 import os
+from common.document_status import CONVERTED, CONVERTING, report_status
+from common.ocr_engine import OcrEngine, OcrOptions
+from common.telemetry import logger, stage, trace_metadata
+from common.worker import SQSWorker
 
-sqs = boto3.client('sqs')
 s3 = boto3.client('s3')
 
 # QUEUE_URL = 'https://sqs.us-east-1.amazonaws.com/090081990755/pdf-queue'
@@ -62,68 +61,57 @@ s3 = boto3.client('s3')
 QUEUE_URL = os.environ["SQS_QUEUE_URL"]
 OUTPUT_BUCKET = os.environ.get("OUTPUT_BUCKET", "")  # Optional
 
-def process_image(bucket, key):
+# Shared by all worker threads; pages and tiles are OCR'd across all cores
+ocr_engine = OcrEngine()
+
+def process_image(bucket, key, options=None):
     try:
-        obj = s3.get_object(Bucket=bucket, Key=key)
-        img = Image.open(io.BytesIO(obj['Body'].read()))
-        text = pytesseract.image_to_string(img)
+        with stage("download"):
+            data = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+        with stage("convert", bytes=len(data)):
+            text = ocr_engine.image_to_text(data, options)
 
-        print(f"[✓] Extracted text from {key[:50]}...")
+        logger.info("extracted text", extra={"key": key, "chars": len(text)})
 
         # Save extracted text to S3
         output_key = key.replace("images/", "ocr-text/") + ".txt"
-        s3.put_object(
-            Bucket=OUTPUT_BUCKET,
-            Key=output_key,
-            Body=text.encode('utf-8')
-        )
+        with stage("upload"):
+            s3.put_object(
+                Bucket=OUTPUT_BUCKET,
+                Key=output_key,
+                Body=text.encode('utf-8'),
+                Metadata=trace_metadata(),
+            )
 
-        print(f"[→] Saved OCR text to s3://{OUTPUT_BUCKET}/{output_key}")
+        logger.info("saved OCR text", extra={"bucket": OUTPUT_BUCKET, "key": output_key})
         return True
 
     except UnidentifiedImageError:
-        print(f"[!] Could not identify image format for: {key}")
-    except Exception as e:
-        print(f"[!] Error processing image {key}: {str(e)}")
-        traceback.print_exc()
+        logger.error("could not identify image format", extra={"key": key})
+    except Exception:
+        logger.exception("error processing image", extra={"key": key})
     return False
 
-def poll_queue():
-    print("[*] Starting image processing worker...")
-    while True:
-        try:
-            resp = sqs.receive_message(
-                QueueUrl=QUEUE_URL,
-                MaxNumberOfMessages=1,
-                WaitTimeSeconds=10
-            )
-            messages = resp.get('Messages', [])
-            for msg in messages:
-                try:
-                    body = json.loads(msg['Body'])
-                    bucket = body['bucket']
-                    key = body['key']
-                    print(f"[>] Received message: bucket={bucket}, key={key}")
-
-                    success = process_image(bucket, key)
-
-                    if success:
-                        sqs.delete_message(
-                            QueueUrl=QUEUE_URL,
-                            ReceiptHandle=msg['ReceiptHandle']
-                        )
-                        print("[✓] Message deleted from queue")
-                    else:
-                        print("[x] Skipping deletion due to failure")
-
-                except json.JSONDecodeError:
-                    print("[!] Failed to parse SQS message body")
-                    traceback.print_exc()
-
-        except Exception as e:
-            print(f"[!] Error polling queue: {str(e)}")
-            traceback.print_exc()
-        time.sleep(1)
+def process_message(msg):
+    try:
+        body = json.loads(msg['Body'])
+    except json.JSONDecodeError:
+        logger.exception("failed to parse SQS message body")
+        return False
+    bucket = body['bucket']
+    key = body['key']
+    logger.info("received message", extra={"bucket": bucket, "key": key})
+
+    # Tesseract language(s) and page segmentation mode can be set per job
+    options = OcrOptions.from_message(body)
+    report_status(CONVERTING)
+    success = process_image(bucket, key, options)
+    if success:
+        report_status(CONVERTED)
+    else:
+        logger.warning("skipping deletion due to failure", extra={"key": key})
+    return success
 
 if __name__ == "__main__":
-    poll_queue()
\ No newline at end of file
+    logger.info("starting image processing worker")
+    SQSWorker(QUEUE_URL, process_message).run()
@@ -0,0 +1,125 @@
+import boto3
+import json
+import os
+import threading
+from typing import List
+import pypdfium2 as pdfium
+from common.document_status import CONVERTED, CONVERTING, report_status
+from common.ocr_engine import OcrEngine, OcrOptions, OCR_PROCESSES, PAGE_SEPARATOR
+from common.telemetry import logger, stage, trace_metadata
+from common.worker import SQSWorker
+
+s3 = boto3.client('s3')
+
+# Set these from env
+QUEUE_URL = os.environ["SQS_QUEUE_URL"]
+OUTPUT_BUCKET = os.environ.get("OUTPUT_BUCKET", "")  # Optional
+# A page whose text layer has fewer non-whitespace characters than this is treated as scanned
+MIN_TEXT_CHARS = int(os.environ.get("PDF_MIN_TEXT_CHARS", "20"))
+OCR_DPI = int(os.environ.get("PDF_OCR_DPI", "300"))
+# Scanned pages are rendered and OCR'd this many at a time, bounding memory for big scans
+OCR_BATCH_PAGES = int(os.environ.get("PDF_OCR_BATCH_PAGES", str(OCR_PROCESSES * 2)))
+
+ocr_engine = OcrEngine()
+# PDFium isn't thread-safe: every call into it (open, read, render, close) is
+# made holding this lock, and pdfium objects are closed explicitly rather than
+# left to the garbage collector on whichever thread. OCR runs outside the lock.
+pdfium_lock = threading.Lock()
+
+def page_text(pdf, index):
+    page = pdf[index]
+    textpage = page.get_textpage()
+    text = textpage.get_text_range()
+    textpage.close()
+    page.close()
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+def render_page(pdf, index):
+    page = pdf[index]
+    bitmap = page.render(scale=OCR_DPI / 72, grayscale=True)
+    # A copy, so the image doesn't share pdfium's buffer once the bitmap is closed
+    image = bitmap.to_pil().copy()
+    bitmap.close()
+    page.close()
+    # Already at the OCR resolution, so preprocessing won't rescale it
+    image.info["dpi"] = (OCR_DPI, OCR_DPI)
+    return image
+
+def extract_pages(data: bytes, options: OcrOptions = None) -> List[str]:
+    """
+    Text of every page, in order. Pages with a usable text layer are read
+    directly; only the rest are rasterized and OCR'd, in parallel.
+    """
+    with pdfium_lock:
+        pdf = pdfium.PdfDocument(data)
+    try:
+        with pdfium_lock:
+            texts = [page_text(pdf, i) for i in range(len(pdf))]
+
+        scanned = [i for i, text in enumerate(texts) if len("".join(text.split())) < MIN_TEXT_CHARS]
+        for start in range(0, len(scanned), OCR_BATCH_PAGES):
+            batch = scanned[start:start + OCR_BATCH_PAGES]
+            with pdfium_lock:
+                images = [render_page(pdf, i) for i in batch]
+            for i, text in zip(batch, ocr_engine.pages_to_text(images, options)):
+                texts[i] = text
+        if scanned:
+            logger.info("OCR'd pages without a text layer", extra={"ocr_pages": len(scanned), "pages": len(texts)})
+        return texts
+    finally:
+        with pdfium_lock:
+            pdf.close()
+
+def process_pdf(bucket, key, options=None):
+    try:
+        with stage("download"):
+            data = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+        with stage("convert", bytes=len(data)):
+            pages = extract_pages(data, options)
+        # Form feeds between pages let the semantic chunker keep real page numbers
+        text = PAGE_SEPARATOR.join(page.strip() for page in pages)
+
+        logger.info("extracted pages", extra={"key": key, "pages": len(pages)})
+
+        # Stays under uploads/, the prefix that notifies the semantic chunker
+        output_key = key + ".txt"
+        with stage("upload"):
+            s3.put_object(
+                Bucket=OUTPUT_BUCKET,
+                Key=output_key,
+                Body=text.encode('utf-8'),
+                Metadata=trace_metadata(),
+            )
+
+        logger.info("saved PDF text", extra={"bucket": OUTPUT_BUCKET, "key": output_key})
+        return True
+
+    except pdfium.PdfiumError as e:
+        logger.error("could not open PDF", extra={"key": key, "error": str(e)})
+    except Exception:
+        logger.exception("error processing PDF", extra={"key": key})
+    return False
+
+def process_message(msg):
+    try:
+        body = json.loads(msg['Body'])
+    except json.JSONDecodeError:
+        logger.exception("failed to parse SQS message body")
+        return False
+    bucket = body['bucket']
+    key = body['key']
+    logger.info("received message", extra={"bucket": bucket, "key": key})
+
+    # Tesseract settings for the scanned pages can be set per job
+    options = OcrOptions.from_message(body)
+    report_status(CONVERTING)
+    success = process_pdf(bucket, key, options)
+    if success:
+        report_status(CONVERTED)
+    else:
+        logger.warning("skipping deletion due to failure", extra={"key": key})
+    return success
+
+if __name__ == "__main__":
+    logger.info("starting PDF processing worker")
+    SQSWorker(QUEUE_URL, process_message).run()
@@ -0,0 +1,60 @@
+import math
+import numpy as np
+from typing import Collection, List, Sequence, Tuple
+
+# Same defaults chunk_text_semantic has always used
+DEFAULT_MAX_CHUNK_SIZE = 500
+DEFAULT_SIMILARITY_THRESHOLD = 0.6
+
+EPS = 1e-12
+
+def find_chunk_boundaries(
+    embeddings: np.ndarray,
+    lengths: Sequence[int],
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    hard_breaks: Collection[int] = (),
+) -> List[Tuple[int, int]]:
+    """
+    Split paragraphs into chunks, returning half-open (start, end) paragraph spans.
+
+    A paragraph joins the current chunk while the chunk is shorter than
+    max_chunk_size characters and the cosine similarity between the chunk
+    centroid and the paragraph is above similarity_threshold. The cosine of the
+    mean equals the cosine of the sum, so the centroid is kept as a running sum
+    with its squared norm updated incrementally: one dot product per paragraph.
+    Paragraphs in hard_breaks (e.g. section headings) always start a new chunk,
+    without a similarity being computed.
+    """
+    vectors = np.asarray(embeddings, dtype=np.float64)
+    n = len(vectors)
+    if n == 0:
+        return []
+
+    norms = np.linalg.norm(vectors, axis=1)
+    unit = vectors / np.maximum(norms, EPS)[:, None]
+
+    spans = []
+    start = 0
+    chunk_len = lengths[0]
+    centroid_sum = vectors[0].copy()
+    sum_sq = float(norms[0]) ** 2
+    for i in range(1, n):
+        extend = False
+        if chunk_len < max_chunk_size and i not in hard_breaks:
+            dot = float(centroid_sum @ unit[i])
+            sim = dot / max(math.sqrt(max(sum_sq, 0.0)), EPS)
+            extend = sim > similarity_threshold
+        if extend:
+            norm_i = float(norms[i])
+            sum_sq += 2.0 * dot * norm_i + norm_i * norm_i
+            centroid_sum += vectors[i]
+            chunk_len += 1 + lengths[i]  # joined with '\n'
+        else:
+            spans.append((start, i))
+            start = i
+            chunk_len = lengths[i]
+            centroid_sum[:] = vectors[i]
+            sum_sq = float(norms[i]) ** 2
+    spans.append((start, n))
+    return spans
@@ -0,0 +1,129 @@
+import io
+from typing import BinaryIO, Iterator, List, NamedTuple, Tuple, Union
+
+from lxml import etree
+
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+# Block elements and the kind of block their text becomes
+BLOCK_KINDS = {
+    **{tag: "heading" for tag in HEADINGS},
+    "p": "paragraph", "pre": "paragraph", "dt": "paragraph", "dd": "paragraph",
+    "caption": "paragraph", "figcaption": "paragraph", "blockquote": "paragraph",
+    "li": "list_item",
+    "tr": "table_row",
+    # Containers: only text directly inside them (not in a nested block) becomes a paragraph
+    "body": "paragraph", "div": "paragraph", "section": "paragraph", "article": "paragraph",
+    "main": "paragraph", "header": "paragraph", "footer": "paragraph", "aside": "paragraph",
+    "figure": "paragraph", "table": "paragraph", "ul": "paragraph", "ol": "paragraph", "dl": "paragraph",
+}
+# Read whole: anything nested inside them is part of their text
+ATOMIC = {"tr", "pre", *HEADINGS}
+SKIPPED = {"head", "script", "style", "noscript", "template"}
+CELLS = {"td", "th"}
+CELL_SEPARATOR = " | "
+
+
+class Block(NamedTuple):
+    kind: str  # heading, paragraph, list_item or table_row
+    text: str
+    section: Tuple[str, ...]  # titles of the enclosing headings, outermost first (a heading includes itself)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _kind(elem, enclosing: List) -> str:
+    kind = BLOCK_KINDS[elem.tag]
+    # Paragraphs of a list item (pandoc's "loose" lists) are list items too
+    if kind == "paragraph" and enclosing and enclosing[-1].tag == "li":
+        return "list_item"
+    return kind
+
+
+def _row_text(row) -> str:
+    cells = [_normalize("".join(cell.itertext())) for cell in row if cell.tag in CELLS]
+    return CELL_SEPARATOR.join(cell for cell in cells if cell)
+
+
+def _take_leading_text(parent, child) -> str:
+    # parent's text up to child, removed from the tree so it isn't emitted twice
+    parts = [parent.text or ""]
+    parent.text = None
+    for sibling in list(parent):
+        if sibling is child:
+            break
+        parts.extend(sibling.itertext())
+        parts.append(sibling.tail or "")
+        parent.remove(sibling)
+    return _normalize("".join(parts))
+
+
+def iter_html_blocks(source: Union[bytes, str, BinaryIO], encoding: str = "utf-8") -> Iterator[Block]:
+    """
+    Stream an HTML document (pandoc output, or any HTML) as typed blocks in
+    reading order. The parser is fed incrementally from a file-like source
+    (e.g. an S3 body), and every block is freed once it has been emitted, so
+    memory stays flat however large the document is.
+    """
+    if isinstance(source, str):
+        source = source.encode(encoding)
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    open_blocks: List = []  # block elements we're inside, outermost first
+    atomic_depth = 0
+    skipped_depth = 0
+    sections: List[Tuple[int, str]] = []
+
+    def path() -> Tuple[str, ...]:
+        return tuple(title for _, title in sections)
+
+    for event, elem in etree.iterparse(
+        source, events=("start", "end"), html=True, recover=True,
+        encoding=encoding, remove_comments=True, remove_pis=True,
+    ):
+        tag = elem.tag if isinstance(elem.tag, str) else ""
+        if event == "start":
+            if tag in SKIPPED:
+                skipped_depth += 1
+            elif tag in BLOCK_KINDS and not atomic_depth and not skipped_depth:
+                if open_blocks:
+                    # Text of the enclosing block that comes before this one goes out first
+                    parent = open_blocks[-1]
+                    text = _take_leading_text(parent, elem) if elem.getparent() is parent else ""
+                    if text:
+                        yield Block(_kind(parent, open_blocks[:-1]), text, path())
+                open_blocks.append(elem)
+                if tag in ATOMIC:
+                    atomic_depth += 1
+            continue
+
+        if tag in SKIPPED:
+            skipped_depth -= 1
+            elem.clear(keep_tail=True)
+            continue
+        if not open_blocks or open_blocks[-1] is not elem:
+            continue
+        open_blocks.pop()
+        if tag in ATOMIC:
+            atomic_depth -= 1
+
+        text = _row_text(elem) if tag == "tr" else _normalize("".join(elem.itertext()))
+        if text:
+            if tag in HEADINGS:
+                level = HEADINGS[tag]
+                while sections and sections[-1][0] >= level:
+                    sections.pop()
+                sections.append((level, text))
+            yield Block(_kind(elem, open_blocks), text, path())
+        # Emitted: drop its content (the tail belongs to the enclosing block),
+        # and the element itself unless a tail still has to be read from it
+        elem.clear(keep_tail=True)
+        parent = elem.getparent()
+        if parent is not None and not (elem.tail or "").strip():
+            parent.remove(elem)
+
+
+def html_to_text(source: Union[bytes, str, BinaryIO]) -> str:
+    return "\n".join(block.text for block in iter_html_blocks(source))
@@ -2,94 +2,228 @@ import os
 import boto3
 import json
 import uuid
-import spacy
-from sentence_transformers import SentenceTransformer, util
+import io
+import tempfile
+import threading
 import numpy as np
-from typing import List, Dict
-from bs4 import BeautifulSoup
+from typing import TYPE_CHECKING, List, Dict, Optional, Set, Tuple
+from common.chunk_format import CONTENT_TYPE, FILE_SUFFIX, ChunkWriter
+from common.document_status import CHUNKED, CHUNKING, report_status
+from common.embedding_backend import load_backend
+from common.embedding_cache import CachedEncoder
+from common.telemetry import (
+    DOCUMENT_ID_KEY, USER_ID_KEY, document_from_metadata, logger,
+    set_document, set_trace_id, stage, trace_id_from_metadata, trace_metadata,
+)
+from common.worker import SQSWorker
+from chunk_boundaries import find_chunk_boundaries, DEFAULT_MAX_CHUNK_SIZE, DEFAULT_SIMILARITY_THRESHOLD
+from html_blocks import Block, html_to_text, iter_html_blocks
 
-# --- Load models once ---
-nlp = spacy.load('en_core_web_sm')
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
+if TYPE_CHECKING:
+    from spacy.tokens import Doc
+
+# --- Models (loaded on first use, once per process) ---
+# Only the tagger/lemmatizer (tags) and parser (sentences) are used for chunk
+# metadata, so NER is never loaded.
+UNUSED_PIPES = ['ner']
+_nlp = None
+_nlp_lock = threading.Lock()
+# Repeated paragraphs (boilerplate, headers, disclaimers) are served from the embedding cache.
+# The backend (EMBEDDING_BACKEND=torch|onnx) loads its model on the first encode.
+backend = load_backend()
+embedder = CachedEncoder(backend, backend.cache_name)
+
+def get_nlp():
+    global _nlp
+    with _nlp_lock:
+        if _nlp is None:
+            import spacy
+            _nlp = spacy.load('en_core_web_sm', exclude=UNUSED_PIPES)
+    return _nlp
+
+def load_models():
+    # Pay the model loading up front (e.g. before timing anything) instead of on the first message
+    get_nlp()
+    backend.load()
 
 # --- AWS Clients ---
-sqs = boto3.client('sqs')
 s3 = boto3.client('s3')
 
 # --- Config ---
 SQS_QUEUE_URL = os.environ["SQS_QUEUE_URL"]
+NLP_BATCH_SIZE = int(os.environ.get("NLP_BATCH_SIZE", "64"))
+NLP_N_PROCESS = int(os.environ.get("NLP_N_PROCESS", "1"))
+MAX_CHUNK_SIZE = int(os.environ.get("MAX_CHUNK_SIZE", DEFAULT_MAX_CHUNK_SIZE))
+SIMILARITY_THRESHOLD = float(os.environ.get("SIMILARITY_THRESHOLD", DEFAULT_SIMILARITY_THRESHOLD))
+# 'ndjson': gzip NDJSON with the embeddings inline (common/chunk_format.py);
+# 'json': the old JSON array plus an .embeddings.npy sidecar
+CHUNK_FORMAT = os.environ.get("CHUNK_FORMAT", "ndjson")
+EMBEDDINGS_SIDECAR_SUFFIX = ".embeddings.npy"
+# Chunk files are built in memory up to this size, then in a temp file
+CHUNK_FILE_SPOOL_BYTES = 8 * 1024 * 1024
+# Chunk ids are uuid5(namespace, "<document>/<ordinal>"): chunking a document again
+# (e.g. a message the router re-sent on retry) overwrites its chunks rather than adding copies
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2b8e-4d0a-5e7b-9c3f-2a1d8e6b4f70")
 
 # --- Semantic Chunking Functions ---
 
-def extract_tags(text: str, top_n: int = 3) -> List[str]:
-    doc = nlp(text)
+def tags_from_doc(doc: 'Doc', top_n: int = 3) -> List[str]:
     tags = [token.lemma_ for token in doc if token.pos_ == 'NOUN']
     return list(dict.fromkeys(tags))[:top_n]
 
-def generate_title(text: str) -> str:
-    doc = nlp(text)
+def title_from_doc(doc: 'Doc') -> str:
     if doc.sents:
         first_sent = next(doc.sents).text.strip()
         return first_sent[:80]
-    return ' '.join(text.split()[:8])
+    return ' '.join(doc.text.split()[:8])
 
-def generate_description(text: str) -> str:
-    doc = nlp(text)
+def description_from_doc(doc: 'Doc') -> str:
     sents = list(doc.sents)
     return ' '.join([s.text.strip() for s in sents[:2]])
 
-def chunk_text_semantic(text: str, max_chunk_size: int = 500) -> List[Dict]:
-    paragraphs = [p.strip() for p in text.split('\n') if p.strip()]
-    if not paragraphs:
-        paragraphs = [text]
-    embeddings = embedder.encode(paragraphs)
+def extract_tags(text: str, top_n: int = 3) -> List[str]:
+    return tags_from_doc(get_nlp()(text), top_n)
+
+def generate_title(text: str) -> str:
+    return title_from_doc(get_nlp()(text))
+
+def generate_description(text: str) -> str:
+    return description_from_doc(get_nlp()(text))
+
+def annotate_chunks(texts: List[str], batch_size: int = NLP_BATCH_SIZE, n_process: int = NLP_N_PROCESS) -> List[Dict]:
+    # Parse every chunk exactly once and derive title/description/tags from the same Doc
+    metadata = []
+    for doc in get_nlp().pipe(texts, batch_size=batch_size, n_process=n_process):
+        metadata.append({
+            'title': title_from_doc(doc),
+            'description': description_from_doc(doc),
+            'tags': tags_from_doc(doc),
+        })
+    return metadata
+
+def split_paragraphs(text: str) -> Tuple[List[str], Optional[List[int]]]:
+    """
+    Non-empty lines of text. When the text carries form-feed page breaks
+    (PDF and OCR output), also returns the 1-based page of each paragraph.
+    """
+    paragraphs, pages = [], []
+    page = 1
+    for line in text.split('\n'):
+        page += line.count('\f')
+        line = line.strip()
+        if line:
+            paragraphs.append(line)
+            pages.append(page)
+    return paragraphs, (pages if page > 1 else None)
+
+def build_chunks(
+    chunk_texts: List[str],
+    page_numbers: Optional[List[int]] = None,
+    sections: Optional[List[str]] = None,
+) -> List[Dict]:
+    # Without real page numbers, pageIndex is the chunk's position in the document
+    page_numbers = page_numbers or range(1, len(chunk_texts) + 1)
     chunks = []
-    current_chunk = ''
-    current_embeds = []
-    page_index = 1
-    for i, para in enumerate(paragraphs):
-        if not current_chunk:
-            current_chunk = para
-            current_embeds = [embeddings[i]]
-        else:
-            sim = util.cos_sim(np.mean(current_embeds, axis=0), embeddings[i]).item()
-            if len(current_chunk) < max_chunk_size and sim > 0.6:
-                current_chunk += '\n' + para
-                current_embeds.append(embeddings[i])
-            else:
-                chunk_text = current_chunk.strip()
-                chunks.append({
-                    'id': str(uuid.uuid4()),
-                    'title': generate_title(chunk_text),
-                    'description': generate_description(chunk_text),
-                    'tags': extract_tags(chunk_text),
-                    'pageIndex': page_index,
-                    'content': chunk_text,
-                })
-                page_index += 1
-                current_chunk = para
-                current_embeds = [embeddings[i]]
-    if current_chunk:
-        chunk_text = current_chunk.strip()
-        chunks.append({
+    for i, (page_index, chunk_text, meta) in enumerate(zip(page_numbers, chunk_texts, annotate_chunks(chunk_texts))):
+        chunk = {
             'id': str(uuid.uuid4()),
-            'title': generate_title(chunk_text),
-            'description': generate_description(chunk_text),
-            'tags': extract_tags(chunk_text),
+            'title': meta['title'],
+            'description': meta['description'],
+            'tags': meta['tags'],
             'pageIndex': page_index,
             'content': chunk_text,
-        })
+        }
+        if sections:
+            chunk['section'] = sections[i]
+        chunks.append(chunk)
     return chunks
 
-# --- AWS Integration Functions ---
+def chunk_paragraphs_with_embeddings(
+    paragraphs: List[str],
+    pages: Optional[List[int]] = None,
+    hard_breaks: Set[int] = frozenset(),
+    sections: Optional[List[str]] = None,
+    max_chunk_size: int = MAX_CHUNK_SIZE,
+    similarity_threshold: float = SIMILARITY_THRESHOLD,
+) -> Tuple[List[Dict], np.ndarray]:
+    embeddings = embedder.encode(paragraphs, convert_to_numpy=True)
+    spans = find_chunk_boundaries(
+        embeddings,
+        [len(p) for p in paragraphs],
+        max_chunk_size=max_chunk_size,
+        similarity_threshold=similarity_threshold,
+        hard_breaks=hard_breaks,
+    )
+    # An empty document yields a single empty "paragraph", which never starts a chunk
+    spans = [(start, end) for start, end in spans if paragraphs[start]]
+    chunk_texts = ['\n'.join(paragraphs[start:end]).strip() for start, end in spans]
+    # A chunk spanning a page break (or section) is attributed to the one it starts in
+    page_numbers = [pages[start] for start, _ in spans] if pages else None
+    chunk_sections = [sections[start] for start, _ in spans] if sections else None
+    return build_chunks(chunk_texts, page_numbers, chunk_sections), embed_chunk_texts(chunk_texts)
+
+def embed_chunk_texts(chunk_texts: List[str]) -> np.ndarray:
+    """
+    The embeddings stored with the chunks: each chunk's text encoded whole, as
+    the indexer's fallback and search queries encode text. A mean of the
+    paragraph vectors would be nearly free but lands in a different
+    distribution, so rankings would depend on which path indexed a document.
+
+    The cost: this is the same model pass over the chunk text that the indexer
+    used to make, moved here, so per-document inference is back to roughly
+    paragraphs + chunks. Only single-paragraph chunks (identical to their
+    paragraph) are served from the embedding cache. bench_pipeline.py reports
+    the time spent here.
+    """
+    return embedder.encode(chunk_texts, convert_to_numpy=True)
+
+def chunk_text_semantic_with_embeddings(
+    text: str,
+    max_chunk_size: int = MAX_CHUNK_SIZE,
+    similarity_threshold: float = SIMILARITY_THRESHOLD,
+) -> Tuple[List[Dict], np.ndarray]:
+    paragraphs, pages = split_paragraphs(text)
+    if not paragraphs:
+        paragraphs = [text]
+    return chunk_paragraphs_with_embeddings(
+        paragraphs, pages, max_chunk_size=max_chunk_size, similarity_threshold=similarity_threshold,
+    )
 
-def get_sqs_messages(max_messages=5):
-    response = sqs.receive_message(
-        QueueUrl=SQS_QUEUE_URL,
-        MaxNumberOfMessages=max_messages,
-        WaitTimeSeconds=10
+def chunk_blocks_semantic_with_embeddings(
+    blocks: List[Block],
+    max_chunk_size: int = MAX_CHUNK_SIZE,
+    similarity_threshold: float = SIMILARITY_THRESHOLD,
+) -> Tuple[List[Dict], np.ndarray]:
+    # Every heading starts a chunk, except one right after another heading (a title and its first subtitle)
+    hard_breaks = {
+        i for i, block in enumerate(blocks)
+        if block.kind == 'heading' and i and blocks[i - 1].kind != 'heading'
+    }
+    return chunk_paragraphs_with_embeddings(
+        [block.text for block in blocks],
+        hard_breaks=hard_breaks,
+        sections=[' > '.join(block.section) for block in blocks],
+        max_chunk_size=max_chunk_size,
+        similarity_threshold=similarity_threshold,
     )
-    return response.get('Messages', [])
+
+def chunk_text_semantic(
+    text: str,
+    max_chunk_size: int = MAX_CHUNK_SIZE,
+    similarity_threshold: float = SIMILARITY_THRESHOLD,
+) -> List[Dict]:
+    chunks, _ = chunk_text_semantic_with_embeddings(text, max_chunk_size, similarity_threshold)
+    return chunks
+
+def chunk_blocks_semantic(
+    blocks: List[Block],
+    max_chunk_size: int = MAX_CHUNK_SIZE,
+    similarity_threshold: float = SIMILARITY_THRESHOLD,
+) -> List[Dict]:
+    chunks, _ = chunk_blocks_semantic_with_embeddings(blocks, max_chunk_size, similarity_threshold)
+    return chunks
+
+# --- AWS Integration Functions ---
 
 def parse_s3_event(msg_body):
     body = json.loads(msg_body)
@@ -98,65 +232,97 @@ def parse_s3_event(msg_body):
     key = record['s3']['object']['key']
     return bucket, key
 
-def get_file_from_s3(bucket: str, key: str) -> str:
+def open_file_from_s3(bucket: str, key: str):
+    # Returns the (streaming) body, and the trace id and document ids the converter stored with it
     obj = s3.get_object(Bucket=bucket, Key=key)
-    content = obj['Body'].read().decode('utf-8')
-    return content
+    return obj['Body'], trace_id_from_metadata(obj), document_from_metadata(obj)
 
 def extract_text(content: str, content_type: str = 'text/plain') -> str:
     if content_type == 'text/html':
-        soup = BeautifulSoup(content, 'html.parser')
-        return soup.get_text(separator='\n')
+        return html_to_text(content)
     return content
 
-def delete_sqs_message(receipt_handle):
-    sqs.delete_message(QueueUrl=SQS_QUEUE_URL, ReceiptHandle=receipt_handle)
+def chunk_id(document: str, ordinal: int) -> str:
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document}/{ordinal}"))
 
 def extract_doc_id_from_key(key: str) -> str:
     # Example: uploads/documents/mydoc.docx.txt → mydoc
     filename = key.split('/')[-1]
     return filename.split('.')[0]
 
+def store_chunk_embeddings_to_s3(bucket: str, doc_id: str, embeddings: np.ndarray):
+    # Row i is the embedding of chunk i in semantic-chunks/{doc_id}.json
+    output_key = f"semantic-chunks/{doc_id}{EMBEDDINGS_SIDECAR_SUFFIX}"
+    buffer = io.BytesIO()
+    np.save(buffer, embeddings.astype(np.float16))
+    s3.put_object(Bucket=bucket, Key=output_key, Body=buffer.getvalue(), Metadata=trace_metadata())
+    logger.info("stored chunk embeddings", extra={"bucket": bucket, "key": output_key})
+
 def store_chunks_to_s3(bucket: str, doc_id: str, chunks: List[Dict]):
     output_key = f"semantic-chunks/{doc_id}.json"
     body = json.dumps(chunks, indent=2)
-    s3.put_object(Bucket=bucket, Key=output_key, Body=body.encode('utf-8'))
-    print(f"✅ Stored semantic chunks to s3://{bucket}/{output_key}")
+    s3.put_object(Bucket=bucket, Key=output_key, Body=body.encode('utf-8'), Metadata=trace_metadata())
+    logger.info("stored semantic chunks", extra={"bucket": bucket, "key": output_key, "chunks": len(chunks)})
 
-# --- Main Processor ---
+def store_chunk_file_to_s3(bucket: str, doc_id: str, chunks: List[Dict], embeddings: np.ndarray):
+    # One object with the embeddings inline, so there's no sidecar to order before it
+    output_key = f"semantic-chunks/{doc_id}{FILE_SUFFIX}"
+    with tempfile.SpooledTemporaryFile(max_size=CHUNK_FILE_SPOOL_BYTES) as f:
+        with ChunkWriter(f, doc_id, embedding_dim=embeddings.shape[1]) as writer:
+            for chunk, embedding in zip(chunks, embeddings):
+                writer.write(chunk, embedding)
+        size = f.tell()
+        f.seek(0)
+        s3.upload_fileobj(f, bucket, output_key, ExtraArgs={"ContentType": CONTENT_TYPE, "Metadata": trace_metadata()})
+    logger.info("stored semantic chunks", extra={"bucket": bucket, "key": output_key, "chunks": len(chunks), "bytes": size})
 
-def process_sqs_messages():
-    messages = get_sqs_messages()
-    if not messages:
-        print("No messages in queue.")
-        return
+# --- Main Processor ---
 
-    for msg in messages:
-        try:
-            bucket, key = parse_s3_event(msg['Body'])
-            print(f"\n📄 Processing: s3://{bucket}/{key}")
+def process_message(msg):
+    bucket, key = parse_s3_event(msg['Body'])
 
-            content = get_file_from_s3(bucket, key)
-            content_type = 'text/html' if key.endswith('.html') else 'text/plain'
-            cleaned = extract_text(content, content_type)
+    is_html = key.endswith('.html')
+    with stage("download"):
+        body, trace_id, document = open_file_from_s3(bucket, key)
+        # HTML is parsed into blocks as it downloads, so the two are timed together
+        source = list(iter_html_blocks(body)) if is_html else body.read().decode('utf-8')
+    set_trace_id(trace_id)
+    set_document(document)
+    logger.info("processing", extra={"bucket": bucket, "key": key})
+    report_status(CHUNKING)
 
-            chunks = chunk_text_semantic(cleaned)
-            doc_id = extract_doc_id_from_key(key)
+    size = {"blocks": len(source)} if is_html else {"chars": len(source)}
+    with stage("chunk", **size):
+        if is_html:
+            chunks, chunk_embeddings = chunk_blocks_semantic_with_embeddings(source)
+        else:
+            chunks, chunk_embeddings = chunk_text_semantic_with_embeddings(source)
+    # Names the chunk files; chunks are tagged with the gateway's document id when the
+    # upload carried one (files dropped into the bucket directly fall back to this)
+    doc_id = extract_doc_id_from_key(key)
+    document_id = document.get(DOCUMENT_ID_KEY, doc_id)
+    user_id = document.get(USER_ID_KEY)
 
-            # Add documentId to each chunk
-            for chunk in chunks:
-                chunk["documentId"] = doc_id
+    # Seeded by the gateway's id, or by the source key (file names alone can collide, e.g. a.pdf and a.docx)
+    id_seed = document.get(DOCUMENT_ID_KEY) or f"{bucket}/{key}"
+    for ordinal, chunk in enumerate(chunks):
+        chunk["id"] = chunk_id(id_seed, ordinal)
+        chunk["documentId"] = document_id
+        chunk["userId"] = user_id
 
-            # Store chunks to S3
+    with stage("upload"):
+        if CHUNK_FORMAT == "json":
+            # The embeddings sidecar goes first so it is already there when
+            # the chunks object triggers the indexer.
+            store_chunk_embeddings_to_s3(bucket, doc_id, chunk_embeddings)
             store_chunks_to_s3(bucket, doc_id, chunks)
+        else:
+            store_chunk_file_to_s3(bucket, doc_id, chunks, chunk_embeddings)
 
-            delete_sqs_message(msg['ReceiptHandle'])
-            print("✅ Message processed and deleted from SQS.")
-
-        except Exception as e:
-            print(f"❌ Error processing message: {e}")
+    report_status(CHUNKED)
+    logger.info("message processed", extra={"embedding_cache": embedder.cache.stats()})
 
 # --- Entry Point ---
 
 if __name__ == "__main__":
-    process_sqs_messages()
+    SQSWorker(SQS_QUEUE_URL, process_message).run()
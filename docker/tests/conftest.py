@@ -0,0 +1,26 @@
+import importlib.util
+import os
+import sys
+
+DOCKER_DIR = os.path.join(os.path.dirname(__file__), "..")
+# The images ship common/ next to their app code; here it is imported from docker/
+sys.path.insert(0, DOCKER_DIR)
+
+# Read when the worker modules are imported; nothing here talks to AWS
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("METRICS_PORT", "0")
+
+
+def load_app(image: str, name: str):
+    """
+    Import docker/<image>/app/main.py as module `name` (every image has a main.py),
+    with its app directory on the path for its local imports.
+    """
+    app_dir = os.path.join(DOCKER_DIR, image, "app")
+    if app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(app_dir, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    sys.modules[name] = module
+    return module
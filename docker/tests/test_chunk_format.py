@@ -0,0 +1,44 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from common.chunk_format import ChunkReader, ChunkWriter
+
+CHUNKS = [{"id": "c1", "content": "first"}, {"id": "c2", "content": "second"}]
+
+
+def test_round_trip_with_embeddings():
+    f = io.BytesIO()
+    embeddings = np.eye(2, 4, dtype=np.float32)
+    with ChunkWriter(f, "doc", embedding_dim=4) as writer:
+        for chunk, embedding in zip(CHUNKS, embeddings):
+            writer.write(chunk, embedding)
+    reader = ChunkReader(io.BytesIO(f.getvalue()))
+    assert not reader.legacy and reader.document_id == "doc"
+    read = list(reader)
+    assert [chunk for chunk, _ in read] == CHUNKS
+    np.testing.assert_array_equal(np.stack([e for _, e in read]), embeddings.astype(np.float16))
+
+
+def test_truncated_file_is_rejected():
+    f = io.BytesIO()
+    writer = ChunkWriter(f, "doc")
+    writer.write(CHUNKS[0])
+    writer._gzip.close()  # cut short: no end line
+    with pytest.raises(ValueError, match="truncated"):
+        list(ChunkReader(io.BytesIO(f.getvalue())))
+
+
+@pytest.mark.parametrize("prefix", [b"", b"\n  ", b"\xef\xbb\xbf", b"\xef\xbb\xbf\r\n", b" " * 100_000])
+def test_legacy_array(prefix):
+    reader = ChunkReader(io.BytesIO(prefix + json.dumps(CHUNKS, indent=2).encode()))
+    assert reader.legacy
+    assert [chunk for chunk, _ in reader] == CHUNKS
+
+
+@pytest.mark.parametrize("data", [b"", b"42\n", b'"text"\n', b'{"format": "other"}\n'])
+def test_not_a_chunk_file(data):
+    with pytest.raises(ValueError, match="not a chunk file"):
+        ChunkReader(io.BytesIO(data))
@@ -0,0 +1,57 @@
+import contextvars
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from common import document_status
+from common.telemetry import set_document, set_trace_id
+
+
+class StatusHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_PUT(self):
+        self.server.requests.append((self.path, self.headers.get("Authorization"), self.headers.get("X-Trace-Id")))
+        self.send_response(self.server.reply_status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StatusHandler)
+    server.requests = []
+    server.reply_status = 200
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(document_status, "STATUS_API_URL", f"http://127.0.0.1:{server.server_port}/")
+    monkeypatch.setattr(document_status, "STATUS_API_TOKEN", "secret")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def in_document(ids, fn):
+    # Like SQSWorker._handle: every message runs in its own context
+    def run():
+        set_trace_id("t1")
+        set_document(ids)
+        return fn()
+    return contextvars.Context().run(run)
+
+
+def test_reports_status_of_current_document(gateway):
+    assert in_document({"document_id": "d1", "user_id": "u1"}, lambda: document_status.report_status("chunked"))
+    assert gateway.requests == [("/status/d1?status=chunked", "Bearer secret", "t1")]
+
+
+def test_skips_documents_without_gateway_id(gateway):
+    assert not in_document({}, lambda: document_status.report_status("chunked"))
+    assert gateway.requests == []
+
+
+def test_failed_report_does_not_raise(gateway):
+    gateway.reply_status = 401
+    assert not in_document({"document_id": "d1"}, lambda: document_status.report_status("indexed"))
+    assert len(gateway.requests) == 1
@@ -0,0 +1,135 @@
+import base64
+import io
+import json
+import os
+import stat
+
+import pytest
+from botocore.exceptions import ClientError
+
+from conftest import load_app
+
+os.environ.setdefault("SQS_QUEUE_URL", "https://sqs.invalid/queue")
+docx = load_app("docx-to-html-image", "docx_main")
+
+# Stand-ins for pandoc: echo the input, reject it, or hang
+PANDOC_SCRIPTS = {
+    "ok": "#!/bin/sh\ncat\n",
+    "bad": "#!/bin/sh\ncat >/dev/null\necho 'unknown archive' >&2\nexit 64\n",
+    "hang": "#!/bin/sh\nexec sleep 30\n",
+}
+
+
+class Body(io.BytesIO):
+    def iter_chunks(self, size):
+        return iter(lambda: self.read(size), b"")
+
+
+class FakeS3:
+    """
+    Objects by (bucket, key), with their metadata. Sources get an ETag, and a
+    SHA-256 checksum when given one.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = []
+
+    def add(self, bucket, key, data, checksum=None, metadata=None):
+        self.objects[bucket, key] = {"Body": data, "Metadata": metadata or {}, "ChecksumSHA256": checksum}
+
+    def _find(self, bucket, key):
+        if (bucket, key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return self.objects[bucket, key]
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self.calls.append(("head_object", Key))
+        obj = self._find(Bucket, Key)
+        head = {"ETag": '"etag-%d"' % len(obj["Body"]), "Metadata": obj["Metadata"]}
+        if obj["ChecksumSHA256"] and kwargs.get("ChecksumMode") == "ENABLED":
+            head["ChecksumSHA256"] = obj["ChecksumSHA256"]
+        return head
+
+    def get_object(self, Bucket, Key, IfMatch=None):
+        self.calls.append(("get_object", Key))
+        return {"Body": Body(self._find(Bucket, Key)["Body"])}
+
+    def put_object(self, Bucket, Key, Body=b"", Metadata=None, **kwargs):
+        self.calls.append(("put_object", Key))
+        self.add(Bucket, Key, Body, metadata=Metadata)
+
+    def copy_object(self, Bucket, Key, CopySource, Metadata=None, **kwargs):
+        self.calls.append(("copy_object", Key))
+        self.add(Bucket, Key, self._find(CopySource["Bucket"], CopySource["Key"])["Body"], metadata=Metadata)
+
+    def stored(self, bucket="out"):
+        return {key: obj["Body"] for (b, key), obj in self.objects.items() if b == bucket}
+
+
+@pytest.fixture
+def pandoc(tmp_path, monkeypatch):
+    def install(behaviour):
+        path = tmp_path / "pandoc"
+        path.write_text(PANDOC_SCRIPTS[behaviour])
+        path.chmod(path.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    return install
+
+
+def message(key="uploads/a.docx"):
+    return {"Body": json.dumps({"bucket": "in", "key": key})}
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    fake.add("in", "uploads/a.docx", b"PK docx bytes")
+    monkeypatch.setattr(docx, "s3", fake)
+    monkeypatch.setattr(docx, "OUTPUT_BUCKET", "out")
+    return fake
+
+
+def test_converted_document_is_stored(pandoc, s3):
+    pandoc("ok")
+    assert docx.process_message(message()) is True
+    # The stand-in pandoc echoes its input, and the marker points at the output
+    assert s3.stored() == {"uploads/a.html": b"PK docx bytes", "conversions/etag-13": b""}
+    assert s3.objects["out", "conversions/etag-13"]["Metadata"] == {"output-key": "uploads/a.html"}
+
+
+def test_rejected_document_is_dropped(pandoc, s3):
+    pandoc("bad")
+    assert docx.process_message(message()) is True
+    assert s3.stored() == {}
+
+
+def test_timeout_is_redelivered(pandoc, s3, monkeypatch):
+    pandoc("hang")
+    monkeypatch.setattr(docx, "PANDOC_TIMEOUT_SECONDS", 0.2)
+    assert docx.process_message(message()) is False
+    assert s3.stored() == {}
+
+
+def test_reuse_skips_download_and_pandoc(pandoc, s3):
+    pandoc("bad")  # would fail if it ran
+    s3.add("out", "conversions/etag-13", b"", metadata={"output-key": "uploads/old.html"})
+    s3.add("out", "uploads/old.html", b"<p>old</p>")
+    assert docx.process_message(message()) is True
+    assert s3.stored()["uploads/a.html"] == b"<p>old</p>"
+    assert ("get_object", "uploads/a.docx") not in s3.calls
+
+
+def test_content_id_prefers_sha256_checksum():
+    digest = base64.b64encode(bytes(range(32))).decode()
+    assert docx.content_id({"ETag": '"abc-2"', "ChecksumSHA256": digest}) == "sha256-" + bytes(range(32)).hex()
+    assert docx.content_id({"ETag": '"abc-2"', "ChecksumSHA256": digest + "-2"}).endswith("-2")
+    assert docx.content_id({"ETag": '"abc-2"'}) == "abc-2"
+
+
+def test_reuse_checks_output_still_exists(s3):
+    s3.add("out", "conversions/abc", b"", metadata={"output-key": "uploads/a.html"})
+    # Marker says this content went to uploads/a.html, but that object is gone
+    assert docx.reuse_previous_conversion("abc", "uploads/a.html") is False
+    s3.add("out", "uploads/a.html", b"<p>a</p>")
+    assert docx.reuse_previous_conversion("abc", "uploads/a.html") is True
@@ -0,0 +1,60 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "semantic-chunking-image", "app"))
+from html_blocks import Block, html_to_text, iter_html_blocks  # noqa: E402
+
+
+def blocks(html):
+    return [(block.kind, block.text) for block in iter_html_blocks(html)]
+
+
+def test_block_kinds():
+    html = """<h1>Guide</h1><p>Intro <b>bold</b> text.</p><ul><li>tight <a>link</a></li></ul>
+        <table><caption>Rates</caption><tr><th>Term</th><th>Rate</th></tr><tr><td>12m</td><td></td><td>5%</td></tr></table>
+        <pre>code  here</pre>"""
+    assert blocks(html) == [
+        ("heading", "Guide"),
+        ("paragraph", "Intro bold text."),
+        ("list_item", "tight link"),
+        ("paragraph", "Rates"),
+        ("table_row", "Term | Rate"),
+        ("table_row", "12m | 5%"),  # empty cells are dropped
+        ("paragraph", "code here"),
+    ]
+
+
+def test_section_paths():
+    html = "<h1>Guide</h1><p>a</p><h2>Fees</h2><p>b</p><h3>Detail</h3><p>c</p><h2>Terms</h2><p>d</p>"
+    sections = {block.text: block.section for block in iter_html_blocks(html)}
+    assert sections["a"] == ("Guide",)
+    assert sections["Fees"] == sections["b"] == ("Guide", "Fees")
+    assert sections["c"] == ("Guide", "Fees", "Detail")
+    # A heading closes the sections at its level and below
+    assert sections["Terms"] == sections["d"] == ("Guide", "Terms")
+
+
+def test_container_text_around_nested_blocks():
+    # The div's own text before, and the tail after, the nested paragraph are separate blocks
+    html = "<div>Before <p>inner</p> after <em>tail</em></div>"
+    assert blocks(html) == [("paragraph", "Before"), ("paragraph", "inner"), ("paragraph", "after tail")]
+
+
+def test_loose_list_paragraphs_are_list_items():
+    html = "<ul><li><p>loose one</p><p>loose two</p></li><li>tight</li></ul>"
+    assert blocks(html) == [("list_item", "loose one"), ("list_item", "loose two"), ("list_item", "tight")]
+
+
+def test_skipped_tags():
+    html = """<html><head><title>Title</title><style>p {}</style></head>
+        <body><script>ignored()</script><p>x<script>bad()</script>y</p><noscript>no</noscript></body></html>"""
+    assert blocks(html) == [("paragraph", "xy")]
+
+
+def test_streams_from_file_objects():
+    html = "<h1>Title</h1>" + "".join(f"<p>paragraph {i}</p>" for i in range(1000))
+    streamed = list(iter_html_blocks(io.BytesIO(html.encode())))
+    assert len(streamed) == 1001
+    assert streamed[-1] == Block("paragraph", "paragraph 999", ("Title",))
+    assert html_to_text(html).split("\n")[:2] == ["Title", "paragraph 0"]
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+from opensearchpy import OpenSearch
+
+from conftest import load_app
+
+os.environ.setdefault("SQS_QUEUE_URL", "https://sqs.invalid/queue")
+os.environ.setdefault("OS_USER", "test")
+os.environ.setdefault("OS_PASS", "test")
+indexer = load_app("vector-embedding-image", "indexer_main")
+
+
+class FakeOpenSearch(ThreadingHTTPServer):
+    """
+    Just enough of the OpenSearch REST API for the indexer: _bulk and index
+    settings. Records every request; ids in reject_once get one 429 before
+    being accepted, ids in fail always get a 400.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeOpenSearchHandler)
+        self.bulk_requests = []
+        self.settings = {}
+        self.settings_updates = []
+        self.reject_once = set()
+        self.fail = set()
+
+
+class FakeOpenSearchHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        index = self.path.split("/")[1]
+        self._reply(200, {index: {"settings": {"index": dict(self.server.settings)}}})
+
+    def do_PUT(self):
+        update = json.loads(self._body())["index"]
+        self.server.settings_updates.append(update)
+        self.server.settings.update(update)
+        self._reply(200, {"acknowledged": True})
+
+    def do_POST(self):
+        lines = [json.loads(line) for line in self._body().splitlines() if line.strip()]
+        ids = [action["index"]["_id"] for action in lines[::2]]
+        self.server.bulk_requests.append(ids)
+        items = []
+        for _id in ids:
+            if _id in self.server.fail:
+                status = 400
+            elif _id in self.server.reject_once:
+                self.server.reject_once.discard(_id)
+                status = 429
+            else:
+                status = 201
+            item = {"_index": indexer.INDEX_NAME, "_id": _id, "status": status}
+            if status >= 300:
+                item["error"] = {"type": "rejected" if status == 429 else "mapper_parsing_exception"}
+            items.append({"index": item})
+        self._reply(200, {"took": 1, "errors": any(i["index"]["status"] >= 300 for i in items), "items": items})
+
+
+@pytest.fixture
+def fake_opensearch(monkeypatch):
+    server = FakeOpenSearch()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(indexer, "opensearch", OpenSearch(hosts=[{"host": "127.0.0.1", "port": server.server_port}]))
+    monkeypatch.setattr(indexer, "local_store", None)
+    monkeypatch.setattr(indexer, "BULK_INITIAL_BACKOFF", 0)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_chunks(n):
+    chunks = [{"id": f"c{i}", "content": f"chunk {i}", "documentId": "d1", "userId": "u1"} for i in range(n)]
+    embeddings = np.ones((n, indexer.EMBEDDING_DIM), dtype=np.float32) / np.sqrt(indexer.EMBEDDING_DIM)
+    return chunks, embeddings
+
+
+def test_index_chunks_batches_by_document_count(fake_opensearch, monkeypatch):
+    monkeypatch.setattr(indexer, "BULK_CHUNK_SIZE", 4)
+    indexed, errors = indexer.index_chunks(*make_chunks(10))
+    assert (indexed, errors) == (10, [])
+    assert [len(ids) for ids in fake_opensearch.bulk_requests] == [4, 4, 2]
+
+
+def test_index_chunks_batches_by_bytes(fake_opensearch, monkeypatch):
+    monkeypatch.setattr(indexer, "BULK_MAX_CHUNK_BYTES", 20_000)
+    indexed, _ = indexer.index_chunks(*make_chunks(10))
+    assert indexed == 10
+    assert len(fake_opensearch.bulk_requests) > 1
+
+
+def test_index_chunks_retries_rejected_items(fake_opensearch):
+    fake_opensearch.reject_once = {"c1", "c3"}
+    indexed, errors = indexer.index_chunks(*make_chunks(5))
+    assert (indexed, errors) == (5, [])
+    assert fake_opensearch.bulk_requests[1] == ["c1", "c3"]
+
+
+def test_index_chunks_reports_item_errors(fake_opensearch):
+    fake_opensearch.fail = {"c2"}
+    indexed, errors = indexer.index_chunks(*make_chunks(5))
+    assert indexed == 4
+    assert [error["index"]["_id"] for error in errors] == ["c2"]
+
+
+def test_relaxed_refresh_restores_configured_interval(fake_opensearch):
+    # Another backfill replica already turned refresh off: -1 must not be "restored"
+    fake_opensearch.settings["refresh_interval"] = "-1"
+    with indexer.relaxed_refresh(restore="5s"):
+        assert fake_opensearch.settings["refresh_interval"] == "-1"
+    assert fake_opensearch.settings["refresh_interval"] == "5s"
+
+
+def test_relaxed_refresh_restores_on_error(fake_opensearch):
+    with pytest.raises(RuntimeError):
+        with indexer.relaxed_refresh(restore="1s"):
+            raise RuntimeError("backfill failed")
+    assert fake_opensearch.settings_updates == [{"refresh_interval": "-1"}, {"refresh_interval": "1s"}]
+
+
+def test_ensure_refresh_enabled_repairs_interrupted_backfill(fake_opensearch):
+    fake_opensearch.settings["refresh_interval"] = "-1"
+    indexer.ensure_refresh_enabled(restore="1s")
+    assert fake_opensearch.settings["refresh_interval"] == "1s"
+
+    fake_opensearch.settings_updates.clear()
+    fake_opensearch.settings["refresh_interval"] = "30s"
+    indexer.ensure_refresh_enabled(restore="1s")
+    assert fake_opensearch.settings_updates == []
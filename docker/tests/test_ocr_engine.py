@@ -0,0 +1,36 @@
+from PIL import Image
+
+from common import ocr_engine
+from common.ocr_engine import OcrOptions, preprocess
+
+
+def scan(size, dpi=None):
+    image = Image.new("L", size, 255)
+    if dpi:
+        image.info["dpi"] = (dpi, dpi)
+    return image
+
+
+def test_placeholder_dpi_is_not_rescaled():
+    # 72 DPI is what most cameras and screenshot tools write, whatever the content
+    assert preprocess(scan((1200, 1600), dpi=72), OcrOptions()).size == (1200, 1600)
+    assert preprocess(scan((1200, 1600)), OcrOptions()).size == (1200, 1600)
+
+
+def test_scan_dpi_is_rescaled_to_target():
+    assert preprocess(scan((850, 1100), dpi=150), OcrOptions()).size == (1700, 2200)
+    assert preprocess(scan((3400, 4400), dpi=600), OcrOptions()).size == (1700, 2200)
+
+
+def test_options_from_message(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "installed_languages", lambda: frozenset({"eng", "vie", "osd"}))
+    options = OcrOptions.from_message({"lang": "eng+vie", "psm": "6"})
+    assert (options.lang, options.psm) == ("eng+vie", 6)
+
+
+def test_invalid_options_fall_back_to_defaults(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "installed_languages", lambda: frozenset({"eng"}))
+    defaults = OcrOptions()
+    for body in ({"psm": "auto"}, {"psm": 42}, {"psm": None}, {"lang": "klingon"}, {"lang": ["eng"]}, {}):
+        options = OcrOptions.from_message(body)
+        assert (options.lang, options.psm) == (defaults.lang, defaults.psm), body
@@ -0,0 +1,102 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import load_app
+
+os.environ.setdefault("SQS_QUEUE_URL", "https://sqs.invalid/queue")
+pdf_worker = load_app("pdf-to-text-image", "pdf_main")
+
+TEXT_LAYER = "Loan agreement between the bank and the borrower"
+
+
+def make_pdf(pages):
+    # One Helvetica text line per page; None makes a page without a text layer (a scan)
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for line in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({line}) Tj ET" if line is not None else ""
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 144 144] /Contents {len(objects)} 0 R "
+            f"/Resources << /Font << /F1 3 0 R >> >> >>"
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF".encode()
+    return out
+
+
+class FakeOcr:
+    def __init__(self):
+        self.images = []
+
+    def pages_to_text(self, images, options=None):
+        self.images.extend(images)
+        return [f"ocr text {len(self.images) - len(images) + i + 1}" for i in range(len(images))]
+
+
+class FakeS3:
+    def __init__(self, data):
+        self.data = data
+        self.puts = []
+
+    def get_object(self, Bucket, Key):
+        return {"Body": SimpleNamespace(read=lambda: self.data)}
+
+    def put_object(self, **kwargs):
+        self.puts.append(kwargs)
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    engine = FakeOcr()
+    monkeypatch.setattr(pdf_worker, "ocr_engine", engine)
+    monkeypatch.setattr(pdf_worker, "MIN_TEXT_CHARS", 20)
+    return engine
+
+
+def test_text_layer_pages_skip_ocr(ocr):
+    # 20 non-whitespace characters is enough; 19 is treated as a scan
+    pages = [TEXT_LAYER, "a" * 10 + " " + "b" * 10, "a" * 19, None]
+    texts = pdf_worker.extract_pages(make_pdf(pages))
+    assert texts[0].strip() == TEXT_LAYER
+    assert texts[1].strip() == "a" * 10 + " " + "b" * 10
+    assert texts[2:] == ["ocr text 1", "ocr text 2"]
+    # Scanned pages are rendered at the OCR resolution (a 2-inch page)
+    assert [image.size for image in ocr.images] == [(2 * pdf_worker.OCR_DPI,) * 2] * 2
+    assert ocr.images[0].info["dpi"] == (pdf_worker.OCR_DPI,) * 2
+
+
+def test_ocr_runs_in_batches(ocr, monkeypatch):
+    monkeypatch.setattr(pdf_worker, "OCR_BATCH_PAGES", 2)
+    texts = pdf_worker.extract_pages(make_pdf([None] * 5))
+    assert texts == [f"ocr text {i}" for i in range(1, 6)]
+
+
+def test_pages_joined_with_form_feeds_under_uploads(ocr, monkeypatch):
+    s3 = FakeS3(make_pdf([TEXT_LAYER, None, TEXT_LAYER]))
+    monkeypatch.setattr(pdf_worker, "s3", s3)
+    monkeypatch.setattr(pdf_worker, "OUTPUT_BUCKET", "out")
+    assert pdf_worker.process_message({"Body": json.dumps({"bucket": "in", "key": "uploads/u1/report.pdf"})})
+
+    (put,) = s3.puts
+    # Stays under uploads/ so the chunker is notified
+    assert (put["Bucket"], put["Key"]) == ("out", "uploads/u1/report.pdf.txt")
+    # The chunker counts form feeds to number pages
+    assert put["Body"].decode() == "\n\f\n".join([TEXT_LAYER, "ocr text 1", TEXT_LAYER])
+
+
+def test_unreadable_pdf_is_not_acknowledged(ocr, monkeypatch):
+    monkeypatch.setattr(pdf_worker, "s3", FakeS3(b"not a pdf"))
+    assert pdf_worker.process_message({"Body": json.dumps({"bucket": "in", "key": "uploads/x.pdf"})}) is False
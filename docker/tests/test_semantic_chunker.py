@@ -0,0 +1,105 @@
+import io
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from conftest import load_app
+
+os.environ.setdefault("SQS_QUEUE_URL", "https://sqs.invalid/queue")
+chunker = load_app("semantic-chunking-image", "chunker_main")
+from common.chunk_format import ChunkReader  # noqa: E402
+from html_blocks import Block  # noqa: E402
+
+
+class SameVectorEncoder:
+    # Every text is equally similar, so only hard breaks (and size) split chunks
+    cache = SimpleNamespace(stats=dict)
+
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+@pytest.fixture(autouse=True)
+def no_models(monkeypatch):
+    monkeypatch.setattr(chunker, "embedder", SameVectorEncoder())
+    monkeypatch.setattr(chunker, "annotate_chunks",
+                        lambda texts: [{"title": "", "description": "", "tags": []} for _ in texts])
+
+
+def heading(text, *section):
+    return Block("heading", text, section)
+
+
+def paragraph(text, *section):
+    return Block("paragraph", text, section)
+
+
+def test_headings_start_chunks():
+    blocks = [
+        heading("Guide", "Guide"),
+        heading("Fees", "Guide", "Fees"),  # right after a heading: stays with it
+        paragraph("fee one", "Guide", "Fees"),
+        paragraph("fee two", "Guide", "Fees"),
+        heading("Terms", "Guide", "Terms"),
+        paragraph("term one", "Guide", "Terms"),
+    ]
+    chunks, embeddings = chunker.chunk_blocks_semantic_with_embeddings(blocks, max_chunk_size=10_000)
+    assert [chunk["content"] for chunk in chunks] == ["Guide\nFees\nfee one\nfee two", "Terms\nterm one"]
+    # A chunk is attributed to the section it starts in
+    assert [chunk["section"] for chunk in chunks] == ["Guide", "Guide > Terms"]
+    assert embeddings.shape == (2, 4)
+
+
+def test_heading_after_heading_is_not_a_break():
+    blocks = [heading("Title", "Title"), paragraph("body", "Title"), heading("Next", "Next"), heading("Sub", "Next", "Sub")]
+    chunks, _ = chunker.chunk_blocks_semantic_with_embeddings(blocks, max_chunk_size=10_000)
+    assert [chunk["content"] for chunk in chunks] == ["Title\nbody", "Next\nSub"]
+
+
+def test_size_still_splits_within_a_section():
+    blocks = [heading("Guide", "Guide")] + [paragraph("x" * 30, "Guide") for _ in range(4)]
+    chunks, _ = chunker.chunk_blocks_semantic_with_embeddings(blocks, max_chunk_size=50)
+    assert len(chunks) > 1
+    assert all(chunk["section"] == "Guide" for chunk in chunks)
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = objects
+        self.uploads = {}
+
+    def get_object(self, Bucket, Key):
+        data, metadata = self.objects[Key]
+        return {"Body": io.BytesIO(data), "Metadata": metadata}
+
+    def upload_fileobj(self, f, Bucket, Key, ExtraArgs=None):
+        self.uploads[Key] = f.read()
+
+
+def chunk_ids(s3, key):
+    event = {"Records": [{"s3": {"bucket": {"name": "in"}, "object": {"key": key}}}]}
+    chunker.process_message({"Body": json.dumps(event)})
+    (data,) = s3.uploads.values()
+    s3.uploads.clear()
+    return [chunk["id"] for chunk, _ in ChunkReader(io.BytesIO(data))]
+
+
+def test_chunking_again_gives_the_same_chunk_ids(monkeypatch):
+    text = "\n".join(f"paragraph {i} " + "x" * 40 for i in range(30)).encode()
+    s3 = FakeS3({
+        "uploads/a.pdf.txt": (text, {"document-id": "d1"}),
+        "uploads/b.pdf.txt": (text, {"document-id": "d2"}),
+        "uploads/a.docx.html": (b"<p>" + text + b"</p>", {}),
+    })
+    monkeypatch.setattr(chunker, "s3", s3)
+    first = chunk_ids(s3, "uploads/a.pdf.txt")
+    assert len(first) > 1 and len(set(first)) == len(first)
+    # A redelivered or re-sent message overwrites the same chunks
+    assert chunk_ids(s3, "uploads/a.pdf.txt") == first
+    # Another document with the same text gets its own
+    assert not set(chunk_ids(s3, "uploads/b.pdf.txt")) & set(first)
+    # Without a gateway id the source key seeds the ids, not the file name (a.pdf and a.docx share "a")
+    assert not set(chunk_ids(s3, "uploads/a.docx.html")) & set(first)
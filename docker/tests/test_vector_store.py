@@ -0,0 +1,106 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "vector-embedding-image", "app"))
+from vector_store import FaissVectorStore  # noqa: E402
+
+DIM = 8
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).astype(np.float32)
+
+
+def chunks(n, per_document=4, prefix="c"):
+    return [{"id": f"{prefix}{i}", "documentId": f"d{i // per_document}", "content": str(i)} for i in range(n)]
+
+
+def ids(hits):
+    return [chunk["id"] for _, chunk in hits]
+
+
+def test_add_replaces_by_chunk_id(tmp_path):
+    store = FaissVectorStore(str(tmp_path), dim=DIM)
+    v = vectors(3)
+    store.add(chunks(2), v[:2])
+    store.add([{"id": "c0", "documentId": "d0", "content": "new"}], v[2:])
+    assert len(store) == 2
+    score, chunk = store.search(v[2], k=1)[0]
+    assert chunk == {"id": "c0", "documentId": "d0", "content": "new"}
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_flat_index_switches_to_ann(tmp_path):
+    for index_type in ("hnsw", "ivf"):
+        store = FaissVectorStore(str(tmp_path / index_type), dim=DIM, index_type=index_type, exact_max=6)
+        v = vectors(10)
+        store.add(chunks(5), v[:5])
+        assert store._kind() == "flat"
+        store.add(chunks(5, prefix="e"), v[5:])
+        assert store._kind() == index_type
+        assert store.index.ntotal == 10
+        assert ids(store.search(v[7], k=1)) == ["e2"]
+
+
+def test_hnsw_delete_tombstones_then_rebuilds(tmp_path):
+    store = FaissVectorStore(str(tmp_path), dim=DIM, index_type="hnsw", exact_max=0)
+    v = vectors(20)
+    store.add(chunks(20, per_document=2), v)
+    assert store._kind() == "hnsw"
+
+    # 2 of 20 deleted: under the rebuild ratio, so only tombstoned
+    assert store.delete_document("d0") == 2
+    assert store.index.ntotal == 20 and len(store) == 18
+    assert not {"c0", "c1"} & set(ids(store.search(v[0], k=20)))
+
+    # Now 6 of 20: rebuilt without the deleted vectors
+    store.delete_document("d1")
+    store.delete_document("d2")
+    assert store.index.ntotal == len(store) == 14
+    assert ids(store.search(v[10], k=1)) == ["c10"]
+
+
+def test_document_filter_searches_all_of_its_chunks(tmp_path):
+    store = FaissVectorStore(str(tmp_path), dim=DIM, index_type="hnsw", exact_max=0)
+    v = vectors(16)
+    store.add(chunks(16), v)
+    # The query is nearest to d0's chunks; d3's must still all be found
+    assert sorted(ids(store.search(v[0], k=10, document_id="d3"))) == ["c12", "c13", "c14", "c15"]
+    hits = store.search(v[0], k=3, document_id="d3")
+    assert len(hits) == 3
+    scores = [score for score, _ in hits]
+    assert scores == sorted(scores, reverse=True)
+    assert store.search(v[0], k=3, document_id="missing") == []
+
+
+def test_read_only_store_reloads_saved_index(tmp_path):
+    writer = FaissVectorStore(str(tmp_path), dim=DIM)
+    v = vectors(4)
+    writer.add(chunks(2), v[:2])
+    writer.save()
+
+    reader = FaissVectorStore(str(tmp_path), dim=DIM, read_only=True)
+    assert ids(reader.search(v[1], k=1)) == ["c1"]
+    with pytest.raises(RuntimeError):
+        reader.add(chunks(1), v[:1])
+
+    writer.add(chunks(2, prefix="e"), v[2:])
+    writer.save()
+    reader.reload()
+    assert ids(reader.search(v[3], k=1)) == ["e1"]
+
+
+def test_unsaved_writes_are_rebuilt_on_open(tmp_path):
+    writer = FaissVectorStore(str(tmp_path), dim=DIM)
+    v = vectors(3)
+    writer.add(chunks(2), v[:2])
+    writer.save()
+    # Rows committed, but the writer stopped before saving the index
+    writer.add(chunks(1, prefix="e"), v[2:])
+
+    reopened = FaissVectorStore(str(tmp_path), dim=DIM)
+    assert reopened.index.ntotal == 3
+    assert ids(reopened.search(v[2], k=1)) == ["e0"]
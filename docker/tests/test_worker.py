@@ -0,0 +1,259 @@
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from common.telemetry import get_document, get_trace_id
+from common import worker as worker_module
+from common.worker import SQSWorker
+
+
+class FakeSQS:
+    """
+    In-memory stand-in for the SQS calls SQSWorker makes. Received messages
+    stay in flight until deleted; they are not redelivered.
+    """
+
+    def __init__(self, bodies=(), max_receive_count=None):
+        self.max_receive_count = max_receive_count
+        self.pending = [
+            {"MessageId": f"m{i}", "ReceiptHandle": f"r{i}", "Body": body, "Attributes": {}}
+            for i, body in enumerate(bodies)
+        ]
+        self.lock = threading.Lock()
+        self.receive_sizes = []
+        self.deleted = []
+        self.delete_batches = []
+        self.extended = []
+        self.fail_receives = 0
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds, VisibilityTimeout, AttributeNames):
+        with self.lock:
+            if self.fail_receives:
+                self.fail_receives -= 1
+                raise ConnectionError("sqs unreachable")
+            self.receive_sizes.append(MaxNumberOfMessages)
+            batch, self.pending = self.pending[:MaxNumberOfMessages], self.pending[MaxNumberOfMessages:]
+        if not batch:
+            time.sleep(0.01)  # stands in for the long poll
+        return {"Messages": batch}
+
+    def get_queue_attributes(self, QueueUrl, AttributeNames):
+        if self.max_receive_count is None:
+            return {"Attributes": {}}
+        return {"Attributes": {"RedrivePolicy": json.dumps({"deadLetterTargetArn": "dlq", "maxReceiveCount": self.max_receive_count})}}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        assert len(Entries) <= 10
+        with self.lock:
+            self.delete_batches.append(len(Entries))
+            self.deleted.extend(entry["ReceiptHandle"] for entry in Entries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        with self.lock:
+            self.extended.extend((entry["ReceiptHandle"], entry["VisibilityTimeout"]) for entry in Entries)
+        return {"Successful": [], "Failed": []}
+
+
+def run_worker(handler, sqs, **kwargs):
+    kwargs.setdefault("wait_time_seconds", 0)
+    worker = SQSWorker("queue", handler, sqs_client=sqs, exit_when_idle=True, **kwargs)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "worker did not drain"
+    return worker
+
+
+def by_result(msg):
+    # The body says what the handler does
+    outcome = json.loads(msg["Body"])["outcome"]
+    if outcome == "raise":
+        raise RuntimeError("handler failed")
+    return {"none": None, "true": True, "false": False}[outcome]
+
+
+def test_ack_rules():
+    outcomes = ["none", "true", "false", "raise"]
+    sqs = FakeSQS(json.dumps({"outcome": outcome}) for outcome in outcomes)
+    worker = run_worker(by_result, sqs, concurrency=4)
+    # None and True acknowledge; False and exceptions leave the message for redelivery
+    assert sorted(sqs.deleted) == ["r0", "r1"]
+    assert (worker.processed, worker.failed) == (2, 2)
+
+
+def test_deletes_in_batches_of_ten():
+    sqs = FakeSQS(json.dumps({"outcome": "true"}) for _ in range(35))
+    release = threading.Event()
+
+    def handler(msg):
+        # Hold everything until all have been received, so acks pile up
+        release.wait(5)
+        return True
+
+    threading.Timer(0.3, release.set).start()
+    worker = run_worker(handler, sqs, concurrency=35)
+    assert len(sqs.deleted) == 35
+    assert max(sqs.delete_batches) == 10
+    assert worker.processed == 35
+
+
+def test_never_receives_more_than_free_slots():
+    sqs = FakeSQS(json.dumps({"outcome": "true"}) for _ in range(12))
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def handler(msg):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+
+    run_worker(handler, sqs, concurrency=3)
+    assert max(sqs.receive_sizes) <= 3
+    assert peak[0] <= 3
+    assert len(sqs.deleted) == 12
+
+
+def test_heartbeat_extends_visibility_of_long_jobs():
+    sqs = FakeSQS([json.dumps({})])
+
+    def handler(msg):
+        time.sleep(2.5)
+
+    # Renewed every half period: at 1s and 2s into the job
+    run_worker(handler, sqs, visibility_timeout=2)
+    assert sqs.extended.count(("r0", 2)) >= 2
+    assert sqs.deleted == ["r0"]
+
+
+def test_stop_drains_in_flight_messages():
+    sqs = FakeSQS(json.dumps({}) for _ in range(3))
+    started = threading.Event()
+
+    def handler(msg):
+        started.set()
+        time.sleep(0.3)
+
+    worker = SQSWorker("queue", handler, sqs_client=sqs, concurrency=3, wait_time_seconds=0)
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    assert started.wait(5)
+    worker.stop()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    # Stopped receiving, but what was in flight finished and was acknowledged
+    assert sorted(sqs.deleted) == ["r0", "r1", "r2"]
+
+
+def test_receive_errors_are_retried():
+    sqs = FakeSQS([json.dumps({})])
+    sqs.fail_receives = 1
+    run_worker(lambda msg: True, sqs)
+    assert sqs.deleted == ["r0"]
+
+
+def test_messages_run_with_trace_and_document_from_body():
+    bodies = [
+        json.dumps({"trace_id": "t1", "document_id": "d1", "user_id": "u1"}),
+        json.dumps({"Records": []}),  # an S3 notification: fresh trace, no document
+    ]
+    sqs = FakeSQS(bodies)
+    seen = {}
+
+    def handler(msg):
+        seen[msg["MessageId"]] = (get_trace_id(), get_document())
+
+    run_worker(handler, sqs, concurrency=1)
+    assert seen["m0"] == ("t1", {"document_id": "d1", "user_id": "u1"})
+    trace_id, document = seen["m1"]
+    assert trace_id and trace_id != "t1" and document == {}
+
+
+def process_handler(msg):
+    return json.loads(msg["Body"])["outcome"] == "true"
+
+
+@pytest.mark.parametrize("pool", ["thread", "process"])
+def test_pools(pool):
+    sqs = FakeSQS(json.dumps({"outcome": outcome}) for outcome in ["true", "false", "true"])
+    worker = run_worker(process_handler, sqs, pool=pool, concurrency=2)
+    assert sorted(sqs.deleted) == ["r0", "r2"]
+    assert (worker.processed, worker.failed) == (2, 1)
+
+
+def test_failed_status_only_on_last_delivery(monkeypatch):
+    reported = []
+    monkeypatch.setattr(worker_module, "report_status", reported.append)
+
+    def failing(msg):
+        raise RuntimeError("transient")
+
+    def msg(receive_count):
+        return {"Body": "{}", "Attributes": {"ApproximateReceiveCount": str(receive_count)}}
+
+    for handler in (failing, lambda m: False):
+        # Redelivered after this: the next attempt may still succeed
+        with pytest.raises(RuntimeError) if handler is failing else contextlib.nullcontext():
+            worker_module._handle(handler, msg(2), 3)
+        assert reported == []
+        # The last delivery before the dead-letter queue
+        with pytest.raises(RuntimeError) if handler is failing else contextlib.nullcontext():
+            worker_module._handle(handler, msg(3), 3)
+        assert reported == ["failed"]
+        reported.clear()
+    # Without a dead-letter queue no delivery is the last
+    worker_module._handle(lambda m: False, msg(50), None)
+    assert reported == []
+
+
+def test_max_receive_count_from_redrive_policy():
+    sqs = FakeSQS([json.dumps({})], max_receive_count=5)
+    assert run_worker(lambda m: True, sqs).max_receive_count == 5
+    sqs = FakeSQS([json.dumps({})])
+    assert run_worker(lambda m: True, sqs).max_receive_count is None
+    assert run_worker(lambda m: True, FakeSQS(), max_receive_count=2).max_receive_count == 2
+
+
+PROCESS_POOL_METRICS = """
+import json, socket, sys, urllib.request
+sys.path.insert(0, sys.argv[1])
+from common.telemetry import stage
+from common.worker import SQSWorker
+from test_worker import FakeSQS
+
+def handler(msg):
+    with stage("work"):
+        pass
+
+if __name__ == "__main__":
+    worker = SQSWorker("queue", handler, sqs_client=FakeSQS([json.dumps({})] * 3), pool="process",
+                       concurrency=2, wait_time_seconds=0, exit_when_idle=True, max_receive_count=0)
+    worker.run()
+    print(urllib.request.urlopen(f"http://127.0.0.1:{sys.argv[2]}/metrics").read().decode())
+"""
+
+
+def test_process_pool_stage_metrics_are_exported(tmp_path):
+    # Stages run in the pool processes; /metrics is served by the parent
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    (tmp_path / "metrics").mkdir()
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path / "metrics"), "METRICS_PORT": str(port),
+           "PYTHONPATH": os.path.dirname(__file__)}
+    docker_dir = os.path.join(os.path.dirname(__file__), "..")
+    result = subprocess.run([sys.executable, "-c", PROCESS_POOL_METRICS, docker_dir, str(port)],
+                            env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert 'pipeline_stage_seconds_count{service="worker",stage="work"} 3.0' in result.stdout
+    assert 'pipeline_messages_total{outcome="processed",service="worker"} 3.0' in result.stdout
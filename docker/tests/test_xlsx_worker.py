@@ -0,0 +1,58 @@
+import os
+
+from conftest import load_app
+
+os.environ.setdefault("SQS_QUEUE_URL", "https://sqs.invalid/queue")
+xlsx = load_app("xlsx-to-text-image", "xlsx_main")
+
+HEADER = ("Name", "Qty")
+
+
+def rows(n):
+    return [HEADER] + [(f"item {i}", i) for i in range(1, n + 1)]
+
+
+def lines(block):
+    return block.split(xlsx.ROW_SEPARATOR)
+
+
+def test_header_repeated_in_every_block():
+    blocks = list(xlsx.sheet_blocks("Stock", rows(5), rows_per_block=2))
+    assert len(blocks) == 3
+    for block in blocks:
+        assert lines(block)[1] == "Name | Qty"
+
+
+def test_row_ranges():
+    blocks = list(xlsx.sheet_blocks("Stock", rows(5), rows_per_block=2))
+    assert [lines(block)[0] for block in blocks] == [
+        "Sheet: Stock (rows 2-3)", "Sheet: Stock (rows 4-5)", "Sheet: Stock (rows 6-6)",
+    ]
+    assert lines(blocks[-1])[2:] == ["item 5 | 5"]
+
+
+def test_blank_rows_are_skipped_but_keep_numbering():
+    sheet = [HEADER, ("a", 1), (None, None), ("b", 2)]
+    (block,) = xlsx.sheet_blocks("S", sheet, rows_per_block=10)
+    assert lines(block) == ["Sheet: S (rows 2-4)", "Name | Qty", "a | 1", "b | 2"]
+
+
+def test_all_header_sheet():
+    blocks = list(xlsx.sheet_blocks("Settings", [("region", "eu"), ("tier", "gold")], header_rows=2))
+    assert blocks == [xlsx.ROW_SEPARATOR.join(["Sheet: Settings", "region | eu", "tier | gold"])]
+
+
+def test_block_is_one_chunker_paragraph():
+    # The chunker splits on "\n"; a block must survive as one paragraph, headers included
+    sheet = [HEADER, ("multi\nline", 1.0)]
+    (block,) = xlsx.sheet_blocks("S", sheet)
+    assert "\n" not in block
+    assert lines(block)[2] == "multi line | 1"
+
+
+def test_pool_is_created_once():
+    try:
+        assert xlsx.get_pool() is xlsx.get_pool()
+    finally:
+        xlsx.pool.shutdown()
+        xlsx.pool = None
@@ -1,69 +1,71 @@
-# from sentence_transformers import SentenceTransformer
-# import numpy as np
-# import faiss
-# from typing import List, Dict, Tuple
-
-# embedder = SentenceTransformer('all-MiniLM-L6-v2')
-
-# # Embed a list of chunk dicts (using 'content' field)
-# def embed_chunks(chunks: List[Dict]) -> np.ndarray:
-#     texts = [chunk['content'] for chunk in chunks]
-#     embeddings = embedder.encode(texts, convert_to_numpy=True)
-#     return embeddings
-
-# # Build a FAISS index from embeddings
-# def build_faiss_index(embeddings: np.ndarray) -> faiss.IndexFlatL2:
-#     dim = embeddings.shape[1]
-#     index = faiss.IndexFlatL2(dim)
-#     index.add(embeddings)
-#     return index
-
-# # Search FAISS index for top-k similar chunks
-# def search_faiss_index(index: faiss.IndexFlatL2, query_embedding: np.ndarray, k: int = 3) -> List[int]:
-#     D, I = index.search(query_embedding, k)
-#     return I[0].tolist() 
-
 import os
 import json
 import boto3
 import uuid
-from typing import List, Dict
-from sentence_transformers import SentenceTransformer
+import tempfile
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+from botocore.exceptions import ClientError
 import numpy as np
-from opensearchpy import OpenSearch, RequestsHttpConnection
+from opensearchpy import OpenSearch, RequestsHttpConnection, helpers
+from common.chunk_format import ChunkReader
+from common.document_status import INDEXED, INDEXING, report_status
+from common.embedding_backend import load_backend
+from common.embedding_cache import CachedEncoder
+from common.index_profiles import load_profile
+from common.telemetry import document_from_metadata, logger, set_document, set_trace_id, stage, trace_id_from_metadata
+from common.worker import SQSWorker
 
 # --- Config ---
 SQS_QUEUE_URL = os.environ['SQS_QUEUE_URL']
-OPENSEARCH_HOST = os.environ['OPENSEARCH_HOST']  # e.g. https://search-my-domain.us-east-1.es.amazonaws.com
+# 'opensearch', or 'faiss' for the embedded local index in vector_store.py (on-prem / dev)
+VECTOR_STORE = os.environ.get('VECTOR_STORE', 'opensearch')
+OPENSEARCH_HOST = os.environ.get('OPENSEARCH_HOST', '')  # e.g. https://search-my-domain.us-east-1.es.amazonaws.com
 INDEX_NAME = os.environ.get('OPENSEARCH_INDEX', 'semantic-chunks')
+# HNSW parameters, vector precision and shard layout (INDEX_PROFILE, see common/index_profiles.py)
+INDEX = load_profile()
 REGION = os.environ.get('AWS_REGION', 'us-east-1')
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2
+# Written by the semantic chunker next to semantic-chunks/{doc_id}.json (the legacy chunk format)
+EMBEDDINGS_SIDECAR_SUFFIX = '.embeddings.npy'
+# Chunk files are embedded and indexed this many chunks at a time, while the rest is still downloading
+STREAM_BATCH_SIZE = int(os.environ.get('STREAM_BATCH_SIZE', '256'))
+# Bulk indexing: a request is flushed at whichever limit is hit first
+BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', '500'))
+BULK_MAX_CHUNK_BYTES = int(os.environ.get('BULK_MAX_CHUNK_BYTES', str(10 * 1024 * 1024)))
+BULK_MAX_RETRIES = int(os.environ.get('BULK_MAX_RETRIES', '5'))
+BULK_INITIAL_BACKOFF = int(os.environ.get('BULK_INITIAL_BACKOFF', '1'))
+BULK_MAX_BACKOFF = int(os.environ.get('BULK_MAX_BACKOFF', '60'))
+# Large backfills: a one-off run that drains the queue with refresh turned off, then exits
+BACKFILL_MODE = os.environ.get('BACKFILL_MODE', 'false').lower() == 'true'
+# refresh_interval set when a backfill ends, and at startup if an interrupted backfill left refresh off
+BACKFILL_RESTORE_REFRESH = os.environ.get('BACKFILL_RESTORE_REFRESH', '1s')
 
 # --- AWS Clients ---
-sqs = boto3.client('sqs')
 s3 = boto3.client('s3')
 
 # --- Embedder ---
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
+# Loads its model on the first encode, which most messages never need: they reuse the chunker's sidecar
+backend = load_backend()
+embedder = CachedEncoder(backend, backend.cache_name)
 
-# --- OpenSearch Client ---
-opensearch = OpenSearch(
-    hosts=[{'host': OPENSEARCH_HOST.replace("https://", ""), 'port': 443}],
-    http_auth=(os.environ['OS_USER'], os.environ['OS_PASS']),
-    use_ssl=True,
-    verify_certs=True,
-    connection_class=RequestsHttpConnection
-)
+# --- Vector Store ---
+if VECTOR_STORE == 'faiss':
+    from vector_store import FaissVectorStore
+    local_store = FaissVectorStore(dim=EMBEDDING_DIM)
+    opensearch = None
+else:
+    local_store = None
+    opensearch = OpenSearch(
+        hosts=[{'host': OPENSEARCH_HOST.replace("https://", ""), 'port': 443}],
+        http_auth=(os.environ['OS_USER'], os.environ['OS_PASS']),
+        use_ssl=True,
+        verify_certs=True,
+        connection_class=RequestsHttpConnection
+    )
 
 # --- Utility Functions ---
 
-def get_sqs_messages(max_messages=5):
-    response = sqs.receive_message(
-        QueueUrl=SQS_QUEUE_URL,
-        MaxNumberOfMessages=max_messages,
-        WaitTimeSeconds=10
-    )
-    return response.get('Messages', [])
-
 def parse_s3_event(msg_body):
     body = json.loads(msg_body)
     record = body['Records'][0]
@@ -71,41 +73,153 @@ def parse_s3_event(msg_body):
     key = record['s3']['object']['key']
     return bucket, key
 
-def download_chunks_from_s3(bucket: str, key: str) -> List[Dict]:
+def open_chunks_from_s3(bucket: str, key: str) -> Tuple[ChunkReader, Optional[str], Dict[str, str]]:
+    # Returns a reader streaming the chunks, and the trace id and document ids the chunker stored with them
     obj = s3.get_object(Bucket=bucket, Key=key)
-    chunks = json.loads(obj['Body'].read().decode('utf-8'))
-    return chunks
+    return ChunkReader(obj['Body']), trace_id_from_metadata(obj), document_from_metadata(obj)
+
+def sidecar_key_for(key: str) -> str:
+    return os.path.splitext(key)[0] + EMBEDDINGS_SIDECAR_SUFFIX
+
+def load_chunk_embeddings(bucket: str, key: str, num_chunks: int) -> Optional[np.ndarray]:
+    """
+    Load the chunker's float16 embeddings sidecar for a chunks object, memory-mapped.
+
+    Returns None when the sidecar is missing or doesn't line up with the chunks,
+    in which case the caller should encode the chunks itself.
+    """
+    sidecar_key = sidecar_key_for(key)
+    with tempfile.NamedTemporaryFile(suffix='.npy') as tmp:
+        try:
+            s3.download_fileobj(bucket, sidecar_key, tmp)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return None
+            raise
+        tmp.flush()
+        # The mapping stays valid after the temp file is unlinked
+        embeddings = np.load(tmp.name, mmap_mode='r')
+    if embeddings.shape != (num_chunks, EMBEDDING_DIM):
+        logger.warning("ignoring embeddings sidecar with unexpected shape", extra={
+            "key": sidecar_key, "shape": embeddings.shape, "expected": (num_chunks, EMBEDDING_DIM),
+        })
+        return None
+    return embeddings
+
+def get_chunk_embeddings(bucket: str, key: str, chunks: List[Dict]) -> np.ndarray:
+    embeddings = load_chunk_embeddings(bucket, key, len(chunks))
+    if embeddings is not None:
+        logger.info("reusing chunker embeddings", extra={"bucket": bucket, "key": sidecar_key_for(key)})
+        return embeddings
+    return embed_chunks(chunks)
+
+def batch_embeddings(batch: List[Tuple[Dict, Optional[np.ndarray]]]) -> np.ndarray:
+    # Chunk files carry the chunker's embeddings inline; encode only if some are missing
+    if all(embedding is not None for _, embedding in batch):
+        return np.stack([embedding for _, embedding in batch])
+    return embed_chunks([chunk for chunk, _ in batch])
 
 def embed_chunks(chunks: List[Dict]) -> np.ndarray:
     texts = [chunk['content'] for chunk in chunks]
     embeddings = embedder.encode(texts, convert_to_numpy=True)
     return embeddings
 
-def index_chunks(chunks: List[Dict], embeddings: np.ndarray):
+def chunk_actions(chunks: List[Dict], embeddings: np.ndarray):
     for chunk, embed in zip(chunks, embeddings):
-        doc_id = chunk['id']
-        doc = {
-            "title": chunk.get("title"),
-            "description": chunk.get("description"),
-            "tags": chunk.get("tags", []),
-            "pageIndex": chunk.get("pageIndex", 0),
-            "content": chunk["content"],
-            "embedding": embed.tolist(),  # Must convert np.array to list
+        yield {
+            "_index": INDEX_NAME,
+            "_id": chunk['id'],
+            "_source": {
+                "title": chunk.get("title"),
+                "description": chunk.get("description"),
+                "tags": chunk.get("tags", []),
+                "pageIndex": chunk.get("pageIndex", 0),
+                "section": chunk.get("section"),
+                "content": chunk["content"],
+                "documentId": chunk.get("documentId"),
+                "userId": chunk.get("userId"),
+                "embedding": INDEX.encode(embed),
+            },
         }
-        opensearch.index(index=INDEX_NAME, id=doc_id, body=doc)
-        print(f"✅ Indexed chunk: {doc_id}")
 
-def delete_sqs_message(receipt_handle):
-    sqs.delete_message(QueueUrl=SQS_QUEUE_URL, ReceiptHandle=receipt_handle)
+def index_chunks(chunks: List[Dict], embeddings: np.ndarray) -> Tuple[int, List[Dict]]:
+    """
+    Bulk-index chunks, streaming requests capped by BULK_CHUNK_SIZE docs / BULK_MAX_CHUNK_BYTES.
+
+    Items rejected with 429 are retried with exponential backoff; any other
+    per-item failures are returned (and logged) rather than raised.
+    """
+    indexed = 0
+    errors = []
+    for ok, item in helpers.streaming_bulk(
+        opensearch,
+        chunk_actions(chunks, embeddings),
+        chunk_size=BULK_CHUNK_SIZE,
+        max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+        max_retries=BULK_MAX_RETRIES,
+        initial_backoff=BULK_INITIAL_BACKOFF,
+        max_backoff=BULK_MAX_BACKOFF,
+        raise_on_error=False,
+    ):
+        if ok:
+            indexed += 1
+        else:
+            errors.append(item)
+    logger.info("indexed chunks", extra={"indexed": indexed, "chunks": len(chunks), "index": INDEX_NAME})
+    for error in errors:
+        logger.error("failed to index chunk", extra={"item": error})
+    return indexed, errors
+
+def store_chunks(chunks: List[Dict], embeddings: np.ndarray, replace: bool = True) -> Tuple[int, List[Dict]]:
+    if local_store is None:
+        return index_chunks(chunks, embeddings)
+    # Chunk ids are new on every chunking run, so replace the document's previous chunks
+    # (once per document: later batches of a streamed file must not delete the earlier ones)
+    if replace:
+        for document_id in {chunk.get('documentId') for chunk in chunks if chunk.get('documentId')}:
+            local_store.delete_document(document_id)
+    indexed = local_store.add(chunks, embeddings)
+    logger.info("stored chunks in local vector store", extra={"indexed": indexed, "total": len(local_store)})
+    return indexed, []
+
+def set_refresh_interval(interval: str):
+    opensearch.indices.put_settings(index=INDEX_NAME, body={"index": {"refresh_interval": interval}})
+
+@contextmanager
+def relaxed_refresh(restore: str = BACKFILL_RESTORE_REFRESH):
+    """
+    Disable index refresh for the duration of a backfill, then set it to restore.
+
+    The configured value is restored rather than the one read before: with
+    several backfill replicas, that would be another replica's -1.
+    """
+    if opensearch is None:
+        yield
+        return
+    set_refresh_interval("-1")
+    logger.info("refresh disabled for backfill", extra={"index": INDEX_NAME})
+    try:
+        yield
+    finally:
+        set_refresh_interval(restore)
+        logger.info("refresh interval restored", extra={"index": INDEX_NAME, "refresh_interval": restore})
+
+def ensure_refresh_enabled(restore: str = BACKFILL_RESTORE_REFRESH):
+    # A backfill that was killed never restored refresh; new chunks would never become searchable
+    if opensearch is None:
+        return
+    settings = opensearch.indices.get_settings(index=INDEX_NAME, name='index.refresh_interval')
+    current = settings.get(INDEX_NAME, {}).get('settings', {}).get('index', {}).get('refresh_interval')
+    if current == "-1":
+        set_refresh_interval(restore)
+        logger.warning("refresh was left disabled, restored", extra={"index": INDEX_NAME, "refresh_interval": restore})
 
 def ensure_index_exists():
+    if opensearch is None:
+        return
     if not opensearch.indices.exists(index=INDEX_NAME):
-        print(f"🔧 Creating OpenSearch index: {INDEX_NAME}")
         index_body = {
-            "settings": {
-                "number_of_shards": 1,
-                "number_of_replicas": 2
-            },
+            "settings": INDEX.index_settings(EMBEDDING_DIM),
             "mappings": {
                 "properties": {
                     "title": {"type": "text"},
@@ -113,40 +227,68 @@ def ensure_index_exists():
                     "tags": {"type": "keyword"},
                     "content": {"type": "text"},
                     "pageIndex": {"type": "integer"},
-                    "embedding": {
-                        "type": "knn_vector",
-                        "dimension": 384  # for all-MiniLM-L6-v2
-                    }
+                    # Heading path of HTML chunks, e.g. "Loan Terms > Fees"
+                    "section": {"type": "text"},
+                    "documentId": {"type": "keyword"},
+                    "userId": {"type": "keyword"},
+                    "embedding": INDEX.embedding_mapping(EMBEDDING_DIM),
                 }
             }
         }
+        logger.info("creating OpenSearch index", extra={"index": INDEX_NAME, "profile": INDEX.name, "settings": index_body["settings"]})
         opensearch.indices.create(index=INDEX_NAME, body=index_body)
-        print("✅ Index created.")
+        logger.info("index created", extra={"index": INDEX_NAME})
 
 # --- Main ---
 
-def process_sqs_messages():
-    ensure_index_exists()
-    messages = get_sqs_messages()
-    if not messages:
-        print("No messages in queue.")
-        return
-
-    for msg in messages:
-        try:
-            bucket, key = parse_s3_event(msg['Body'])
-            print(f"\n📄 Processing: s3://{bucket}/{key}")
+def process_message(msg):
+    bucket, key = parse_s3_event(msg['Body'])
+    if key.endswith(EMBEDDINGS_SIDECAR_SUFFIX):
+        # Sidecars share the semantic-chunks/ prefix; they are read with their chunks
+        return True
 
-            chunks = download_chunks_from_s3(bucket, key)
-            embeddings = embed_chunks(chunks)
-            index_chunks(chunks, embeddings)
+    with stage("download"):
+        reader, trace_id, document = open_chunks_from_s3(bucket, key)
+        # A legacy JSON array is read whole; chunk files are streamed below
+        chunks = [chunk for chunk, _ in reader] if reader.legacy else None
+    set_trace_id(trace_id)
+    set_document(document)
+    logger.info("processing", extra={"bucket": bucket, "key": key, "legacy_format": reader.legacy})
+    report_status(INDEXING)
 
-            delete_sqs_message(msg['ReceiptHandle'])
-            print("✅ SQS message processed.")
+    if reader.legacy:
+        # Embeddings come from the .embeddings.npy sidecar if there is one
+        with stage("embed", chunks=len(chunks)):
+            embeddings = get_chunk_embeddings(bucket, key, chunks)
+        with stage("index", chunks=len(chunks)):
+            _, errors = store_chunks(chunks, embeddings)
+    else:
+        # Each batch is embedded (if needed) and indexed as soon as it has been read
+        errors = []
+        for batch_number, batch in enumerate(reader.batches(STREAM_BATCH_SIZE)):
+            chunks = [chunk for chunk, _ in batch]
+            with stage("embed", chunks=len(chunks)):
+                embeddings = batch_embeddings(batch)
+            with stage("index", chunks=len(chunks)):
+                errors.extend(store_chunks(chunks, embeddings, replace=batch_number == 0)[1])
+    if local_store is not None:
+        # The index file is rewritten whole, so once per message rather than per batch
+        local_store.save()
+    if errors:
+        # Leave the message on the queue; re-indexing is idempotent by chunk id
+        logger.error("chunks failed, message will be retried", extra={"failed": len(errors)})
+        return False
 
-        except Exception as e:
-            print(f"❌ Error: {e}")
+    report_status(INDEXED)
+    logger.info("message processed", extra={"embedding_cache": embedder.cache.stats()})
+    return True
 
 # --- Entry Point ---
 if __name__ == "__main__":
-    process_sqs_messages()
+    ensure_index_exists()
+    if BACKFILL_MODE:
+        with relaxed_refresh():
+            SQSWorker(SQS_QUEUE_URL, process_message, exit_when_idle=True).run()
+    else:
+        ensure_refresh_enabled()
+        SQSWorker(SQS_QUEUE_URL, process_message).run()
@@ -0,0 +1,255 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+# --- Config ---
+VECTOR_STORE_DIR = os.environ.get('VECTOR_STORE_DIR', '/data/vector-store')
+# 'hnsw' or 'ivf'; corpora below VECTOR_STORE_EXACT_MAX vectors always use exact search
+VECTOR_STORE_INDEX = os.environ.get('VECTOR_STORE_INDEX', 'hnsw')
+VECTOR_STORE_EXACT_MAX = int(os.environ.get('VECTOR_STORE_EXACT_MAX', '20000'))
+HNSW_M = int(os.environ.get('HNSW_M', '32'))
+HNSW_EF_CONSTRUCTION = int(os.environ.get('HNSW_EF_CONSTRUCTION', '200'))
+HNSW_EF_SEARCH = int(os.environ.get('HNSW_EF_SEARCH', '64'))
+IVF_NPROBE = int(os.environ.get('IVF_NPROBE', '16'))
+# HNSW can't remove vectors; deleted ones are filtered out until this share triggers a rebuild
+REBUILD_TOMBSTONE_RATIO = 0.2
+
+INDEX_FILE = 'index.faiss'
+META_FILE = 'chunks.sqlite'
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+class FaissVectorStore:
+    """
+    Embedded vector store: a FAISS index (cosine similarity via inner product
+    on unit vectors) plus a SQLite table holding each chunk's fields, document
+    id and vector. The stored vectors let the index be rebuilt when it switches
+    from exact to ANN search or after many HNSW deletions.
+
+    Writers open the store normally and call save() once their batch of
+    writes is done; read-only users (e.g. a query service) memory-map the
+    index file instead of loading it into RAM.
+    """
+
+    def __init__(self, path: str = VECTOR_STORE_DIR, dim: int = 384, index_type: str = VECTOR_STORE_INDEX,
+                 exact_max: int = VECTOR_STORE_EXACT_MAX, read_only: bool = False):
+        if index_type not in ('hnsw', 'ivf'):
+            raise ValueError(f"Unsupported index type: {index_type}")
+        self.path = path
+        self.dim = dim
+        self.index_type = index_type
+        self.exact_max = exact_max
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        os.makedirs(path, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(path, META_FILE), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                vector_id INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL,
+                document_id TEXT,
+                fields TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_chunk_id ON chunks (chunk_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_document_id ON chunks (document_id)")
+        self._db.commit()
+
+        self.reload()
+        if not read_only and self.index.ntotal != self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]:
+            # The writer stopped between committing rows and saving the index: rebuild from the rows
+            self.rebuild()
+            self.save()
+
+    def reload(self):
+        """
+        (Re)open the index file; read-only stores call this to pick up the writer's changes.
+        """
+        index_path = os.path.join(self.path, INDEX_FILE)
+        if os.path.exists(index_path):
+            flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if self.read_only else 0
+            self.index = faiss.read_index(index_path, flags)
+        else:
+            self.index = self._empty_index('flat')
+        self._configure_search()
+
+    # --- Index construction ---
+
+    def _kind(self) -> str:
+        base = faiss.downcast_index(self.index.index) if isinstance(self.index, faiss.IndexIDMap2) else self.index
+        if isinstance(base, faiss.IndexHNSW):
+            return 'hnsw'
+        if isinstance(base, faiss.IndexIVF):
+            return 'ivf'
+        return 'flat'
+
+    def _empty_index(self, kind: str, nlist: int = 0):
+        if kind == 'hnsw':
+            base = faiss.IndexHNSWFlat(self.dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            return faiss.IndexIDMap2(base)
+        if kind == 'ivf':
+            # IVF keeps its own ids and supports remove_ids, so no id map is needed
+            quantizer = faiss.IndexFlatIP(self.dim)
+            return faiss.IndexIVFFlat(quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dim))
+
+    def _configure_search(self):
+        kind = self._kind()
+        if kind == 'hnsw':
+            faiss.downcast_index(self.index.index).hnsw.efSearch = HNSW_EF_SEARCH
+        elif kind == 'ivf':
+            self.index.nprobe = IVF_NPROBE
+
+    def _live_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        rows = self._db.execute("SELECT vector_id, vector FROM chunks WHERE deleted = 0 ORDER BY vector_id").fetchall()
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        vectors = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float32).reshape(-1, self.dim)
+        return ids, vectors
+
+    def rebuild(self):
+        """
+        Rebuild the index from the stored vectors, choosing exact search for
+        small corpora and the configured ANN structure above exact_max.
+        """
+        ids, vectors = self._live_vectors()
+        if len(ids) <= self.exact_max:
+            index = self._empty_index('flat')
+        elif self.index_type == 'ivf':
+            # ~4*sqrt(n) lists, keeping >= 39 training points per centroid
+            nlist = max(1, min(int(4 * np.sqrt(len(ids))), len(ids) // 39))
+            index = self._empty_index('ivf', nlist)
+            index.train(vectors)
+        else:
+            index = self._empty_index('hnsw')
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        self._db.execute("DELETE FROM chunks WHERE deleted = 1")
+        self._db.commit()
+        self.index = index
+        self._configure_search()
+        self._dirty = True
+
+    # --- Writes ---
+
+    def add(self, chunks: List[Dict], embeddings: np.ndarray) -> int:
+        """
+        Add (or replace, by chunk id) chunks and their embeddings.
+        """
+        if self.read_only:
+            raise RuntimeError("Vector store was opened read-only")
+        if not chunks:
+            return 0
+        vectors = _normalize(embeddings)
+        with self._lock:
+            existing = [chunk['id'] for chunk in chunks]
+            self._delete_where(f"chunk_id IN ({','.join('?' * len(existing))})", existing)
+            next_id = self._db.execute("SELECT COALESCE(MAX(vector_id), -1) + 1 FROM chunks").fetchone()[0]
+            ids = np.arange(next_id, next_id + len(chunks), dtype=np.int64)
+            self._db.executemany(
+                "INSERT INTO chunks (vector_id, chunk_id, document_id, fields, vector) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (int(vector_id), chunk['id'], chunk.get('documentId'), json.dumps(chunk), vector.tobytes())
+                    for vector_id, chunk, vector in zip(ids, chunks, vectors)
+                ],
+            )
+            self._db.commit()
+            live = self._db.execute("SELECT COUNT(*) FROM chunks WHERE deleted = 0").fetchone()[0]
+            if self._kind() == 'flat' and live > self.exact_max:
+                self.rebuild()
+            else:
+                self.index.add_with_ids(vectors, ids)
+                self._dirty = True
+        return len(chunks)
+
+    def delete_document(self, document_id: str) -> int:
+        if self.read_only:
+            raise RuntimeError("Vector store was opened read-only")
+        with self._lock:
+            return self._delete_where("document_id = ?", [document_id])
+
+    def _delete_where(self, condition: str, params: List) -> int:
+        rows = self._db.execute(f"SELECT vector_id FROM chunks WHERE deleted = 0 AND {condition}", params).fetchall()
+        if not rows:
+            return 0
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        if self._kind() == 'hnsw':
+            self._db.execute(f"UPDATE chunks SET deleted = 1 WHERE {condition}", params)
+        else:
+            self.index.remove_ids(faiss.IDSelectorBatch(ids))
+            self._dirty = True
+            self._db.execute(f"DELETE FROM chunks WHERE {condition}", params)
+        self._db.commit()
+        dead, total = self._db.execute("SELECT SUM(deleted), COUNT(*) FROM chunks").fetchone()
+        if total and (dead or 0) / total > REBUILD_TOMBSTONE_RATIO:
+            self.rebuild()
+        return len(ids)
+
+    def save(self):
+        """
+        Write the index file if it changed. It is rewritten whole, so callers
+        save once per batch of writes (the indexer: once per message), not per add.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            # Write then rename, so readers never mmap a half-written file
+            index_path = os.path.join(self.path, INDEX_FILE)
+            faiss.write_index(self.index, index_path + '.tmp')
+            os.replace(index_path + '.tmp', index_path)
+            self._dirty = False
+
+    # --- Reads ---
+
+    def search(self, query: np.ndarray, k: int = 10, document_id: Optional[str] = None) -> List[Tuple[float, Dict]]:
+        """
+        Return up to k (cosine score, chunk) pairs, optionally limited to one document.
+        """
+        query = _normalize(np.asarray(query).reshape(1, -1))
+        if document_id is not None:
+            return self._search_document(query[0], k, document_id)
+        if self.index.ntotal == 0:
+            return []
+        # Over-fetch to make room for tombstoned hits
+        fetch = k if self._kind() != 'hnsw' else k * 4
+        scores, ids = self.index.search(query, min(fetch, self.index.ntotal))
+        hits = [(float(score), int(vector_id)) for score, vector_id in zip(scores[0], ids[0]) if vector_id >= 0]
+        if not hits:
+            return []
+        placeholders = ','.join('?' * len(hits))
+        rows = dict(self._db.execute(
+            f"SELECT vector_id, fields FROM chunks WHERE deleted = 0 AND vector_id IN ({placeholders})",
+            [vector_id for _, vector_id in hits],
+        ).fetchall())
+        results = [(score, json.loads(rows[vector_id])) for score, vector_id in hits if vector_id in rows]
+        return results[:k]
+
+    def _search_document(self, query: np.ndarray, k: int, document_id: str) -> List[Tuple[float, Dict]]:
+        # Filtering ANN results would miss most of a document's chunks; a document has
+        # few enough vectors to score them all exactly from the stored copies
+        rows = self._db.execute(
+            "SELECT fields, vector FROM chunks WHERE deleted = 0 AND document_id = ?", [document_id]
+        ).fetchall()
+        if not rows:
+            return []
+        vectors = np.frombuffer(b''.join(row[1] for row in rows), dtype=np.float32).reshape(-1, self.dim)
+        scores = vectors @ query
+        top = np.argsort(-scores, kind='stable')[:k]
+        return [(float(scores[i]), json.loads(rows[i][0])) for i in top]
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM chunks WHERE deleted = 0").fetchone()[0]
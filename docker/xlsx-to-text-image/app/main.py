@@ -0,0 +1,193 @@
+import boto3
+import datetime
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Tuple
+from openpyxl import load_workbook
+from common.document_status import CONVERTED, CONVERTING, report_status
+from common.telemetry import logger, stage, trace_metadata
+from common.worker import SQSWorker
+
+s3 = boto3.client('s3')
+
+# Set these from env
+QUEUE_URL = os.environ["SQS_QUEUE_URL"]
+OUTPUT_BUCKET = os.environ.get("OUTPUT_BUCKET", "")  # Optional
+# Data rows per text block; the header rows are repeated at the top of every block
+ROWS_PER_BLOCK = int(os.environ.get("XLSX_ROWS_PER_BLOCK", "50"))
+HEADER_ROWS = int(os.environ.get("XLSX_HEADER_ROWS", "1"))
+# Sheets of one workbook are extracted in parallel by this many processes
+XLSX_PROCESSES = int(os.environ.get("XLSX_PROCESSES", os.cpu_count() or 1))
+
+CELL_SEPARATOR = " | "
+# The chunker splits paragraphs on "\n" and caps chunks well below a 50-row block, so a
+# block is one line: its rows are separated by U+2028 (LINE SEPARATOR), which str.split('\n')
+# leaves alone. Every chunk is then a whole block, with the sheet name and header rows.
+ROW_SEPARATOR = "\u2028"
+# Sheets are separated like PDF pages, so chunks get the sheet number as their pageIndex
+SHEET_SEPARATOR = "\n\f\n"
+
+pool = None
+pool_lock = threading.Lock()
+
+
+def format_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    # One row is one line of output
+    return " ".join(str(value).split())
+
+
+def format_row(row: Iterable) -> str:
+    cells = [format_cell(value) for value in row]
+    # read-only mode pads rows to the sheet's max column; drop the empty tail
+    while cells and not cells[-1]:
+        cells.pop()
+    return CELL_SEPARATOR.join(cells)
+
+
+def sheet_blocks(title: str, rows: Iterable, rows_per_block: int = ROWS_PER_BLOCK, header_rows: int = HEADER_ROWS):
+    """
+    Yield text blocks of at most rows_per_block data rows, one line each. Each
+    block starts with the sheet name and row range, followed by the header rows,
+    so every block can be understood (and chunked) on its own.
+    """
+    header, block = [], []
+    first_row = None
+    emitted = False
+    for row_number, row in enumerate(rows, start=1):
+        line = format_row(row)
+        if not line:
+            continue
+        if len(header) < header_rows:
+            header.append(line)
+            continue
+        if first_row is None:
+            first_row = row_number
+        block.append(line)
+        last_row = row_number
+        if len(block) >= rows_per_block:
+            yield ROW_SEPARATOR.join([f"Sheet: {title} (rows {first_row}-{row_number})", *header, *block])
+            block, first_row, emitted = [], None, True
+    if block:
+        yield ROW_SEPARATOR.join([f"Sheet: {title} (rows {first_row}-{last_row})", *header, *block])
+    elif header and not emitted:
+        # A sheet that is all header (e.g. a small key/value sheet) still gets a block
+        yield ROW_SEPARATOR.join([f"Sheet: {title}", *header])
+
+
+def extract_sheet(path: str, sheet_name: str, out_path: str) -> Tuple[str, int]:
+    """
+    Runs in a pool process: stream one sheet of the workbook at path into
+    out_path. Returns the sheet name and the number of blocks written.
+    """
+    # read_only streams rows from the zip instead of building the whole sheet in memory
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        blocks = 0
+        with open(out_path, "w", encoding="utf-8") as out:
+            for block in sheet_blocks(sheet_name, workbook[sheet_name].iter_rows(values_only=True)):
+                if blocks:
+                    out.write("\n\n")
+                out.write(block)
+                blocks += 1
+        return sheet_name, blocks
+    finally:
+        workbook.close()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global pool
+    # Messages run on the SQS worker's threads; only the first one creates the pool
+    with pool_lock:
+        if pool is None:
+            # forkserver: the SQS worker runs messages on threads, which doesn't mix well with fork
+            pool = ProcessPoolExecutor(max_workers=XLSX_PROCESSES, mp_context=multiprocessing.get_context("forkserver"))
+        return pool
+
+
+def extract_workbook(path: str, workdir: str) -> str:
+    """
+    Extract every sheet of the workbook at path, in parallel, into one text
+    file in workdir. Returns the path of that file.
+    """
+    workbook = load_workbook(path, read_only=True)
+    sheet_names = workbook.sheetnames
+    workbook.close()
+
+    futures = [
+        get_pool().submit(extract_sheet, path, name, os.path.join(workdir, f"sheet-{i}.txt"))
+        for i, name in enumerate(sheet_names)
+    ]
+    output_path = os.path.join(workdir, "workbook.txt")
+    with open(output_path, "w", encoding="utf-8") as out:
+        for i, future in enumerate(futures):
+            name, blocks = future.result()
+            logger.info("extracted sheet", extra={"sheet": name, "blocks": blocks})
+            if i:
+                out.write(SHEET_SEPARATOR)
+            with open(os.path.join(workdir, f"sheet-{i}.txt"), encoding="utf-8") as sheet:
+                shutil.copyfileobj(sheet, out)
+    return output_path
+
+
+def process_workbook(bucket, key):
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # xlsx is a zip, which needs random access: spool it to disk rather than memory
+            path = os.path.join(workdir, "workbook.xlsx")
+            with stage("download"):
+                s3.download_file(bucket, key, path)
+            with stage("convert", bytes=os.path.getsize(path)):
+                output_path = extract_workbook(path, workdir)
+
+            logger.info("extracted workbook", extra={"key": key})
+
+            if OUTPUT_BUCKET:
+                # Stays under uploads/, the prefix that notifies the semantic chunker
+                output_key = key + ".txt"
+                # upload_file streams large output as a multipart upload
+                with stage("upload"):
+                    s3.upload_file(
+                        output_path, OUTPUT_BUCKET, output_key,
+                        ExtraArgs={"ContentType": "text/plain", "Metadata": trace_metadata()},
+                    )
+                logger.info("saved spreadsheet text", extra={"bucket": OUTPUT_BUCKET, "key": output_key})
+        return True
+
+    except Exception:
+        logger.exception("error processing workbook", extra={"key": key})
+        return False
+
+
+def process_message(msg):
+    try:
+        body = json.loads(msg['Body'])
+    except json.JSONDecodeError:
+        logger.exception("failed to parse SQS message body")
+        return False
+    bucket = body['bucket']
+    key = body['key']
+    logger.info("received message", extra={"bucket": bucket, "key": key})
+
+    report_status(CONVERTING)
+    success = process_workbook(bucket, key)
+    if success:
+        report_status(CONVERTED)
+    else:
+        logger.warning("skipping deletion due to failure", extra={"key": key})
+    return success
+
+
+if __name__ == "__main__":
+    logger.info("starting spreadsheet processing worker")
+    SQSWorker(QUEUE_URL, process_message).run()
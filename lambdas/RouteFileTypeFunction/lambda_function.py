@@ -1,9 +1,13 @@
 import boto3
 import os
-import mimetypes
 import json
+import uuid
 import filetype
+from collections import defaultdict
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 
+# Created once per container (cold start) and reused by every invocation
 s3 = boto3.client('s3')
 sqs = boto3.client('sqs')
 
@@ -15,55 +19,93 @@ QUEUE_MAP = {
     'image/png': os.environ['IMAGE_QUEUE_URL']
 }
 
+# Records are sniffed concurrently; the work is waiting on S3, so threads are enough
+ROUTER_MAX_WORKERS = int(os.environ.get('ROUTER_MAX_WORKERS', '16'))
+SNIFF_BYTES = 2048
+SQS_MAX_BATCH = 10
+SEND_ATTEMPTS = 3
+# Message body field -> S3 metadata name, as in docker/common/telemetry.py
+DOCUMENT_METADATA_KEYS = {'document_id': 'document-id', 'user_id': 'user-id'}
+
+executor = ThreadPoolExecutor(max_workers=ROUTER_MAX_WORKERS)
+
+
+def log(message, **fields):
+    # Same JSON line shape as the workers' logs (docker/common/telemetry.py)
+    print(json.dumps({"ts": datetime.now(timezone.utc).isoformat(), "level": "info", "service": "router", "message": message, **fields}, default=str))
+
+
+def detect_type(bucket, key, obj):
+    """
+    Returns (MIME type to route on or None, the object's user metadata).
+    The metadata carries the API gateway's trace id, document id and user id.
+    """
+    if obj.get('size') == 0:
+        return None, {}  # nothing to extract from an empty object
+    # Download first few KBs. Done even when the event carries a content type: the
+    # document ids are only in the object's metadata, so trusting it saves no round trip.
+    response = s3.get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{SNIFF_BYTES}')
+    kind = filetype.guess(response['Body'].read())
+    # Set by the API gateway on upload (x-amz-meta-*)
+    return (kind.mime if kind else None), response.get('Metadata', {})
+
+
+def route_record(record):
+    bucket = record['s3']['bucket']['name']
+    obj = record['s3']['object']
+    key = obj['key']
+
+    mime, metadata = detect_type(bucket, key, obj)
+    # Carried in every message body from here on, so one document can be followed through the pipeline
+    trace_id = metadata.get('trace-id') or uuid.uuid4().hex
+    log("detected type", key=key, detected_type=mime, trace_id=trace_id)
+    if mime not in QUEUE_MAP:
+        log("unknown file type", key=key, trace_id=trace_id)
+        return None
+    message = {'bucket': bucket, 'key': key, 'detected_type': mime, 'trace_id': trace_id}
+    # The workers copy these onto everything they write, down to the indexed chunks
+    for field, name in DOCUMENT_METADATA_KEYS.items():
+        if metadata.get(name):
+            message[field] = metadata[name]
+    return QUEUE_MAP[mime], message
+
+
+def send_batch(queue_url, messages):
+    entries = [{'Id': str(i), 'MessageBody': json.dumps(message)} for i, message in enumerate(messages)]
+    for _ in range(SEND_ATTEMPTS):
+        response = sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        failed = {failure['Id'] for failure in response.get('Failed', [])}
+        if not failed:
+            return []
+        entries = [entry for entry in entries if entry['Id'] in failed]
+    return entries
+
+
 def lambda_handler(event, context):
-    print(event)
-    for record in event['Records']:
-        bucket = record['s3']['bucket']['name']
-        key = record['s3']['object']['key']
-        
-        # Download first few KBs
-        response = s3.get_object(Bucket=bucket, Key=key, Range='bytes=0-2048')
-        content = response['Body'].read()
-
-        # Detect file type
-        kind = filetype.guess(content)
-        print("Detected type:", kind)
-
-        if kind and kind.mime in QUEUE_MAP:
-            queue_url = QUEUE_MAP[kind.mime]
-            message = {
-                'bucket': bucket,
-                'key': key,
-                'detected_type': kind.mime
-            }
-            sqs.send_message(QueueUrl=queue_url, MessageBody=json.dumps(message))
-            print(f"Sent to queue {queue_url}")
-        else:
-            print(f"Unknown file type for: {key}")
-
-        # Get file metadata
-        # head = s3.head_object(Bucket=bucket, Key=key)
-        # print(f"Head content is: {head}")
-        # content_type = head.get('ContentType')
-        
-        # if not content_type or content_type == "binary/octet-stream":
-        #     # Fallback: guess based on file extension
-        #     content_type, _ = mimetypes.guess_type(key)
-
-        # print(f"Detected content type: {content_type}")
-        
-        # queue_url = QUEUE_MAP.get(content_type)
-        
-        # if queue_url:
-        #     message = {
-        #         'bucket': bucket,
-        #         'key': key,
-        #         'type': content_type
-        #     }
-        #     sqs.send_message(
-        #         QueueUrl=queue_url,
-        #         MessageBody=json.dumps(message)
-        #     )
-        #     print(f"Sent message to queue: {queue_url}")
-        # else:
-        #     print(f"Unknown or unsupported file type: {content_type}")
+    records = event.get('Records', [])
+    log("routing records", records=len(records))
+
+    by_queue = defaultdict(list)
+    for routed in executor.map(route_record, records):
+        if routed:
+            queue_url, message = routed
+            by_queue[queue_url].append(message)
+
+    batches = [
+        (queue_url, messages[i:i + SQS_MAX_BATCH])
+        for queue_url, messages in by_queue.items()
+        for i in range(0, len(messages), SQS_MAX_BATCH)
+    ]
+    unsent = []
+    sent = defaultdict(int)
+    for (queue_url, messages), failed in zip(batches, executor.map(lambda batch: send_batch(*batch), batches)):
+        sent[queue_url] += len(messages) - len(failed)
+        unsent.extend(failed)
+    for queue_url, count in sent.items():
+        log("sent messages", queue_url=queue_url, count=count)
+
+    if unsent:
+        # Fail the invocation so it is retried. S3 invokes this function asynchronously, so there is
+        # no partial batch response: the retry re-sends every record. That is safe, as reprocessing
+        # a file overwrites its outputs, down to the indexed chunks (their ids are deterministic)
+        raise RuntimeError(f"Failed to send {len(unsent)} messages: {unsent}")